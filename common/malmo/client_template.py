@@ -0,0 +1,143 @@
+"""
+Prepared Minecraft directories to start clients from. A template is a copy of Malmo's Minecraft directory which has
+been launched once, so the mod is built and the assets and libraries are downloaded, with tuned JVM options for the
+client. Clients are started from an instance of the template, a copy of it per port, so clients launched at once do
+not share the run directory and its config:
+
+    template = ClientTemplate.prepare(minecraft_dir, "/data/minecraft-template")
+    instance = template.instantiate("/data/minecraft-instances/10000")
+
+Overlay instances link the sources and the Gradle wrapper of the template, which are only read, and copy the rest,
+including the build outputs Gradle writes to on every launch. Copy instances are independent of the template.
+malmo_server.prepare_template also warms the template up.
+"""
+import os
+import json
+import time
+import shutil
+import logging
+
+logger = logging.getLogger(__name__)
+
+# a fixed heap avoids resizing it while the world loads.
+DEFAULT_JVM_OPTIONS = ("-Xms2G", "-Xmx2G", "-XX:+UseG1GC", "-Xshare:auto")
+
+# entries of the template which instances link to rather than copy, nothing writes to them.
+SHARED_ENTRIES = ("gradle", "src", "libs")
+
+INSTANCE_MODES = ("overlay", "copy")
+
+_MANIFEST = "template.json"
+
+
+class ClientTemplate:
+    """
+    A prepared Minecraft directory and what is known about it.
+
+    """
+
+    def __init__(self, path: str):
+        """
+
+        :param path: a directory created by prepare.
+        """
+        self.path = path
+
+        manifest_path = os.path.join(path, _MANIFEST)
+        if not os.path.isfile(manifest_path):
+            raise FileNotFoundError("{} is not a client template, it has no {}".format(path, _MANIFEST))
+
+        with open(manifest_path, 'r') as f:
+            self.manifest = json.load(f)
+
+    def __repr__(self):
+        return "<ClientTemplate - {}, {}>".format(self.path, "warm" if self.warm else "cold")
+
+    @property
+    def jvm_options(self) -> list:
+        return self.manifest["jvm_options"]
+
+    @property
+    def warm(self) -> bool:
+        return self.manifest.get("warm_startup_time") is not None
+
+    @property
+    def instances_dir(self) -> str:
+        return self.path.rstrip(os.sep) + "-instances"
+
+    def record(self, **values):
+        """
+        Stores values in the manifest, eg. measured startup times.
+
+        :param values:
+        :return:
+        """
+        self.manifest.update(values)
+
+        tmp_path = os.path.join(self.path, _MANIFEST + ".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, os.path.join(self.path, _MANIFEST))
+
+    @classmethod
+    def prepare(cls, minecraft_dir: str, path: str, jvm_options=DEFAULT_JVM_OPTIONS) -> 'ClientTemplate':
+        """
+        Copies a Minecraft directory into a new template.
+
+        :param minecraft_dir: the Minecraft directory of the Malmo installation.
+        :param path: where the template is created, it must not exist.
+        :param jvm_options:
+        :return:
+        """
+        logger.info("Copying {} into the client template {}".format(minecraft_dir, path))
+        shutil.copytree(minecraft_dir, path, symlinks=True)
+
+        # only the JVM runClient forks for the client gets the options, Gradle's own JVMs keep their defaults.
+        with open(os.path.join(path, "build.gradle"), 'a') as f:
+            f.write("\ntasks.matching {{ it.name == 'runClient' }}.all {{\n    jvmArgs {}\n}}\n".format(
+                ", ".join("'{}'".format(option.replace("\\", "\\\\").replace("'", "\\'"))
+                          for option in jvm_options)))
+
+        with open(os.path.join(path, _MANIFEST), 'w') as f:
+            json.dump({"source": os.path.abspath(minecraft_dir),
+                       "created": time.time(),
+                       "jvm_options": list(jvm_options),
+                       "cold_startup_time": None,
+                       "warm_startup_time": None}, f, indent=2, sort_keys=True)
+
+        return cls(path)
+
+    def instantiate(self, instance_dir: str, mode: str = "overlay") -> str:
+        """
+        Creates a fresh instance of the template, replacing what was in instance_dir.
+
+        :param instance_dir:
+        :param mode: one of INSTANCE_MODES.
+        :return: instance_dir
+        """
+        if mode not in INSTANCE_MODES:
+            raise KeyError("Unknown instance mode {}, expected one of {}".format(mode, INSTANCE_MODES))
+
+        if os.path.lexists(instance_dir):
+            shutil.rmtree(instance_dir)
+
+        start = time.time()
+
+        if mode == "copy":
+            shutil.copytree(self.path, instance_dir, symlinks=True,
+                            ignore=shutil.ignore_patterns(_MANIFEST))
+        else:
+            os.makedirs(instance_dir)
+            for entry in os.listdir(self.path):
+                source, destination = os.path.join(self.path, entry), os.path.join(instance_dir, entry)
+                if entry == _MANIFEST:
+                    continue
+                elif entry in SHARED_ENTRIES:
+                    os.symlink(os.path.abspath(source), destination)
+                elif os.path.isdir(source) and not os.path.islink(source):
+                    shutil.copytree(source, destination, symlinks=True)
+                else:
+                    shutil.copy2(source, destination, follow_symlinks=False)
+
+        logger.debug("Created the {} instance {} in {:.2f}s".format(mode, instance_dir, time.time() - start))
+        return instance_dir
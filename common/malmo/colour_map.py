@@ -0,0 +1,237 @@
+"""
+Semantic observations from Malmo's ColourMapProducer, which renders every block type and entity as a solid colour.
+The colour map frames are converted into single channel images of class indices through a lookup table over all
+24 bit colours, a cheaper visual signal than RGB video.
+
+Malmo does not document which colour a block type gets, and the mission cannot set it, so the lookup learns them:
+colours are given the next free class index the first time they are seen. Lookups learning in separate processes
+number the colours differently, so the palette is learnt once, by running this module against a client, and loaded
+without learning wherever several environments run:
+
+    python -m common.malmo.colour_map palette.json --port 10000
+
+    lookup = ColourMapLookup.load("palette.json", learn=False)
+    classes = lookup.classify(frame)     # (height, width) uint8
+
+Only lookups which learn save the palette on close.
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+import tempfile
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from common.malmo.world_diff import MALMO_NAMESPACE
+
+logger = logging.getLogger(__name__)
+
+# class of colours that are not in the palette once it is full or frozen.
+UNKNOWN_CLASS = 0
+
+# marks colours that have not been seen in the lookup table, so there are at most 255 classes.
+_UNSEEN = 255
+
+
+def set_colour_map(mission_xml: str, width: int, height: int, sky_colour: str = "000000") -> str:
+    """
+    Replaces the VideoProducer of a mission's first agent with a ColourMapProducer.
+
+    :param mission_xml:
+    :param width:
+    :param height:
+    :param sky_colour: hex colour of the sky.
+    :return:
+    """
+    mission = ET.fromstring(mission_xml)
+    handlers = mission.find("{0}AgentSection/{0}AgentHandlers".format(MALMO_NAMESPACE))
+
+    if handlers is None:
+        raise ValueError("The mission does not define any agent handlers.")
+
+    # the producer takes the place of the video producer, the order of the agent handlers matters to the schema.
+    children = list(handlers)
+    index = next((i for i, child in enumerate(children) if child.tag in (MALMO_NAMESPACE + "VideoProducer",
+                                                                          MALMO_NAMESPACE + "ColourMapProducer")),
+                 len(children))
+    for child in children:
+        if child.tag in (MALMO_NAMESPACE + "VideoProducer", MALMO_NAMESPACE + "ColourMapProducer"):
+            handlers.remove(child)
+
+    producer = ET.Element(MALMO_NAMESPACE + "ColourMapProducer", skyColour=sky_colour)
+    ET.SubElement(producer, MALMO_NAMESPACE + "Width").text = str(width)
+    ET.SubElement(producer, MALMO_NAMESPACE + "Height").text = str(height)
+    handlers.insert(index, producer)
+
+    return ET.tostring(mission, encoding="unicode")
+
+
+class ColourMapLookup:
+    """
+    Maps the colours of colour map frames to class indices.
+
+    """
+
+    def __init__(self, palette: dict = None, learn: bool = True, max_classes: int = _UNSEEN, path: str = None):
+        """
+
+        :param palette: hex colour -> class index.
+        :param learn: give unseen colours new classes, otherwise they are UNKNOWN_CLASS and the palette is never
+        saved.
+        :param max_classes:
+        :param path: where save writes the palette.
+        """
+        self.learn = learn
+        self.max_classes = min(max_classes, _UNSEEN)
+        self.path = path
+
+        self.palette = {}
+        self._next_class = UNKNOWN_CLASS + 1
+        self._changed = False
+
+        # indexed by the colour as a 24 bit integer.
+        self.table = np.full(1 << 24, _UNSEEN, dtype=np.uint8)
+
+        for colour, index in (palette or {}).items():
+            self.add(colour, index)
+        self._changed = False
+
+    def __repr__(self):
+        return "<ColourMapLookup - {} colours>".format(len(self.palette))
+
+    @property
+    def num_classes(self) -> int:
+        return min(self._next_class, self.max_classes)
+
+    def add(self, colour: str, index: int = None) -> int:
+        """
+        Adds a hex colour to the palette, as a new class unless index is given.
+
+        :param colour:
+        :param index:
+        :return: the class of the colour.
+        """
+        colour = colour.lower()
+        if colour in self.palette:
+            return self.palette[colour]
+
+        if index is None:
+            if self._next_class >= self.max_classes:
+                if self._next_class == self.max_classes:
+                    logger.warning("The colour palette is full, new colours are unknown.")
+                    self._next_class += 1
+                index = UNKNOWN_CLASS
+            else:
+                index = self._next_class
+
+        self.table[int(colour, 16)] = index
+        self.palette[colour] = index
+        self._next_class = max(self._next_class, index + 1)
+        self._changed = True
+
+        return index
+
+    def classify(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Converts a (height, width, 3) colour map frame into a (height, width) image of class indices.
+
+        :param frame:
+        :return:
+        """
+        frame = frame[..., :3].astype(np.uint32)
+        keys = (frame[..., 0] << 16) | (frame[..., 1] << 8) | frame[..., 2]
+
+        classes = self.table[keys]
+
+        unseen = classes == _UNSEEN
+        if not unseen.any():
+            return classes
+
+        if not self.learn:
+            classes[unseen] = UNKNOWN_CLASS
+            return classes
+
+        # new colours are numbered in order of their value, so the same frame always gives the same classes.
+        for key in np.unique(keys[unseen]):
+            index = self.add("{:06x}".format(int(key)))
+            logger.debug("Colour {:06x} is class {}".format(int(key), index))
+
+        return self.table[keys]
+
+    def save(self, path: str = None):
+        path = path or self.path
+        if path is None:
+            raise ValueError("No path to save the colour palette to.")
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.palette, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+        self._changed = False
+
+    def close(self):
+        """
+        Saves the palette if colours were learnt since it was loaded.
+
+        :return:
+        """
+        if self.learn and self._changed and self.path:
+            self.save()
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> 'ColourMapLookup':
+        """
+        Loads a palette saved by save, a missing file gives an empty palette which is saved there on close.
+
+        :param path:
+        :param kwargs:
+        :return:
+        """
+        palette = None
+        if os.path.isfile(path):
+            with open(path, 'r') as f:
+                palette = json.load(f)
+
+        return cls(palette=palette, path=path, **kwargs)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Learns the colour palette of the colour map environments by playing '
+                                                 'them with random actions.')
+
+    parser.add_argument('palette', type=str,
+                        help='The json file the palette is added to.')
+    parser.add_argument('--host', type=str,
+                        default='127.0.0.1',
+                        help='The host of the Minecraft client.')
+    parser.add_argument('--port', type=int,
+                        default=10000,
+                        help='The port of the Minecraft client.')
+    parser.add_argument('--episodes', type=int,
+                        default=10,
+                        help='The number of episodes played.')
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    from envs.discrete.simple_hallways_visual import SimpleHallwaysVisualEnv
+
+    env = SimpleHallwaysVisualEnv(observation_mode='colour_map', colour_palette=args.palette)
+    env.init(start_minecraft=False, client_pool=[(args.host, args.port)])
+
+    try:
+        for episode in range(args.episodes):
+            env.reset()
+            done = False
+            while not done:
+                _, _, done, _ = env.step(env.action_space.sample())
+            logger.info("Episode {}, {}".format(episode, env.colour_map_lookup))
+    finally:
+        env.close()
+
+    sys.exit(0 if env.colour_map_lookup.palette else 1)
@@ -0,0 +1,375 @@
+"""
+Stores environment experience as memory mapped NumPy chunks, so it can be randomly accessed for offline training.
+
+Every writer owns a shard directory inside the store:
+
+    store/
+        <host>-<pid>-<id>/
+            meta.json               shapes, dtypes and counts
+            index.bin               row of every transition, int64
+            chunk-00000/            observations.npy, actions.npy, rewards.npy, dones.npy, final.npy
+            chunk-00001/
+            ...
+
+Rows hold the observation an action was taken in with that action, its reward and done. A transition's next
+observation is the following row, the last row of an episode only holds its final observation. Rows are laid out in
+fixed size chunks, so a row is found in O(1).
+
+Record from an environment with env.init(..., recordEpisodes="store"), then read with:
+
+    store = EpisodeStore("store")
+    observation, action, reward, next_observation, done = store[i]
+    batch = store.sample(256)
+
+"""
+import os
+import json
+import uuid
+import socket
+import logging
+import tempfile
+import bisect
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from gym import spaces
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("observations", "actions", "rewards", "dones", "final")
+
+
+def _action_layout(action_space: spaces.Space) -> (tuple, np.dtype):
+    if isinstance(action_space, spaces.Discrete):
+        return (), np.dtype(np.int64)
+    if isinstance(action_space, (spaces.Box, spaces.MultiDiscrete, spaces.MultiBinary)):
+        return tuple(action_space.shape), np.dtype(action_space.dtype)
+
+    raise NotImplementedError("Unable to store actions of {}".format(action_space))
+
+
+class EpisodeWriter:
+    """
+    Appends episodes to a new shard of an episode store.
+
+    """
+
+    def __init__(self, root: str, observation_space: spaces.Box, action_space: spaces.Space, chunk_size: int = 4096):
+        """
+
+        :param root: directory of the episode store.
+        :param observation_space:
+        :param action_space:
+        :param chunk_size: rows per chunk.
+        """
+        self.chunk_size = chunk_size
+
+        self.path = os.path.join(root, "{}-{}-{}".format(socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8]))
+        os.makedirs(self.path)
+
+        action_shape, action_dtype = _action_layout(action_space)
+
+        self.layout = {
+            "observations": (tuple(observation_space.shape), np.dtype(observation_space.dtype)),
+            "actions": (action_shape, action_dtype),
+            "rewards": ((), np.dtype(np.float32)),
+            "dones": ((), np.dtype(bool)),
+            "final": ((), np.dtype(bool)),
+        }
+
+        self.num_rows = 0
+        self.num_transitions = 0
+        self.num_episodes = 0
+
+        self._chunk = None
+        self._chunk_index = -1
+        self._pending = None
+
+        self._index = open(os.path.join(self.path, "index.bin"), 'wb')
+
+        self._write_meta()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _write_meta(self):
+        meta = {
+            "chunk_size": self.chunk_size,
+            "num_rows": self.num_rows,
+            "num_transitions": self.num_transitions,
+            "num_episodes": self.num_episodes,
+            "fields": {field: {"shape": list(shape), "dtype": dtype.str} for field, (shape, dtype) in self.layout.items()}
+        }
+
+        # readers may be loading the shard while it is written.
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.path, "meta.json"))
+
+    def _row(self) -> int:
+        """
+        Allocates the next row, opening a new chunk when the current one is full.
+
+        :return:
+        """
+        row = self.num_rows
+        chunk_index = row // self.chunk_size
+
+        if chunk_index != self._chunk_index:
+            self._flush_chunk()
+
+            chunk_path = os.path.join(self.path, "chunk-{:05d}".format(chunk_index))
+            os.makedirs(chunk_path)
+
+            self._chunk = {field: np.lib.format.open_memmap(os.path.join(chunk_path, field + ".npy"), mode='w+',
+                                                            dtype=dtype, shape=(self.chunk_size,) + shape)
+                           for field, (shape, dtype) in self.layout.items()}
+            self._chunk_index = chunk_index
+
+        self.num_rows += 1
+
+        return row
+
+    def _set(self, row: int, **values):
+        offset = row % self.chunk_size
+        for field, value in values.items():
+            self._chunk[field][offset] = value
+
+    def _flush_chunk(self):
+        if self._chunk:
+            for array in self._chunk.values():
+                array.flush()
+
+    def start_episode(self, observation: np.ndarray):
+        """
+        Starts a new episode from the observation returned by reset, an unfinished episode is ended first.
+
+        :param observation:
+        :return:
+        """
+        if self._pending is not None:
+            self.end_episode()
+
+        self._pending = self._row()
+        self._set(self._pending, observations=observation)
+
+    def add(self, action, reward: float, done: bool, observation: np.ndarray):
+        """
+        Adds a step of the current episode.
+
+        :param action:
+        :param reward:
+        :param done:
+        :param observation: the observation returned by the step.
+        :return:
+        """
+        if self._pending is None:
+            raise RuntimeError("Steps can only be added after start_episode.")
+
+        # the row of the pending observation holds the transition, the new observation goes into the next row.
+        self._set(self._pending, actions=action, rewards=reward, dones=done)
+        self._index.write(np.int64(self._pending).tobytes())
+        self.num_transitions += 1
+
+        self._pending = self._row()
+        self._set(self._pending, observations=observation)
+
+        if done:
+            self.end_episode()
+
+    def end_episode(self):
+        """
+        Marks the last observation of the current episode as final and makes the episode visible to readers.
+
+        :return:
+        """
+        if self._pending is None:
+            return
+
+        self._set(self._pending, final=True)
+        self._pending = None
+        self.num_episodes += 1
+
+        self.flush()
+
+    def flush(self):
+        self._flush_chunk()
+        self._index.flush()
+        self._write_meta()
+
+    def close(self):
+        if self._index.closed:
+            return
+
+        self.end_episode()
+        self.flush()
+        self._index.close()
+
+
+class EpisodeShard:
+    """
+    Read only view of the shard written by one EpisodeWriter.
+
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+        with open(os.path.join(path, "meta.json"), 'r') as f:
+            meta = json.load(f)
+
+        self.chunk_size = meta["chunk_size"]
+        self.num_rows = meta["num_rows"]
+        self.num_transitions = meta["num_transitions"]
+        self.num_episodes = meta["num_episodes"]
+        self.layout = {field: (tuple(spec["shape"]), np.dtype(spec["dtype"])) for field, spec in meta["fields"].items()}
+
+        self._index = np.memmap(os.path.join(path, "index.bin"), dtype=np.int64, mode='r',
+                                shape=(self.num_transitions,)) if self.num_transitions else np.zeros(0, np.int64)
+        self._chunks = {}
+
+    def __repr__(self):
+        return "<EpisodeShard - {} transitions, {} episodes>".format(self.num_transitions, self.num_episodes)
+
+    def __len__(self):
+        return self.num_transitions
+
+    def chunk(self, chunk_index: int) -> dict:
+        if chunk_index not in self._chunks:
+            chunk_path = os.path.join(self.path, "chunk-{:05d}".format(chunk_index))
+            self._chunks[chunk_index] = {field: np.load(os.path.join(chunk_path, field + ".npy"), mmap_mode='r')
+                                         for field in FIELDS}
+        return self._chunks[chunk_index]
+
+    def rows(self, field: str, rows: np.ndarray) -> np.ndarray:
+        """
+        Gathers a field of any number of rows.
+
+        :param field:
+        :param rows:
+        :return:
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        shape, dtype = self.layout[field]
+        values = np.empty(rows.shape + shape, dtype=dtype)
+
+        chunk_indices = rows // self.chunk_size
+        for chunk_index in np.unique(chunk_indices):
+            selected = chunk_indices == chunk_index
+            values[selected] = self.chunk(int(chunk_index))[field][rows[selected] % self.chunk_size]
+
+        return values
+
+    def transitions(self, indices) -> tuple:
+        """
+        Returns (observations, actions, rewards, next_observations, dones) of the transitions.
+
+        :param indices:
+        :return:
+        """
+        rows = self._index[np.asarray(indices, dtype=np.int64)]
+
+        return (self.rows("observations", rows),
+                self.rows("actions", rows),
+                self.rows("rewards", rows),
+                self.rows("observations", rows + 1),
+                self.rows("dones", rows))
+
+    def load(self):
+        """
+        Reads every chunk into memory.
+
+        :return:
+        """
+        num_chunks = (self.num_rows + self.chunk_size - 1) // self.chunk_size
+        for chunk_index in range(num_chunks):
+            self._chunks[chunk_index] = {field: np.array(array) for field, array in self.chunk(chunk_index).items()}
+        self._index = np.array(self._index)
+
+
+class EpisodeStore:
+    """
+    All the shards of an episode store, or every num_shards-th shard when reading in parallel workers.
+
+    """
+
+    def __init__(self, root: str, shard_id: int = None, num_shards: int = None):
+        """
+
+        :param root:
+        :param shard_id: with num_shards, only read the shards assigned to this worker.
+        :param num_shards:
+        """
+        self.root = root
+
+        paths = sorted(os.path.join(root, name) for name in os.listdir(root)
+                       if os.path.isfile(os.path.join(root, name, "meta.json")))
+
+        if num_shards:
+            paths = paths[shard_id::num_shards]
+
+        self.shards = [EpisodeShard(path) for path in paths]
+        self.shards = [shard for shard in self.shards if len(shard)]
+
+        self._offsets = np.cumsum([0] + [len(shard) for shard in self.shards])
+
+    def __repr__(self):
+        return "<EpisodeStore - {} transitions in {} shards>".format(len(self), len(self.shards))
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    def __getitem__(self, index: int) -> tuple:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Transition {} is out of range".format(index))
+
+        shard = bisect.bisect_right(self._offsets, index) - 1
+        batch = self.shards[shard].transitions([index - self._offsets[shard]])
+        return tuple(values[0] for values in batch)
+
+    def transitions(self, indices) -> tuple:
+        """
+        Returns (observations, actions, rewards, next_observations, dones) of the transitions.
+
+        :param indices:
+        :return:
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        shard_ids = np.searchsorted(self._offsets, indices, side='right') - 1
+
+        batch = None
+        for shard_id in np.unique(shard_ids):
+            selected = shard_ids == shard_id
+            values = self.shards[shard_id].transitions(indices[selected] - self._offsets[shard_id])
+
+            if batch is None:
+                batch = [np.empty((len(indices),) + v.shape[1:], dtype=v.dtype) for v in values]
+            for target, value in zip(batch, values):
+                target[selected] = value
+
+        if batch is None:
+            # no transitions were asked for, the layout of the stored fields gives the shapes.
+            layout = self.shards[0].layout if self.shards else {}
+            batch = [np.empty((0,) + layout[field][0], dtype=layout[field][1]) if field in layout else np.empty(0)
+                     for field in ("observations", "actions", "rewards", "observations", "dones")]
+
+        return tuple(batch)
+
+    def sample(self, batch_size: int, rng: np.random.RandomState = np.random) -> tuple:
+        return self.transitions(rng.randint(len(self), size=batch_size))
+
+    def load(self, num_workers: int = 4):
+        """
+        Reads all the shards into memory in parallel.
+
+        :param num_workers:
+        :return:
+        """
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            list(executor.map(EpisodeShard.load, self.shards))
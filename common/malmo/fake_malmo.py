@@ -0,0 +1,823 @@
+"""
+A pure python stand-in for the MalmoPython module, used to test and benchmark environments without a Minecraft
+client. Missions are simulated from their XML: the flat world and DrawingDecorator are rasterized into blocks, and
+discrete movement commands, ObservationFromGrid, ObservationFromFullStats, RewardForTouchingBlockType,
+RewardForSendingCommand, AgentQuitFromTouchingBlockType, ServerQuitFromTimeUp and MissionQuitCommands are
+supported. Video and colour map frames are blank but have the requested size.
+
+Install it before any module imports MalmoPython:
+
+    import common.malmo.fake_malmo as fake_malmo
+    fake_malmo.install(tick_latency=0)
+
+    from envs.discrete.simple_hallways import SimpleHallwaysEnv
+
+"""
+import sys
+import math
+import json
+import time
+import logging
+import datetime
+import xml.etree.ElementTree as ET
+
+from common.malmo.world_diff import MALMO_NAMESPACE, parse_flat_world, rasterize_drawing_decorator
+
+logger = logging.getLogger(__name__)
+
+# simulation settings shared by every AgentHost, see configure.
+_config = {
+    # wall clock seconds before a command's effects show up in the world state.
+    'tick_latency': 0.0,
+    # wall clock seconds between startMission and the mission beginning.
+    'start_latency': 0.0,
+}
+
+# game time that passes for every command, one minecraft tick.
+GAME_MS_PER_COMMAND = 50
+
+# blocks the agent can walk through.
+PASSABLE_BLOCK_TYPES = {"air", "lever", "redstone_wire", "torch", "redstone_torch", "unlit_redstone_torch",
+                        "stone_button", "wooden_button", "tallgrass", "red_flower", "yellow_flower", "carpet",
+                        "snow_layer", "rail", "golden_rail", "stone_pressure_plate", "wooden_pressure_plate",
+                        "water", "flowing_water"}
+
+# blocks that carry power from a lever to the doors it operates.
+REDSTONE_BLOCK_TYPES = {"redstone_wire", "unpowered_repeater", "powered_repeater", "unpowered_comparator",
+                        "powered_comparator", "redstone_torch", "unlit_redstone_torch"}
+
+DOOR_BLOCK_TYPES = {"wooden_door", "iron_door", "spruce_door", "birch_door", "jungle_door", "acacia_door",
+                    "dark_oak_door"}
+
+ALL_COMMANDS = {
+    "DiscreteMovement": ["move", "jumpmove", "strafe", "jumpstrafe", "turn", "movenorth", "moveeast", "movesouth",
+                         "movewest", "jumpnorth", "jumpeast", "jumpsouth", "jumpwest", "jump", "look", "attack",
+                         "use", "jumpuse"],
+    "ContinuousMovement": ["move", "strafe", "pitch", "turn", "jump", "crouch", "attack", "use"],
+    "AbsoluteMovement": ["tp", "tpx", "tpy", "tpz", "setYaw", "setPitch"],
+    "Inventory": [],
+    "Chat": ["chat"],
+    "MissionQuit": ["quit"],
+}
+
+_COMPASS_MOVES = {"north": (0, -1), "south": (0, 1), "east": (1, 0), "west": (-1, 0)}
+
+_NEIGHBOURS = [(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1) if dx or dy or dz]
+
+
+def configure(**settings):
+    """
+    Changes the simulation settings of all agent hosts, see _config.
+
+    :param settings:
+    :return:
+    """
+    for key, value in settings.items():
+        if key not in _config:
+            raise KeyError("Unknown fake Malmo setting {}".format(key))
+        _config[key] = value
+
+
+def install(**settings):
+    """
+    Registers this module as MalmoPython, so that importing MalmoPython returns the fake.
+
+    :param settings: see configure
+    :return:
+    """
+    configure(**settings)
+    sys.modules['MalmoPython'] = sys.modules[__name__]
+    return sys.modules[__name__]
+
+
+def _tag(name: str) -> str:
+    return MALMO_NAMESPACE + name
+
+
+def _strip(tag: str) -> str:
+    return tag.replace(MALMO_NAMESPACE, "")
+
+
+class MissionSpec:
+    """
+    Holds the mission XML and supports the parts of the MalmoPython.MissionSpec API used by the environments.
+
+    """
+
+    def __init__(self, xml: str = None, validate: bool = False):
+        if xml is None:
+            raise TypeError("The fake MissionSpec must be created from mission XML.")
+
+        self._root = ET.fromstring(xml)
+
+    # -- world --
+
+    def _server_handlers(self) -> ET.Element:
+        return self._root.find("{0}ServerSection/{0}ServerHandlers".format(MALMO_NAMESPACE))
+
+    def _drawing_decorator(self) -> ET.Element:
+        handlers = self._server_handlers()
+        decorator = handlers.find(_tag("DrawingDecorator"))
+
+        if decorator is None:
+            decorator = ET.Element(_tag("DrawingDecorator"))
+            # decorators come right after the world generator.
+            handlers.insert(1, decorator)
+
+        return decorator
+
+    def drawBlock(self, x, y, z, blockType):
+        ET.SubElement(self._drawing_decorator(), _tag("DrawBlock"),
+                      x=str(x), y=str(y), z=str(z), type=blockType)
+
+    def drawCuboid(self, x1, y1, z1, x2, y2, z2, blockType):
+        ET.SubElement(self._drawing_decorator(), _tag("DrawCuboid"),
+                      x1=str(x1), y1=str(y1), z1=str(z1), x2=str(x2), y2=str(y2), z2=str(z2), type=blockType)
+
+    def drawLine(self, x1, y1, z1, x2, y2, z2, blockType):
+        ET.SubElement(self._drawing_decorator(), _tag("DrawLine"),
+                      x1=str(x1), y1=str(y1), z1=str(z1), x2=str(x2), y2=str(y2), z2=str(z2), type=blockType)
+
+    def forceWorldReset(self):
+        generator = self._server_handlers().find(_tag("FlatWorldGenerator"))
+        if generator is not None:
+            generator.set("forceReset", "true")
+
+    def setWorldSeed(self, seed):
+        generator = self._server_handlers().find(_tag("FlatWorldGenerator"))
+        if generator is not None:
+            generator.set("seed", str(seed))
+
+    def timeLimitInSeconds(self, s):
+        for quit in self._server_handlers().findall(_tag("ServerQuitFromTimeUp")):
+            self._server_handlers().remove(quit)
+        ET.SubElement(self._server_handlers(), _tag("ServerQuitFromTimeUp"), timeLimitMs=str(s * 1000))
+
+    # -- agent --
+
+    def _agent_handlers(self, role: int = 0) -> ET.Element:
+        return self._root.findall(_tag("AgentSection"))[role].find(_tag("AgentHandlers"))
+
+    def _set_video(self, width, height, depth):
+        handlers = self._agent_handlers()
+        for producer in handlers.findall(_tag("VideoProducer")):
+            handlers.remove(producer)
+
+        producer = ET.SubElement(handlers, _tag("VideoProducer"), want_depth="true" if depth else "false")
+        ET.SubElement(producer, _tag("Width")).text = str(width)
+        ET.SubElement(producer, _tag("Height")).text = str(height)
+
+    def requestVideo(self, width, height):
+        self._set_video(width, height, False)
+
+    def requestVideoWithDepth(self, width, height):
+        self._set_video(width, height, True)
+
+    def _video_producer(self, role):
+        producer = self._agent_handlers(role).find(_tag("VideoProducer"))
+        if producer is None:
+            raise RuntimeError("No video has been requested for role {}".format(role))
+        return producer
+
+    def getVideoWidth(self, role):
+        return int(self._video_producer(role).find(_tag("Width")).text)
+
+    def getVideoHeight(self, role):
+        return int(self._video_producer(role).find(_tag("Height")).text)
+
+    def getVideoChannels(self, role):
+        return 4 if self._video_producer(role).get("want_depth", "false").lower() == "true" else 3
+
+    def _add_handler(self, name: str) -> ET.Element:
+        handler = self._agent_handlers().find(_tag(name))
+        if handler is None:
+            handler = ET.SubElement(self._agent_handlers(), _tag(name))
+        return handler
+
+    def observeRecentCommands(self):
+        self._add_handler("ObservationFromRecentCommands")
+
+    def observeHotBar(self):
+        self._add_handler("ObservationFromHotBar")
+
+    def observeFullInventory(self):
+        self._add_handler("ObservationFromFullInventory")
+
+    def observeChat(self):
+        self._add_handler("ObservationFromChat")
+
+    def observeGrid(self, x1, y1, z1, x2, y2, z2, name):
+        grid = ET.SubElement(self._add_handler("ObservationFromGrid"), _tag("Grid"), name=name)
+        ET.SubElement(grid, _tag("min"), x=str(x1), y=str(y1), z=str(z1))
+        ET.SubElement(grid, _tag("max"), x=str(x2), y=str(y2), z=str(z2))
+
+    def observeDistance(self, x, y, z, name):
+        distance = self._add_handler("ObservationFromDistance")
+        ET.SubElement(distance, _tag("Marker"), name=name, x=str(x), y=str(y), z=str(z))
+
+    # -- commands --
+
+    def removeAllCommandHandlers(self):
+        handlers = self._agent_handlers()
+        for handler in list(handlers):
+            if _strip(handler.tag).endswith("Commands"):
+                handlers.remove(handler)
+
+    def _allow(self, handler_name: str, command: str = None):
+        handler = self._add_handler(handler_name + "Commands")
+
+        if command is None:
+            for modifier in handler.findall(_tag("ModifierList")):
+                handler.remove(modifier)
+            return
+
+        modifier = handler.find(_tag("ModifierList"))
+        if modifier is None:
+            if len(handler) == 0 and handler.get("_all") is None:
+                modifier = ET.SubElement(handler, _tag("ModifierList"), type="allow-list")
+            else:
+                return
+        ET.SubElement(modifier, _tag("command")).text = command
+
+    def allowAllContinuousMovementCommands(self):
+        self._allow("ContinuousMovement")
+
+    def allowContinuousMovementCommand(self, command):
+        self._allow("ContinuousMovement", command)
+
+    def allowAllDiscreteMovementCommands(self):
+        self._allow("DiscreteMovement")
+
+    def allowDiscreteMovementCommand(self, command):
+        self._allow("DiscreteMovement", command)
+
+    def allowAllAbsoluteMovementCommands(self):
+        self._allow("AbsoluteMovement")
+
+    def allowAbsoluteMovementCommand(self, command):
+        self._allow("AbsoluteMovement", command)
+
+    def getListOfCommandHandlers(self, role):
+        return [_strip(handler.tag)[:-len("Commands")] for handler in self._agent_handlers(role)
+                if _strip(handler.tag).endswith("Commands")]
+
+    def getAllowedCommands(self, role, handler_name):
+        handler = self._agent_handlers(role).find(_tag(handler_name + "Commands"))
+        commands = list(ALL_COMMANDS.get(handler_name, []))
+
+        if handler is None:
+            return []
+
+        modifier = handler.find(_tag("ModifierList"))
+        if modifier is None:
+            return commands
+
+        listed = [command.text.strip() for command in modifier.findall(_tag("command"))]
+
+        if modifier.get("type") == "deny-list":
+            return [command for command in commands if command not in listed]
+        return listed
+
+    # -- misc --
+
+    def setModeToSpectator(self):
+        self._root.find(_tag("AgentSection")).set("mode", "Spectator")
+
+    def setModeToCreative(self):
+        self._root.find(_tag("AgentSection")).set("mode", "Creative")
+
+    def getSummary(self):
+        summary = self._root.find("{0}About/{0}Summary".format(MALMO_NAMESPACE))
+        return summary.text if summary is not None and summary.text else ""
+
+    def getAsXML(self, prettyPrint=False):
+        return ET.tostring(self._root, encoding="unicode")
+
+
+class MissionRecordSpec:
+    """
+    Accepts recording requests, nothing is recorded.
+
+    """
+
+    def __init__(self, destination: str = None):
+        self.destination = destination
+
+    def setDestination(self, destination):
+        self.destination = destination
+
+    def recordRewards(self):
+        pass
+
+    def recordCommands(self):
+        pass
+
+    def recordObservations(self):
+        pass
+
+    def recordMP4(self, frames_per_second, bit_rate):
+        pass
+
+
+class ClientInfo:
+    def __init__(self, ip_address: str = "127.0.0.1", port: int = 10000):
+        self.ip_address = ip_address
+        self.port = port
+
+
+class ClientPool:
+    def __init__(self):
+        self.clients = []
+
+    def add(self, client_info: ClientInfo):
+        self.clients.append(client_info)
+
+
+class TimestampedString:
+    def __init__(self, text: str):
+        self.timestamp = datetime.datetime.now()
+        self.text = text
+
+
+class TimestampedReward:
+    def __init__(self, value: float):
+        self.timestamp = datetime.datetime.now()
+        self._value = value
+
+    def getValue(self, dimension=0):
+        return self._value
+
+    def getValueInDimension(self, dimension):
+        return self._value
+
+
+class TimestampedVideoFrame:
+    def __init__(self, width: int, height: int, channels: int, pixels: bytes):
+        self.timestamp = datetime.datetime.now()
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.pixels = pixels
+        self.xPos = self.yPos = self.zPos = self.yaw = self.pitch = 0
+
+
+class WorldState:
+    def __init__(self):
+        self.has_mission_begun = False
+        self.is_mission_running = False
+        self.number_of_observations_since_last_state = 0
+        self.number_of_rewards_since_last_state = 0
+        self.number_of_video_frames_since_last_state = 0
+        self.observations = []
+        self.rewards = []
+        self.video_frames = []
+        self.video_frames_colourmap = []
+        self.mission_control_messages = []
+        self.errors = []
+
+
+class MissionSimulator:
+    """
+    Simulates one agent in a mission: the world's blocks, the agent's position, its commands and the observations
+    and rewards they produce.
+
+    """
+
+    def __init__(self, mission_xml: str, role: int = 0):
+        root = ET.fromstring(mission_xml)
+
+        server_handlers = root.find("{0}ServerSection/{0}ServerHandlers".format(MALMO_NAMESPACE))
+        generator = server_handlers.find(_tag("FlatWorldGenerator"))
+
+        if generator is None:
+            raise NotImplementedError("The fake Malmo only simulates missions in a flat world.")
+
+        self.layers = parse_flat_world(generator.get("generatorString", "3;7,2*3,2;1;"))
+        self.blocks = {}
+        for decorator in server_handlers.findall(_tag("DrawingDecorator")):
+            self.blocks.update({position: state[0] for position, state in
+                                rasterize_drawing_decorator(decorator, skip_unsupported=True).items()})
+
+        self.powered_levers = set()
+        self.open_doors = set()
+        self._lever_doors = {}
+
+        time_up = server_handlers.find(_tag("ServerQuitFromTimeUp"))
+        self.time_limit_ms = float(time_up.get("timeLimitMs")) if time_up is not None else None
+        self.time_ms = 0
+
+        agent = root.findall(_tag("AgentSection"))[role]
+        self.name = agent.findtext(_tag("Name"), default="Agent")
+
+        placement = agent.find("{0}AgentStart/{0}Placement".format(MALMO_NAMESPACE))
+        self.x = float(placement.get("x", 0.5)) if placement is not None else 0.5
+        self.y = float(placement.get("y", 2)) if placement is not None else 2.0
+        self.z = float(placement.get("z", 0.5)) if placement is not None else 0.5
+        self.yaw = float(placement.get("yaw", 0)) if placement is not None else 0.0
+        self.pitch = float(placement.get("pitch", 0)) if placement is not None else 0.0
+
+        handlers = agent.find(_tag("AgentHandlers"))
+
+        self.grids = []
+        for grid in handlers.findall("{0}ObservationFromGrid/{0}Grid".format(MALMO_NAMESPACE)):
+            low, high = grid.find(_tag("min")), grid.find(_tag("max"))
+            self.grids.append((grid.get("name"),
+                               [int(float(low.get(axis))) for axis in ("x", "y", "z")],
+                               [int(float(high.get(axis))) for axis in ("x", "y", "z")]))
+
+        self.full_stats = handlers.find(_tag("ObservationFromFullStats")) is not None
+
+        self.touch_rewards = {}
+        for block in handlers.findall("{0}RewardForTouchingBlockType/{0}Block".format(MALMO_NAMESPACE)):
+            self.touch_rewards[block.get("type")] = (float(block.get("reward")),
+                                                     block.get("behaviour", "oncePerBlock"))
+        self.rewarded = set()
+
+        command_reward = handlers.find(_tag("RewardForSendingCommand"))
+        self.command_reward = float(command_reward.get("reward")) if command_reward is not None else 0.0
+
+        self.quit_blocks = {block.get("type") for block in
+                            handlers.findall("{0}AgentQuitFromTouchingBlockType/{0}Block".format(MALMO_NAMESPACE))}
+
+        self.video = None
+        video = handlers.find(_tag("VideoProducer"))
+        self.colour_map = video is None and handlers.find(_tag("ColourMapProducer")) is not None
+        if self.colour_map:
+            video = handlers.find(_tag("ColourMapProducer"))
+        if video is not None:
+            channels = 4 if video.get("want_depth", "false").lower() == "true" else 3
+            self.video = (int(video.findtext(_tag("Width"))), int(video.findtext(_tag("Height"))), channels)
+            # every frame shares the same blank pixels.
+            self.blank_pixels = bytes(self.video[0] * self.video[1] * channels)
+
+        self.ended = None
+        self.distance_travelled = 0
+
+    def block(self, x: int, y: int, z: int) -> str:
+        block = self.blocks.get((x, y, z))
+        if block is not None:
+            return block
+        return self.layers[y] if 0 <= y < len(self.layers) else "air"
+
+    def _passable(self, x: int, y: int, z: int) -> bool:
+        block = self.block(x, y, z)
+        return block in PASSABLE_BLOCK_TYPES or (block in DOOR_BLOCK_TYPES and (x, y, z) in self.open_doors)
+
+    def _cell(self) -> (int, int, int):
+        return int(math.floor(self.x)), int(math.floor(self.y)), int(math.floor(self.z))
+
+    def _facing(self) -> (int, int):
+        yaw = math.radians(self.yaw)
+        return int(round(-math.sin(yaw))), int(round(math.cos(yaw)))
+
+    def _move(self, dx: int, dz: int) -> (int, int, int):
+        """
+        Moves the agent one block, returns the position of the block it bumped into if the move was blocked.
+
+        :return:
+        """
+        x, y, z = self._cell()
+        nx, nz = x + dx, z + dz
+
+        if not self._passable(nx, y, nz):
+            return nx, y, nz
+        if not self._passable(nx, y + 1, nz):
+            return nx, y + 1, nz
+
+        # fall until there is something to stand on.
+        while y > 0 and self._passable(nx, y - 1, nz):
+            y -= 1
+
+        self.x, self.y, self.z = nx + 0.5, float(y), nz + 0.5
+        self.distance_travelled += 1
+        return None
+
+    def _use(self):
+        """
+        Flips the first lever in front of the agent at eye level, and opens or closes the doors it powers.
+
+        :return:
+        """
+        x, y, z = self._cell()
+        dx, dz = self._facing()
+
+        for reach in range(1, 5):
+            target = (x + dx * reach, y + 1, z + dz * reach)
+            block = self.block(*target)
+
+            if block == "lever":
+                self.powered_levers ^= {target}
+                self.open_doors = set().union(*[self.doors_powered_by(lever) for lever in self.powered_levers])
+                return
+            if block != "air":
+                return
+
+    def doors_powered_by(self, lever: (int, int, int)) -> set:
+        """
+        The door blocks next to a lever or next to any redstone connected to it.
+
+        :param lever:
+        :return:
+        """
+        if lever in self._lever_doors:
+            return self._lever_doors[lever]
+
+        network, frontier, doors = {lever}, [lever], set()
+
+        while frontier:
+            x, y, z = frontier.pop()
+
+            for dx, dy, dz in _NEIGHBOURS:
+                position = (x + dx, y + dy, z + dz)
+                block = self.block(*position)
+
+                if block in DOOR_BLOCK_TYPES:
+                    doors.add(position)
+                elif block in REDSTONE_BLOCK_TYPES and position not in network:
+                    network.add(position)
+                    frontier.append(position)
+
+        # both halves of a door open together.
+        for x, y, z in list(doors):
+            for half in [(x, y - 1, z), (x, y + 1, z)]:
+                if self.block(*half) in DOOR_BLOCK_TYPES:
+                    doors.add(half)
+
+        self._lever_doors[lever] = doors
+
+        return doors
+
+    def command(self, command: str) -> float:
+        """
+        Applies a command and advances the game by one tick, returns the reward it produced.
+
+        :param command:
+        :return:
+        """
+        if self.ended:
+            return 0.0
+
+        parts = command.split()
+        verb = parts[0] if parts else ""
+        value = float(parts[1]) if len(parts) > 1 else 1.0
+
+        bumped = None
+
+        if verb == "quit":
+            self.ended = "Mission ended by the agent."
+            return 0.0
+        elif verb.startswith("move") and verb[4:] in _COMPASS_MOVES:
+            bumped = self._move(*_COMPASS_MOVES[verb[4:]])
+        elif verb.startswith("jump") and verb[4:] in _COMPASS_MOVES:
+            bumped = self._move(*_COMPASS_MOVES[verb[4:]])
+        elif verb in ("move", "jumpmove") and value:
+            dx, dz = self._facing()
+            sign = 1 if value > 0 else -1
+            bumped = self._move(dx * sign, dz * sign)
+        elif verb in ("strafe", "jumpstrafe") and value:
+            dx, dz = self._facing()
+            sign = 1 if value > 0 else -1
+            bumped = self._move(-dz * sign, dx * sign)
+        elif verb == "turn":
+            self.yaw = (self.yaw + 90 * (1 if value > 0 else -1) + 180) % 360 - 180
+        elif verb == "look":
+            self.pitch = max(-90.0, min(90.0, self.pitch + 45 * (1 if value > 0 else -1)))
+        elif verb in ("use", "jumpuse") and value:
+            self._use()
+
+        self.time_ms += GAME_MS_PER_COMMAND
+
+        reward = self.command_reward + self._touch(bumped)
+
+        if self.time_limit_ms is not None and self.time_ms >= self.time_limit_ms and not self.ended:
+            self.ended = "Mission ended: time up."
+
+        return reward
+
+    def _touch(self, bumped: (int, int, int) = None) -> float:
+        """
+        Rewards the blocks the agent is touching, the block it is standing on and any block it walked into.
+
+        :param bumped:
+        :return:
+        """
+        x, y, z = self._cell()
+        touching = [((x, y - 1, z), self.block(x, y - 1, z))]
+        if bumped:
+            touching.append((bumped, self.block(*bumped)))
+
+        reward = 0.0
+
+        for position, block in touching:
+            if block in self.touch_rewards:
+                value, behaviour = self.touch_rewards[block]
+                key = block if behaviour == "onceOnly" else (block, position)
+
+                if behaviour in ("onceOnly", "oncePerBlock") and key in self.rewarded:
+                    continue
+
+                self.rewarded.add(key)
+                reward += value
+
+            if block in self.quit_blocks and not self.ended:
+                self.ended = "Agent touched {}".format(block)
+
+        return reward
+
+    def observation(self) -> str:
+        observation = {}
+
+        if self.full_stats:
+            observation.update({
+                "Name": self.name,
+                "XPos": self.x, "YPos": self.y, "ZPos": self.z,
+                "Yaw": self.yaw, "Pitch": self.pitch,
+                "Life": 20.0, "Food": 20, "Air": 300, "XP": 0, "Score": 0, "IsAlive": True,
+                "TimeAlive": self.time_ms // GAME_MS_PER_COMMAND,
+                "WorldTime": 6000, "TotalTime": self.time_ms // GAME_MS_PER_COMMAND,
+                "DistanceTravelled": self.distance_travelled,
+            })
+
+        x, y, z = self._cell()
+        for name, low, high in self.grids:
+            # malmo orders grids by y, then z, then x.
+            observation[name] = [self.block(x + gx, y + gy, z + gz)
+                                 for gy in range(low[1], high[1] + 1)
+                                 for gz in range(low[2], high[2] + 1)
+                                 for gx in range(low[0], high[0] + 1)]
+
+        return json.dumps(observation)
+
+    def video_frame(self) -> TimestampedVideoFrame:
+        if not self.video:
+            return None
+        return TimestampedVideoFrame(*self.video, pixels=self.blank_pixels)
+
+
+class AgentHost:
+    """
+    Stand-in for MalmoPython.AgentHost, which runs missions in a MissionSimulator.
+
+    """
+
+    def __init__(self):
+        self._simulator = None
+        self._start_time = None
+        self._begun = False
+        self._running = False
+        self._pending = []
+        self._state = WorldState()
+
+    # -- policies, accepted and ignored --
+
+    def setObservationsPolicy(self, policy):
+        pass
+
+    def setRewardsPolicy(self, policy):
+        pass
+
+    def setVideoPolicy(self, policy):
+        pass
+
+    def startMission(self, mission_spec: MissionSpec, *args):
+        """
+        Accepts (mission_spec, record_spec) or (mission_spec, client_pool, record_spec, role, experiment_id).
+
+        :return:
+        """
+        if self._running:
+            raise RuntimeError("A mission is already running.")
+
+        role = args[2] if len(args) >= 3 else 0
+
+        self._simulator = MissionSimulator(mission_spec.getAsXML(False), role)
+        self._start_time = time.time() + self._start_latency()
+        self._begun = False
+        self._running = False
+        self._pending = []
+        self._state = WorldState()
+
+    def _update(self):
+        """
+        Moves everything that is due into the world state.
+
+        :return:
+        """
+        if self._simulator is None:
+            return
+
+        now = time.time()
+
+        if not self._begun and now >= self._start_time:
+            self._begun = True
+            self._running = True
+            self._state.has_mission_begun = True
+            self._state.is_mission_running = True
+            self._deliver(None)
+
+        if not self._begun:
+            return
+
+        while self._pending and self._pending[0][0] <= now:
+            _, reward = self._pending.pop(0)
+            self._deliver(reward)
+
+        # the server keeps ticking while the agent is idle, so there is always a fresh observation.
+        if self._running and not self._pending and not self._state.number_of_observations_since_last_state:
+            self._deliver(None)
+
+        if self._simulator.ended and not self._pending and self._running:
+            self._running = False
+            self._state.is_mission_running = False
+            self._state.mission_control_messages.append(TimestampedString(
+                '<MissionEnded xmlns="{}"><Status>ENDED</Status>'
+                '<HumanReadableStatus>{}</HumanReadableStatus></MissionEnded>'.format(
+                    MALMO_NAMESPACE[1:-1], self._simulator.ended)))
+
+    def _start_latency(self) -> float:
+        return _config['start_latency']
+
+    def _tick_latency(self) -> float:
+        return _config['tick_latency']
+
+    def _deliver(self, reward: float):
+        self._deliver_observation()
+
+        if reward is not None:
+            self._deliver_reward(reward)
+
+    def _deliver_observation(self):
+        state = self._state
+
+        state.observations = [TimestampedString(self._simulator.observation())]
+        state.number_of_observations_since_last_state += 1
+
+        frame = self._simulator.video_frame()
+        if frame:
+            # like Malmo, colour map frames are kept apart from the video.
+            if self._simulator.colour_map:
+                state.video_frames_colourmap = [frame]
+            else:
+                state.video_frames = [frame]
+            state.number_of_video_frames_since_last_state += 1
+
+    def _deliver_reward(self, reward: float):
+        state = self._state
+
+        # rewards are summed like Malmo's default rewards policy.
+        total = reward + (state.rewards[0].getValue() if state.rewards else 0.0)
+        state.rewards = [TimestampedReward(total)]
+        state.number_of_rewards_since_last_state += 1
+
+    def sendCommand(self, command: str, key: str = None):
+        if not self._running:
+            self._state.errors.append(TimestampedString("Command sent while no mission is running."))
+            return
+
+        reward = self._simulator.command(command)
+        self._pending.append((time.time() + self._tick_latency(), reward))
+
+    def peekWorldState(self) -> WorldState:
+        self._update()
+
+        state = WorldState()
+        state.__dict__.update(self._state.__dict__)
+        return state
+
+    def getWorldState(self) -> WorldState:
+        self._update()
+
+        state = self._state
+        self._state = WorldState()
+        self._state.has_mission_begun = state.has_mission_begun
+        self._state.is_mission_running = state.is_mission_running
+
+        return state
+
+    def getUsage(self):
+        return "Fake Malmo agent host."
+
+    def receivedArgument(self, name):
+        return False
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    install()
+
+    from envs.discrete.simple_hallways import SimpleHallwaysEnv
+
+    env = SimpleHallwaysEnv()
+    env.init(start_minecraft=False, step_sleep=0)
+
+    steps = 0
+    start = time.time()
+    for episode in range(10):
+        env.reset()
+        done = False
+        while not done:
+            obs, reward, done, info = env.step(env.action_space.sample())
+            steps += 1
+
+    logger.info("{} steps at {:.0f} steps per second".format(steps, steps / (time.time() - start)))
@@ -0,0 +1,215 @@
+"""
+Latency and fault injection on top of the fake Malmo, to load test code that talks to Malmo clients with production
+like timing: slow and failing mission starts, variable tick rates, dropped observations and crashing clients.
+
+Every random draw comes from a FaultModel's seeded generator, so a load test replays the same faults every run:
+
+    from common.malmo import fault_injection
+
+    fault_injection.install(seed=0,
+                            start_latency=fault_injection.lognormal(median=2.0, sigma=0.5),
+                            start_failure_rate=0.1,
+                            tick_latency=fault_injection.uniform(0.01, 0.05),
+                            observation_drop_rate=0.01,
+                            crash_rate=0.0001,
+                            crash_downtime=fault_injection.constant(30))
+
+"""
+import sys
+import time
+import types
+import random
+import logging
+import threading
+
+import common.malmo.fake_malmo as fake_malmo
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CLIENT = "127.0.0.1:10000"
+
+
+def constant(value: float):
+    return lambda rng: value
+
+
+def uniform(low: float, high: float):
+    return lambda rng: rng.uniform(low, high)
+
+
+def normal(mean: float, std: float, minimum: float = 0.0):
+    return lambda rng: max(minimum, rng.gauss(mean, std))
+
+
+def lognormal(median: float, sigma: float):
+    """
+    Long tailed latencies, eg. mission starts that occasionally take many times longer than usual.
+
+    :param median:
+    :param sigma:
+    :return:
+    """
+    return lambda rng: median * rng.lognormvariate(0, sigma)
+
+
+def exponential(mean: float):
+    return lambda rng: rng.expovariate(1.0 / mean) if mean > 0 else 0.0
+
+
+class FaultModel:
+    """
+    Describes how a simulated client misbehaves. Latencies are distributions (functions of a random.Random
+    returning seconds) and faults are probabilities per operation.
+
+    """
+
+    def __init__(self,
+                 seed: int = None,
+                 start_latency=constant(0.0),
+                 start_failure_rate: float = 0.0,
+                 tick_latency=constant(0.0),
+                 observation_drop_rate: float = 0.0,
+                 crash_rate: float = 0.0,
+                 crash_downtime=constant(0.0)):
+        """
+
+        :param seed:
+        :param start_latency: time between startMission and the mission beginning.
+        :param start_failure_rate: probability of startMission raising a RuntimeError.
+        :param tick_latency: time before the effects of a command show up in the world state.
+        :param observation_drop_rate: probability of an observation never arriving.
+        :param crash_rate: probability of the client crashing on a command, ending the mission.
+        :param crash_downtime: time a crashed client refuses new missions.
+        """
+        self.seed = seed
+        self.rng = random.Random(seed)
+
+        self.start_latency = start_latency
+        self.start_failure_rate = start_failure_rate
+        self.tick_latency = tick_latency
+        self.observation_drop_rate = observation_drop_rate
+        self.crash_rate = crash_rate
+        self.crash_downtime = crash_downtime
+
+    def __repr__(self):
+        return "<FaultModel - seed: {} start failures: {} drops: {} crashes: {}>".format(
+            self.seed, self.start_failure_rate, self.observation_drop_rate, self.crash_rate)
+
+    def sample(self, distribution) -> float:
+        return max(0.0, distribution(self.rng))
+
+    def happens(self, rate: float) -> bool:
+        return rate > 0 and self.rng.random() < rate
+
+
+# clients are shared between agent hosts, a crashed client is down for everyone using it.
+_client_down_until = {}
+_client_lock = threading.Lock()
+
+
+def client_available(client: str) -> bool:
+    with _client_lock:
+        return _client_down_until.get(client, 0) <= time.time()
+
+
+def crash_client(client: str, downtime: float):
+    with _client_lock:
+        _client_down_until[client] = max(_client_down_until.get(client, 0), time.time() + downtime)
+
+
+def restore_clients():
+    with _client_lock:
+        _client_down_until.clear()
+
+
+class FaultyAgentHost(fake_malmo.AgentHost):
+    """
+    A fake AgentHost whose timing and failures follow a FaultModel.
+
+    """
+
+    def __init__(self, fault_model: FaultModel = None):
+        super().__init__()
+
+        self.fault_model = fault_model or FaultModel()
+        self.client = DEFAULT_CLIENT
+
+        self.failed_starts = 0
+        self.dropped_observations = 0
+        self.crashes = 0
+
+    def _start_latency(self) -> float:
+        return self.fault_model.sample(self.fault_model.start_latency)
+
+    def _tick_latency(self) -> float:
+        return self.fault_model.sample(self.fault_model.tick_latency)
+
+    def startMission(self, mission_spec: fake_malmo.MissionSpec, *args):
+        if len(args) >= 3 and args[0].clients:
+            client = args[0].clients[0]
+            self.client = "{}:{}".format(client.ip_address, client.port)
+
+        if not client_available(self.client):
+            self.failed_starts += 1
+            raise RuntimeError("Failed to find an available client for this mission - tried all the clients "
+                               "in the supplied client pool.")
+
+        if self.fault_model.happens(self.fault_model.start_failure_rate):
+            self.failed_starts += 1
+            raise RuntimeError("Failed to start the mission: simulated failure on {}.".format(self.client))
+
+        super().startMission(mission_spec, *args)
+
+    def sendCommand(self, command: str, key: str = None):
+        if self._running and self.fault_model.happens(self.fault_model.crash_rate):
+            self.crashes += 1
+
+            downtime = self.fault_model.sample(self.fault_model.crash_downtime)
+            logger.info("Simulating a crash of {}, down for {:.1f}s".format(self.client, downtime))
+
+            crash_client(self.client, downtime)
+
+            self._pending = []
+            self._simulator.ended = "Client {} crashed.".format(self.client)
+            self._state.errors.append(fake_malmo.TimestampedString(
+                "Lost the connection to the Minecraft client {}.".format(self.client)))
+            return
+
+        super().sendCommand(command, key)
+
+    def _deliver(self, reward: float):
+        # only the observations following commands are dropped, so the faults drawn do not depend on how often the
+        # world state is polled. The env waits for the next tick's observation.
+        if reward is not None and self.fault_model.happens(self.fault_model.observation_drop_rate):
+            self.dropped_observations += 1
+            self._deliver_reward(reward)
+            return
+
+        super()._deliver(reward)
+
+
+def install(seed: int = 0, **fault_settings) -> types.ModuleType:
+    """
+    Registers a MalmoPython module whose agent hosts inject faults. Each agent host gets its own FaultModel,
+    seeded with seed plus the number of hosts created before it.
+
+    :param seed:
+    :param fault_settings: see FaultModel
+    :return:
+    """
+    module = types.ModuleType("MalmoPython", fake_malmo.__doc__)
+    module.__dict__.update({name: value for name, value in vars(fake_malmo).items() if not name.startswith("__")})
+
+    counter = {'hosts': 0}
+    lock = threading.Lock()
+
+    def agent_host():
+        with lock:
+            host_seed = seed + counter['hosts']
+            counter['hosts'] += 1
+        return FaultyAgentHost(FaultModel(seed=host_seed, **fault_settings))
+
+    module.AgentHost = agent_host
+
+    sys.modules['MalmoPython'] = module
+    return module
@@ -10,6 +10,14 @@ from gym import spaces, error
 
 import MalmoPython
 import common.malmo.malmo_server as minecraft_py
+from common.malmo.world_diff import WorldDiffer
+from common.malmo.validation_cache import load_mission_spec
+from common.malmo.observation_space import parse_observation_shapes
+from common.malmo.world_state_log import RecordingAgentHost, WorldStateRecorder
+from common.malmo.episode_store import EpisodeWriter
+from common.malmo.colour_map import ColourMapLookup
+from common.malmo.stall_detector import StallDetector
+from common.malmo.position import TrajectoryRecorder
 
 SINGLE_DIRECTION_DISCRETE_MOVEMENTS = ["jumpeast", "jumpnorth", "jumpsouth", "jumpwest",
                                        "movenorth", "moveeast", "movesouth", "movewest",
@@ -29,7 +37,7 @@ class MalmoEnvironment(gym.Env):
     metadata = {'render.modes': ['human']}
 
     def __init__(self, parse_world_state=False,
-                 ):
+                 replay_buffer_size=5):
 
         self.logger = logging.getLogger(__name__)
 
@@ -46,8 +54,15 @@ class MalmoEnvironment(gym.Env):
         self.agent_position = None
         self._num_resets = 0
         self._reset_counter = 20
-        self.replay_buffer_size = 5
+        self.replay_buffer_size = replay_buffer_size
         self.replay_buffer = []
+        self.observation_shapes = None
+        self.world_differ = None
+        self._client_key = None
+        self.episode_writer = None
+        self.colour_map_lookup = None
+        self.stall_detector = None
+        self.trajectory_recorder = None
 
     def _load_mission(self, **kwargs) -> MalmoPython.MissionSpec:
         """
@@ -58,6 +73,15 @@ class MalmoEnvironment(gym.Env):
         """
         raise NotImplementedError("You must Implement a Mission Spec in order to start a mission!")
 
+    def mission_variants(self) -> [str]:
+        """
+        Override this function to list the XML of every mission _load_mission can produce, each is assumed to be
+        equally likely. This is used by backends that simulate the missions without Minecraft.
+
+        :return:
+        """
+        raise NotImplementedError("This environment does not list its mission variants.")
+
     def _world_state_parser(self, world_state: MalmoPython.WorldState) -> np.ndarray:
         """
         This function is used to control the encoding of the world state that is returned to the agent.
@@ -86,7 +110,7 @@ class MalmoEnvironment(gym.Env):
         # correct for the replay buffer size in the shape.
         shape[0] = int(shape[0]/self.replay_buffer_size)
 
-        initial_observation = np.zeros(shape=(tuple(shape)))
+        initial_observation = np.zeros(shape=(tuple(shape)), dtype=self.observation_space.dtype)
 
         self.replay_buffer = [initial_observation]*self.replay_buffer_size
 
@@ -94,7 +118,7 @@ class MalmoEnvironment(gym.Env):
     def load_mission_xml_from_file(path: str) -> MalmoPython.MissionSpec:
         with open(path, 'r') as f:
             mission_spec = f.read()
-        mission_spec = MalmoPython.MissionSpec(mission_spec, True)
+        mission_spec = load_mission_spec(mission_spec)
         return mission_spec
 
     def init(self, client_pool=None,
@@ -106,7 +130,7 @@ class MalmoEnvironment(gym.Env):
              step_sleep=0.001,
              skip_steps=0,
              tick_speed=5,
-             replay_buffer_size=5,
+             replay_buffer_size=None,
              logger=None,
              videoResolution=None,
              videoWithDepth=None,
@@ -124,8 +148,14 @@ class MalmoEnvironment(gym.Env):
              recordRewards=None,
              recordCommands=None,
              recordMP4=None,
+             recordWorldStates=None,
+             recordEpisodes=None,
              gameMode=None,
-             forceWorldReset=None):
+             forceWorldReset=None,
+             incrementalWorldEdits=None,
+             stallPatience=None,
+             maxEpisodeSteps=None,
+             recordTrajectories=None):
 
         if logger:
             self.logger = logger
@@ -139,7 +169,16 @@ class MalmoEnvironment(gym.Env):
         self.continuous_discrete = continuous_discrete
         self.add_noop_command = add_noop_command
 
-        self.replay_buffer_size = replay_buffer_size
+        if replay_buffer_size:
+            self.replay_buffer_size = replay_buffer_size
+
+        if stallPatience or maxEpisodeSteps:
+            # stalled episodes are quit early to free the client, the mission needs MissionQuitCommands.
+            self.stall_detector = StallDetector(patience=stallPatience, max_steps=maxEpisodeSteps)
+
+        if recordTrajectories:
+            # agent positions from ObservationFromFullStats, see common.malmo.position
+            self.trajectory_recorder = TrajectoryRecorder()
 
         self.mission_spec = self._load_mission()
         self.logger.info("Loaded mission: " + self.mission_spec.getSummary())
@@ -198,24 +237,43 @@ class MalmoEnvironment(gym.Env):
             for client in client_pool:
                 self.client_pool.add(MalmoPython.ClientInfo(*client))
 
-        # TODO: produce observation space dynamically based on requested features
+        if incrementalWorldEdits:
+            # we can only know what is drawn on a client if all our missions go to the same one.
+            if not client_pool:
+                self._client_key = "127.0.0.1:10000"
+            elif len(client_pool) == 1:
+                self._client_key = "{}:{}".format(*client_pool[0])
+
+            if self._client_key:
+                self.world_differ = WorldDiffer()
+            else:
+                self.logger.warning("Incremental world edits require a single client, drawing full missions.")
+
+        # the observation shapes are read from the mission so buffers can be sized before the first step.
+        self.observation_shapes = parse_observation_shapes(self.mission_spec.getAsXML(False))
+
+        if self.observation_shapes.video:
+            self.video_height, self.video_width, self.video_depth = self.observation_shapes.video
+            self.last_image = np.zeros(shape=self.observation_shapes.video, dtype=np.uint8)
+        elif self.observation_shapes.colour_map:
+            # colour map frames are observed as class indices, see common.malmo.colour_map
+            if self.colour_map_lookup is None:
+                self.colour_map_lookup = ColourMapLookup()
+            self.last_image = np.zeros(shape=self.observation_shapes.colour_map + (1,), dtype=np.uint8)
 
-        self.video_height = self.mission_spec.getVideoHeight(0)
-        self.video_width = self.mission_spec.getVideoWidth(0)
-        self.video_depth = self.mission_spec.getVideoChannels(0)
         if self.parse_world_state:
             self._build_observation_space()
+        elif self.observation_shapes.video:
+            self.observation_space = self.observation_shapes.video_space(frame_stack=self.replay_buffer_size)
         else:
-
-            self.observation_space = spaces.Box(low=0, high=255,
-                                                shape=(self.replay_buffer_size*self.video_height,
-                                                       self.video_width,
-                                                       self.video_depth))
-        self.last_image = np.zeros(shape=(self.video_height, self.video_width, self.video_depth))
-
+            self.observation_space = self.observation_shapes.colour_map_space(frame_stack=self.replay_buffer_size)
 
         self._create_action_space()
 
+        if recordEpisodes:
+            # observations, actions, rewards and dones for offline training, see common.malmo.episode_store
+            self.episode_writer = EpisodeWriter(recordEpisodes, self.observation_space, self.action_space)
+
         # mission recording
         self.mission_record_spec = MalmoPython.MissionRecordSpec()  # record nothing
         if recordDestination:
@@ -226,6 +284,9 @@ class MalmoEnvironment(gym.Env):
             self.mission_record_spec.recordCommands()
         if recordMP4:
             self.mission_record_spec.recordMP4(*recordMP4)
+        if recordWorldStates:
+            # a binary log of the raw world states, see common.malmo.world_state_log
+            self.agent_host = RecordingAgentHost(self.agent_host, WorldStateRecorder(recordWorldStates))
 
         if gameMode:
             if gameMode == "spectator":
@@ -281,6 +342,9 @@ class MalmoEnvironment(gym.Env):
                 elif ch == "Inventory":
                     # TODO: support for Inventory
                     self.logger.warning("Inventory management not supported, ignoring.")
+                elif ch == "MissionQuit":
+                    # only used to end stalled episodes, it is not an action.
+                    pass
                 else:
                     self.logger.warning("Unknown commandhandler " + ch)
 
@@ -359,12 +423,17 @@ class MalmoEnvironment(gym.Env):
         return world_state
 
     def _get_video_frame(self, world_state):
+        # Malmo delivers the frames of the ColourMapProducer apart from those of the VideoProducer.
+        frames = world_state.video_frames_colourmap if self.colour_map_lookup else world_state.video_frames
+
         # process the video frame
-        if world_state.number_of_video_frames_since_last_state > 0:
-            assert len(world_state.video_frames) == 1
-            frame = world_state.video_frames[-1]
+        if world_state.number_of_video_frames_since_last_state > 0 and frames:
+            assert len(frames) == 1
+            frame = frames[-1]
             image = np.frombuffer(frame.pixels, dtype=np.uint8)
             image = image.reshape((frame.height, frame.width, frame.channels))
+            if self.colour_map_lookup:
+                image = self.colour_map_lookup.classify(image)[..., np.newaxis]
             # self.logger.debug(image)
             self.last_image = image
         else:
@@ -409,6 +478,15 @@ class MalmoEnvironment(gym.Env):
         return np.vstack(self.replay_buffer)
 
     def step(self, action):
+        return self._receive_step(action, self._send_action(action))
+
+    def _send_action(self, action):
+        """
+        Sends the commands of an action, without waiting for their effects.
+
+        :param action:
+        :return: the world state the action was taken in.
+        """
         # take the action only if mission is still running
         world_state = self.agent_host.peekWorldState()
         if world_state.is_mission_running:
@@ -416,6 +494,18 @@ class MalmoEnvironment(gym.Env):
             self._take_action(action, world_state)
 
             self.num_actions += 1
+
+        return world_state
+
+    def _receive_step(self, action, world_state):
+        """
+        Waits for the world state following an action sent by _send_action, and returns the result of the step.
+
+        :param action:
+        :param world_state: returned by _send_action.
+        :return: obs, reward, done, info
+        """
+        if world_state.is_mission_running:
             # wait for the new state
             world_state = self._get_world_state()
 
@@ -449,48 +539,100 @@ class MalmoEnvironment(gym.Env):
             reward = sum([r.getValue() for r in world_state.rewards])
             obs_frame = self._get_video_frame(world_state)
             obs = self._update_replay_buffer_and_get_observation(obs_frame)
+
+        if self.trajectory_recorder is not None:
+            self.trajectory_recorder.record(info['observation'])
+
+        if not done and self.stall_detector and self.stall_detector.update(info['observation']):
+            self.logger.info("Ending the episode early, {}".format(self.stall_detector.reason))
+            reward += self._quit_mission()
+            done = True
+            info['TimeLimit.truncated'] = True
         if done:
             self.logger.info("Number of actions in iteration {}".format(self.num_actions))
+        if self.episode_writer:
+            self.episode_writer.add(action, reward, done, obs)
         return obs, reward, done, info
 
     def render(self, mode='human', close=False):
         pass
 
     def reset(self, force_reset=False):
+        self._prepare_mission(force_reset)
+        self._start_mission(self.mission_spec)
+        self._wait_for_mission_start()
+
+        return self._first_observation()
+
+    def _prepare_mission(self, force_reset=False):
+        """
+        Loads the mission of the next episode into self.mission_spec.
 
+        :param force_reset:
+        :return:
+        """
         self.num_actions = 0
 
         self.mission_spec = self._load_mission()
 
+        world_reset = True
+
         # force new world each time
         if self.forceWorldReset or force_reset:
             self.mission_spec.forceWorldReset()
         elif self._num_resets % self._reset_counter == 0:
             logging.info("Forcing WORLD RESET reset_counter {} ".format(self._num_resets))
             self.mission_spec.forceWorldReset()
+        else:
+            world_reset = False
 
         self._num_resets += 1
 
+        if self.world_differ:
+            if world_reset:
+                self.world_differ.forget(self._client_key)
+
+            # only send the blocks that changed since the last mission on this client.
+            mission_xml = self.world_differ.diff(self._client_key, self.mission_spec.getAsXML(False))
+            if mission_xml:
+                self.mission_spec = load_mission_spec(mission_xml)
+
+    def _start_mission(self, mission_spec: MalmoPython.MissionSpec, role: int = 0,
+                       experiment_id: str = "experiment_id"):
+        """
+        Starts the mission as one of its agents, retrying while no client is available.
+
+        :param mission_spec:
+        :param role: index of the AgentSection this environment plays.
+        :param experiment_id: shared by all the agents of a mission.
+        :return:
+        """
         # this seemed to increase probability of success in first try
         time.sleep(0.1)
         # Attempt to start a mission
         for retry in range(self.max_retries + 1):
             try:
                 if self.client_pool:
-                    self.agent_host.startMission(self.mission_spec, self.client_pool, self.mission_record_spec, 0,
-                                                 "experiment_id")
+                    self.agent_host.startMission(mission_spec, self.client_pool, self.mission_record_spec, role,
+                                                 experiment_id)
                 else:
-                    self.agent_host.startMission(self.mission_spec, self.mission_record_spec)
+                    self.agent_host.startMission(mission_spec, self.mission_record_spec)
                 break
             except RuntimeError as e:
                 if retry == self.max_retries:
                     self.logger.error("Error starting mission: " + str(e))
+                    if self.mc_process is not None and hasattr(self.mc_process, 'output'):
+                        self.logger.error("Latest output of the Minecraft client:\n" +
+                                          self.mc_process.output.tail(4096))
+                    if self.world_differ:
+                        self.world_differ.forget(self._client_key)
                     raise
                 else:
                     self.logger.warning("Error starting mission: " + str(e))
                     self.logger.info("Sleeping for %d seconds...", self.retry_sleep)
                     time.sleep(self.retry_sleep)
 
+    def _wait_for_mission_start(self):
         # Loop until mission starts:
         self.logger.info("Waiting for the mission to start")
         world_state = self.agent_host.getWorldState()
@@ -500,21 +642,51 @@ class MalmoEnvironment(gym.Env):
             for error in world_state.errors:
                 self.logger.warning(error.text)
 
+    def _quit_mission(self) -> float:
+        """
+        Quits the running mission and waits for it to end.
+
+        :return: the rewards received in the meantime.
+        """
+        self.agent_host.sendCommand("quit")
+
+        reward = 0.0
+        while True:
+            world_state = self._get_world_state(ignore_rewards=True)
+            reward += sum(r.getValue() for r in world_state.rewards)
+            if not world_state.is_mission_running:
+                return reward
+
+    def _first_observation(self):
         self._init_replay_buffer()
 
         self.logger.info("Mission running")
         self.logger.info("Collecting First Observation")
         world_state = self._get_world_state(ignore_rewards=True)
 
+        if self.stall_detector:
+            self.stall_detector.reset(self._get_observation(world_state))
+        if self.trajectory_recorder is not None:
+            self.trajectory_recorder.start_episode(self._get_observation(world_state))
+
         if self.parse_world_state:
             obs, _ = self._world_state_parser(world_state)
-            return obs
         else:
             obs_frame = self._get_video_frame(world_state)
             obs = self._update_replay_buffer_and_get_observation(obs_frame)
-            return obs
+
+        if self.episode_writer:
+            self.episode_writer.start_episode(obs)
+
+        return obs
 
     def close(self):
+        if isinstance(self.agent_host, RecordingAgentHost):
+            self.agent_host.recorder.close()
+        if self.episode_writer:
+            self.episode_writer.close()
+        if self.colour_map_lookup:
+            self.colour_map_lookup.close()
         if hasattr(self, 'mc_process') and self.mc_process:
             minecraft_py.stop(self.mc_process)
 
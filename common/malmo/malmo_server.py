@@ -1,12 +1,14 @@
 import os
-import sys
-import shlex
 import logging
 import subprocess
-import signal
-import socket
+import time
 import platform
-import psutil
+import threading
+
+from common.malmo.client_template import ClientTemplate, DEFAULT_JVM_OPTIONS
+from common.malmo.output_drainer import OutputDrainer, DEFAULT_CAPACITY
+from common.malmo.port_allocator import PortAllocator
+from common.malmo.process_tree import terminate_process_tree, ESCALATION
 
 """
 from https://github.com/tambetm/minecraft-py
@@ -39,67 +41,128 @@ else:
     else:
         mc_command = os.path.join(minecraft_dir, 'launchClientNoDisp.sh')
 
-def is_port_taken(port, address='0.0.0.0'):
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
-    try:
-        s.bind((address, port))
-        taken = False
-    except socket.error as e:
-        if e.errno in [98, 10048]:
-            taken = True
-        else:
-            raise e
-
-    s.close()
-    return taken
-
-def start(port=None):
-    # if no port was given, find the first free port starting from 10000
-    if not port:
-        port = 10000
-        while is_port_taken(port):
-            port += 1
-
+def _launch(directory: str, port: int, port_allocator: PortAllocator, output_capacity: int = DEFAULT_CAPACITY,
+            log_path: str = None):
     # start Minecraft process
-    cmd = mc_command + '-port' + str(port)
+    cmd = os.path.join(directory, os.path.basename(mc_command)) + ' -port ' + str(port)
     logger.info("Starting Minecraft process: "  + cmd)
+    start_time = time.time()
     if platform.system() == 'Windows':
-        proc = subprocess.Popen(cmd, cwd=minecraft_dir,
+        proc = subprocess.Popen(cmd, cwd=directory,
                 # pipe entire output
                 stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
     else:
         proc = subprocess.Popen(cmd,
-                                cwd=minecraft_dir,
+                                cwd=directory,
                 # pipe entire output
                 stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
                 # use process group, see http://stackoverflow.com/a/4791612/18576
                 preexec_fn=os.setsid, shell=True)
+    # the lease is held by the client, so it is reclaimed once the client exits.
+    port_allocator.transfer(port, proc.pid)
     # wait until Minecraft process has outputed "CLIENT enter state: DORMANT"
-    while True:
-        line = proc.stdout.readline()
+    ready, closed = threading.Event(), threading.Event()
+
+    def on_line(line):
         logger.debug(line)
-        if not line:
-            raise EOFError("Minecraft process finished unexpectedly")
         if b"CLIENT enter state: DORMANT" in line:
-            break
-    logger.info("Minecraft process ready")
-    # supress entire output, otherwise the subprocess will block
-    # NB! there will be still logs under Malmo/Minecraft/run/logs
-    FNULL = open(os.devnull, 'w')
-    proc.stdout = FNULL
+            ready.set()
+
+    def on_close():
+        closed.set()
+
+    # the output keeps being drained so the client never blocks on a full pipe, the latest of it is kept in
+    # proc.output for error reports.
+    proc.output = OutputDrainer(proc.stdout, capacity=output_capacity, log_path=log_path,
+                                on_line=on_line, on_close=on_close, name="minecraft-{}-output".format(port))
+    proc.output.start()
+
+    while not ready.wait(0.1) and not closed.is_set():
+        pass
+    if not ready.is_set():
+        raise EOFError("Minecraft process finished unexpectedly:\n" + proc.output.tail(4096))
+    proc.startup_time = time.time() - start_time
+    logger.info("Minecraft process ready after {:.1f}s".format(proc.startup_time))
+    return proc
+
+def start(port=None, port_allocator: PortAllocator = None, output_capacity: int = DEFAULT_CAPACITY,
+          log_path: str = None, template: ClientTemplate = None, instance_dir: str = None,
+          instance_mode: str = "overlay"):
+    """
+    Starts a Minecraft process and waits until it accepts missions, its startup time is kept in proc.startup_time.
+
+    :param port: leased from port_allocator if None.
+    :param port_allocator:
+    :param output_capacity: bytes of the latest output kept in proc.output.
+    :param log_path: file the output is also written to.
+    :param template: starts the process from a fresh instance of the template rather than the Malmo installation.
+    :param instance_dir: where the instance is created, under the template's instances_dir by default.
+    :param instance_mode: see ClientTemplate.instantiate.
+    :return: (proc, port)
+    """
+    port_allocator = port_allocator or PortAllocator()
+
+    # if no port was given, lease the first free port starting from 10000
+    if not port:
+        port, = port_allocator.acquire()
+
+    directory = minecraft_dir
+    if template is not None:
+        directory = template.instantiate(instance_dir or os.path.join(template.instances_dir, str(port)),
+                                         mode=instance_mode)
+
+    proc = _launch(directory, port, port_allocator, output_capacity=output_capacity, log_path=log_path)
     return proc, port
 
-def stop(proc):
-    if platform.system() == 'Windows':
-        parent = psutil.Process(proc.pid)
-        children = parent.children(recursive=True)
-        for child in children:
-            child.kill()
-        psutil.wait_procs(children, timeout=5)
-        #parent.kill()
-        parent.wait(5)
-    else:
-        # send SIGTERM to entire process group, see http://stackoverflow.com/a/4791612/18576
-        os.killpg(os.getpgid(proc.pid), signal.SIGTERM)
-    logger.info("Minecraft process terminated")
\ No newline at end of file
+def prepare_template(path: str, source_dir: str = None, jvm_options=DEFAULT_JVM_OPTIONS, warm_up: bool = True,
+                     port_allocator: PortAllocator = None) -> ClientTemplate:
+    """
+    Creates a client template from the Malmo installation. Warming it up launches a client from the template itself
+    until it is ready, which builds the mod and downloads the assets into it, and then again to measure the startup
+    time of its instances. Both startup times are kept in the template's manifest.
+
+    :param path: where the template is created.
+    :param source_dir: the Minecraft directory copied, that of the Malmo installation if None.
+    :param jvm_options:
+    :param warm_up:
+    :param port_allocator:
+    :return:
+    """
+    template = ClientTemplate.prepare(source_dir or minecraft_dir, path, jvm_options=jvm_options)
+    if not warm_up:
+        return template
+
+    port_allocator = port_allocator or PortAllocator()
+
+    for key in ("cold_startup_time", "warm_startup_time"):
+        port, = port_allocator.acquire()
+        proc = _launch(template.path, port, port_allocator)
+        template.record(**{key: proc.startup_time})
+        if not stop(proc, port_allocator):
+            raise RuntimeError("Unable to stop the client warming up the template {}".format(path))
+
+    logger.info("Client template {} ready, clients start in {:.1f}s instead of {:.1f}s".format(
+        path, template.manifest["warm_startup_time"], template.manifest["cold_startup_time"]))
+    return template
+
+def stop(proc, port_allocator: PortAllocator = None, escalation: tuple = ESCALATION) -> bool:
+    """
+    Stops the Minecraft process and everything it started, and releases its port.
+
+    :param proc:
+    :param port_allocator:
+    :param escalation: see terminate_process_tree.
+    :return: True if no process of the client is left.
+    """
+    survivors = terminate_process_tree(proc.pid, escalation)
+    # reaps the shell.
+    proc.poll()
+
+    (port_allocator or PortAllocator()).release(owner=proc.pid)
+
+    if survivors:
+        logger.error("Minecraft process left {} processes running".format(len(survivors)))
+        return False
+
+    logger.info("Minecraft process terminated")
+    return True
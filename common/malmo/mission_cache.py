@@ -0,0 +1,133 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.environ.get("GYM_MALMO_MISSION_CACHE",
+                                   os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+                                                "gym_malmo", "mission_cache"))
+
+
+def _sha1(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _atomic_write(path: str, text: str):
+    """
+    Writes a file such that concurrent readers never see a partially written file.
+
+    :param path:
+    :param text:
+    :return:
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except:
+        os.remove(tmp_path)
+        raise
+
+
+class MissionCache:
+    """
+    A content addressed, on-disk store of generated mission XML. Missions are stored under the hash of their XML,
+    and an index maps the hash of the generator parameters to the mission, so that a level only needs to be
+    generated and validated once across all processes sharing the cache directory.
+
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, validate=True):
+        """
+
+        :param cache_dir: directory the missions are stored in.
+        :param validate: validate missions against the Malmo schema before they are stored.
+        """
+        self.cache_dir = cache_dir
+        self.validate = validate
+        self.hits = 0
+        self.misses = 0
+
+        self._objects_dir = os.path.join(cache_dir, "objects")
+        self._index_dir = os.path.join(cache_dir, "index")
+
+        os.makedirs(self._objects_dir, exist_ok=True)
+        os.makedirs(self._index_dir, exist_ok=True)
+
+    @staticmethod
+    def key(**params) -> str:
+        """
+        Builds the index key for a set of generator parameters.
+
+        :param params: must be json serializable.
+        :return:
+        """
+        return _sha1(json.dumps(params, sort_keys=True))
+
+    def get(self, key: str) -> str:
+        """
+        Returns the mission XML for a key, or None if it has not been generated.
+
+        :param key:
+        :return:
+        """
+        try:
+            with open(os.path.join(self._index_dir, key), 'r') as f:
+                content_hash = f.read().strip()
+            with open(os.path.join(self._objects_dir, content_hash + ".xml"), 'r') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, mission_xml: str) -> str:
+        """
+        Validates and stores the mission XML under key, returning its content hash.
+
+        :param key:
+        :param mission_xml:
+        :return:
+        """
+        if self.validate:
+            self._validate(mission_xml)
+
+        content_hash = _sha1(mission_xml)
+        object_path = os.path.join(self._objects_dir, content_hash + ".xml")
+
+        if not os.path.isfile(object_path):
+            _atomic_write(object_path, mission_xml)
+
+        _atomic_write(os.path.join(self._index_dir, key), content_hash)
+
+        return content_hash
+
+    def get_or_generate(self, key: str, generator) -> str:
+        """
+        Returns the cached mission XML for a key, calling the generator and storing its result on a miss.
+
+        :param key: see MissionCache.key
+        :param generator: callable taking no arguments returning the mission XML (or an object whose str is the XML).
+        :return:
+        """
+        mission_xml = self.get(key)
+
+        if mission_xml is not None:
+            self.hits += 1
+            return mission_xml
+
+        self.misses += 1
+        mission_xml = str(generator())
+        self.put(key, mission_xml)
+        logger.debug("Generated mission {}".format(key))
+
+        return mission_xml
+
+    @staticmethod
+    def _validate(mission_xml: str):
+        from common.malmo.validation_cache import load_mission_spec
+
+        # raises a RuntimeError if the xml does not match the schema, and saves validating it again when it is loaded.
+        load_mission_spec(mission_xml)
@@ -0,0 +1,172 @@
+import logging
+import functools
+from collections import OrderedDict
+import xml.etree.ElementTree as ET
+
+import numpy as np
+from gym import spaces
+
+from common.malmo.world_diff import MALMO_NAMESPACE
+
+logger = logging.getLogger(__name__)
+
+
+class MissionObservationShapes:
+    """
+    The sizes of the observations a mission produces, read from its AgentHandlers. Use this to build observation
+    spaces before the mission is started.
+
+    """
+
+    def __init__(self, grids: OrderedDict, video: (int, int, int) = None, colour_map: (int, int) = None):
+        """
+
+        :param grids: grid name -> number of blocks observed.
+        :param video: (height, width, channels) of the video frames or None if the mission does not request video.
+        :param colour_map: (height, width) of the colour map frames or None if the mission does not request them.
+        """
+        self.grids = grids
+        self.video = video
+        self.colour_map = colour_map
+
+    def __repr__(self):
+        return "<MissionObservationShapes - grids: {} video: {} colour map: {}>".format(dict(self.grids), self.video,
+                                                                                        self.colour_map)
+
+    def grid_size(self, name: str) -> int:
+        if name not in self.grids:
+            raise KeyError("Unable to determine grid size {}, the mission observes {}".format(name,
+                                                                                            list(self.grids)))
+        return self.grids[name]
+
+    def grid_space(self, name: str, num_block_types: int, frame_stack: int = 1) -> spaces.Box:
+        """
+        The space of a one-hot encoded grid observation, stacked over frame_stack frames.
+
+        :param name:
+        :param num_block_types:
+        :param frame_stack:
+        :return:
+        """
+        return spaces.Box(low=0, high=1, shape=(self.grid_size(name) * frame_stack, num_block_types), dtype=np.int32)
+
+    def video_space(self, frame_stack: int = 1) -> spaces.Box:
+        """
+        The space of the video frames, stacked along the height over frame_stack frames.
+
+        :param frame_stack:
+        :return:
+        """
+        if not self.video:
+            raise KeyError("The mission does not request any video.")
+
+        height, width, channels = self.video
+
+        return spaces.Box(low=0, high=255, shape=(frame_stack * height, width, channels), dtype=np.uint8)
+
+    def colour_map_space(self, frame_stack: int = 1) -> spaces.Box:
+        """
+        The space of colour map frames converted to class indices, stacked along the height over frame_stack frames.
+
+        :param frame_stack:
+        :return:
+        """
+        if not self.colour_map:
+            raise KeyError("The mission does not request a colour map.")
+
+        height, width = self.colour_map
+
+        return spaces.Box(low=0, high=255, shape=(frame_stack * height, width, 1), dtype=np.uint8)
+
+
+def _find(element: ET.Element, path: str) -> ET.Element:
+    return element.find("/".join(MALMO_NAMESPACE + tag for tag in path.split("/")))
+
+
+def set_grid_radius(mission_xml: str, name: str, radius: int) -> str:
+    """
+    Resizes an ObservationFromGrid grid to cover radius blocks around the agent horizontally, the vertical
+    bounds are left unchanged.
+
+    :param mission_xml:
+    :param name:
+    :param radius:
+    :return:
+    """
+    mission = ET.fromstring(mission_xml)
+
+    observation_from_grid = _find(mission, "AgentSection/AgentHandlers/ObservationFromGrid")
+
+    grid = None
+    if observation_from_grid is not None:
+        grid = next((g for g in observation_from_grid.findall(MALMO_NAMESPACE + "Grid") if g.get("name") == name),
+                    None)
+
+    if grid is None:
+        raise KeyError("The mission does not observe the grid {}".format(name))
+
+    for axis in ("x", "z"):
+        _find(grid, "min").set(axis, str(-radius))
+        _find(grid, "max").set(axis, str(radius))
+
+    return ET.tostring(mission, encoding="unicode")
+
+
+@functools.lru_cache(maxsize=128)
+def parse_observation_shapes(mission_xml: str) -> MissionObservationShapes:
+    """
+    Reads the ObservationFromGrid, VideoProducer and ColourMapProducer handlers of the first agent in a mission.
+
+    :param mission_xml:
+    :return:
+    """
+    mission = ET.fromstring(mission_xml)
+
+    handlers = _find(mission, "AgentSection/AgentHandlers")
+
+    if handlers is None:
+        raise ValueError("The mission does not define any agent handlers.")
+
+    grids = OrderedDict()
+
+    observation_from_grid = _find(handlers, "ObservationFromGrid")
+
+    if observation_from_grid is not None:
+        for grid in observation_from_grid.findall(MALMO_NAMESPACE + "Grid"):
+            low = _find(grid, "min")
+            high = _find(grid, "max")
+
+            size = 1
+            for axis in ("x", "y", "z"):
+                size *= int(float(high.get(axis))) - int(float(low.get(axis))) + 1
+
+            grids[grid.get("name")] = size
+
+    video = None
+
+    video_producer = _find(handlers, "VideoProducer")
+
+    if video_producer is not None:
+        channels = 4 if video_producer.get("want_depth", "false").lower() == "true" else 3
+        video = (int(_find(video_producer, "Height").text), int(_find(video_producer, "Width").text), channels)
+
+    colour_map = None
+
+    colour_map_producer = _find(handlers, "ColourMapProducer")
+
+    if colour_map_producer is not None:
+        colour_map = (int(_find(colour_map_producer, "Height").text), int(_find(colour_map_producer, "Width").text))
+
+    return MissionObservationShapes(grids=grids, video=video, colour_map=colour_map)
+
+
+@functools.lru_cache(maxsize=128)
+def load_observation_shapes(path: str) -> MissionObservationShapes:
+    """
+    Reads the observation shapes of a mission template, the result is cached per template.
+
+    :param path:
+    :return:
+    """
+    with open(path, 'r') as f:
+        return parse_observation_shapes(f.read())
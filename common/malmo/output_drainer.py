@@ -0,0 +1,132 @@
+"""
+Keeps reading the output of a Minecraft client for as long as it runs. A client whose stdout pipe is not read blocks
+once the pipe's buffer is full, so the output is drained on a thread into a ring buffer holding its last capacity
+bytes, and optionally into rotating log files:
+
+    drainer = OutputDrainer(proc.stdout, capacity=64 * 1024, log_path="client-10000.log")
+    ...
+    logger.error("The client failed:\n" + drainer.tail())
+
+"""
+import os
+import logging
+import threading
+import collections
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = 64 * 1024
+
+
+class OutputDrainer(threading.Thread):
+    """
+    A thread reading lines from a binary stream until it closes.
+
+    """
+
+    def __init__(self,
+                 stream,
+                 capacity: int = DEFAULT_CAPACITY,
+                 log_path: str = None,
+                 max_log_bytes: int = 10 * 2 ** 20,
+                 log_backups: int = 3,
+                 on_line=None,
+                 on_close=None,
+                 name: str = None):
+        """
+
+        :param stream: a binary stream, eg. the stdout of a Popen.
+        :param capacity: bytes of output kept in memory.
+        :param log_path: file the output is also written to, not written if None.
+        :param max_log_bytes: size at which the log file is rotated.
+        :param log_backups: rotated log files kept, as log_path.1 to log_path.log_backups.
+        :param on_line: called with every line read, as bytes.
+        :param on_close: called once the stream is closed.
+        :param name: of the thread.
+        """
+        super().__init__(name=name, daemon=True)
+        self.stream = stream
+        self.capacity = capacity
+        self.log_path = log_path
+        self.max_log_bytes = max_log_bytes
+        self.log_backups = log_backups
+        self.on_line = on_line
+        self.on_close = on_close
+
+        self.total_bytes = 0
+
+        self._lines = collections.deque()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._log_file = None
+
+    def __repr__(self):
+        return "<OutputDrainer - {} of {} bytes kept>".format(self._size, self.total_bytes)
+
+    def _rotate(self):
+        self._log_file.close()
+        for index in range(self.log_backups - 1, 0, -1):
+            if os.path.isfile("{}.{}".format(self.log_path, index)):
+                os.replace("{}.{}".format(self.log_path, index), "{}.{}".format(self.log_path, index + 1))
+        if self.log_backups > 0:
+            os.replace(self.log_path, self.log_path + ".1")
+        self._log_file = open(self.log_path, 'wb')
+
+    def _write_log(self, line: bytes):
+        if self._log_file is None:
+            self._log_file = open(self.log_path, 'ab')
+
+        self._log_file.write(line)
+        self._log_file.flush()
+
+        if self._log_file.tell() >= self.max_log_bytes:
+            self._rotate()
+
+    def _keep(self, line: bytes):
+        with self._lock:
+            self._lines.append(line)
+            self._size += len(line)
+            self.total_bytes += len(line)
+
+            while self._size > self.capacity and len(self._lines) > 1:
+                self._size -= len(self._lines.popleft())
+
+    def run(self):
+        try:
+            for line in iter(self.stream.readline, b""):
+                self._keep(line)
+
+                if self.log_path is not None:
+                    try:
+                        self._write_log(line)
+                    except OSError:
+                        logger.exception("Unable to write the output to {}, no longer logging it".format(
+                            self.log_path))
+                        self.log_path = None
+
+                if self.on_line is not None:
+                    self.on_line(line)
+        except ValueError:
+            # the stream was closed by someone else.
+            pass
+        finally:
+            self.stream.close()
+            if self._log_file is not None:
+                self._log_file.close()
+            if self.on_close is not None:
+                self.on_close()
+
+    def tail(self, num_bytes: int = None) -> str:
+        """
+        The last output kept.
+
+        :param num_bytes: at most this much of it, everything kept if None.
+        :return:
+        """
+        with self._lock:
+            output = b"".join(self._lines)
+
+        if num_bytes is not None:
+            output = output[-num_bytes:]
+
+        return output.decode('utf-8', errors='replace')
@@ -0,0 +1,213 @@
+"""
+Leases ports to Minecraft clients, so processes launching clients at the same time never pick the same port.
+
+The leases of a machine are kept in a json file, and every change is made while holding an exclusive lock on a lock
+file next to it. A lease records the pid of its owner and optionally when it expires. Leases of owners that are no
+longer running and expired leases are reclaimed, and released ports are handed out again before new ones are probed:
+
+    allocator = PortAllocator()
+    port, = allocator.acquire()
+    proc = launch_client(port)
+    # the lease lives as long as the client rather than the launching process.
+    allocator.transfer(port, proc.pid)
+    ...
+    allocator.release(port)
+
+"""
+import os
+import json
+import time
+import socket
+import logging
+import platform
+import tempfile
+import contextlib
+
+import psutil
+
+if platform.system() == 'Windows':
+    import msvcrt
+else:
+    import fcntl
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT_RANGE = (10000, 11000)
+
+
+def default_lease_path() -> str:
+    return os.environ.get("MALMO_PORT_LEASES", os.path.join(tempfile.gettempdir(), "malmo_port_leases.json"))
+
+
+def is_port_taken(port, address='0.0.0.0'):
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+    try:
+        s.bind((address, port))
+        taken = False
+    except socket.error as e:
+        if e.errno in [98, 10048]:
+            taken = True
+        else:
+            raise e
+
+    s.close()
+    return taken
+
+
+class PortAllocator:
+    """
+    Port leases shared by every process of a machine through a lease file.
+
+    """
+
+    def __init__(self, path: str = None, port_range: tuple = DEFAULT_PORT_RANGE, lease_time: float = None):
+        """
+
+        :param path: the lease file, see default_lease_path.
+        :param port_range: (first, last) ports, inclusive.
+        :param lease_time: seconds until leases expire unless renewed, leases last until released or their owner exits
+        if None.
+        """
+        self.path = path or default_lease_path()
+        self.port_range = port_range
+        self.lease_time = lease_time
+
+    def __repr__(self):
+        return "<PortAllocator - {}, ports {}-{}>".format(self.path, *self.port_range)
+
+    @contextlib.contextmanager
+    def _leases(self):
+        """
+        Locks the lease file and yields its state, which is written back when the block exits without an error.
+
+        :return:
+        """
+        with open(self.path + ".lock", 'a+') as lock:
+            if platform.system() == 'Windows':
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+            else:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+
+            try:
+                state = {"leases": {}, "released": []}
+                if os.path.isfile(self.path):
+                    with open(self.path, 'r') as f:
+                        try:
+                            state = json.load(f)
+                        except ValueError:
+                            logger.warning("The port lease file {} is corrupt, starting over".format(self.path))
+
+                self._reclaim(state)
+
+                yield state
+
+                tmp_path = self.path + ".tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump(state, f, indent=2, sort_keys=True)
+                os.replace(tmp_path, self.path)
+            finally:
+                if platform.system() == 'Windows':
+                    lock.seek(0)
+                    msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+                else:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    @staticmethod
+    def _reclaim(state: dict):
+        now = time.time()
+        for port, lease in list(state["leases"].items()):
+            if not psutil.pid_exists(lease["owner"]):
+                reason = "its owner {} exited".format(lease["owner"])
+            elif lease["expires"] is not None and lease["expires"] < now:
+                reason = "it expired"
+            else:
+                continue
+
+            logger.info("Reclaiming the lease of port {}, {}".format(port, reason))
+            PortAllocator._free(state, int(port))
+
+    @staticmethod
+    def _free(state: dict, port: int):
+        del state["leases"][str(port)]
+        if port not in state["released"]:
+            state["released"].append(port)
+
+    def _lease(self, state: dict, port: int, owner: int):
+        state["leases"][str(port)] = {"owner": owner,
+                                      "acquired": time.time(),
+                                      "expires": time.time() + self.lease_time if self.lease_time else None}
+        if port in state["released"]:
+            state["released"].remove(port)
+
+    def acquire(self, count: int = 1, owner: int = None) -> list:
+        """
+        Leases free ports.
+
+        :param count:
+        :param owner: pid of the owner, this process by default.
+        :return: the ports.
+        """
+        owner = owner or os.getpid()
+        first, last = self.port_range
+
+        ports = []
+        with self._leases() as state:
+            # released ports first, they were bound by a client before so they are unlikely to be taken by others.
+            candidates = [port for port in state["released"] if first <= port <= last] + \
+                         [port for port in range(first, last + 1) if port not in state["released"]]
+
+            for port in candidates:
+                if len(ports) == count:
+                    break
+                if str(port) in state["leases"] or is_port_taken(port):
+                    continue
+
+                self._lease(state, port, owner)
+                ports.append(port)
+
+            if len(ports) < count:
+                raise RuntimeError("Only {} of {} ports are free in {}-{}".format(len(ports), count, first, last))
+
+        logger.debug("Leased ports {} to {}".format(ports, owner))
+        return ports
+
+    def transfer(self, port: int, owner: int):
+        """
+        Hands a lease to another process, eg. from the process launching a client to the client.
+
+        :param port:
+        :param owner:
+        :return:
+        """
+        with self._leases() as state:
+            self._lease(state, port, owner)
+
+    def renew(self, port: int):
+        with self._leases() as state:
+            lease = state["leases"].get(str(port))
+            if lease is None:
+                raise KeyError("Port {} is not leased".format(port))
+            if self.lease_time:
+                lease["expires"] = time.time() + self.lease_time
+
+    def release(self, port: int = None, owner: int = None):
+        """
+        Releases the lease of a port, or every lease of an owner.
+
+        :param port:
+        :param owner:
+        :return:
+        """
+        with self._leases() as state:
+            for leased_port, lease in list(state["leases"].items()):
+                if int(leased_port) == port or (owner is not None and lease["owner"] == owner):
+                    self._free(state, int(leased_port))
+
+    def leases(self) -> dict:
+        """
+        :return: port -> {"owner", "acquired", "expires"} of the current leases.
+        """
+        with self._leases() as state:
+            return {int(port): dict(lease) for port, lease in state["leases"].items()}
@@ -1,8 +1,19 @@
 import logging
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
+# one row of a trajectory.
+POSITION_DTYPE = np.dtype([('x', np.float32), ('y', np.float32), ('z', np.float32),
+                           ('yaw', np.float32), ('pitch', np.float32)])
+
+_FULL_STATS_KEYS = (u'XPos', u'YPos', u'ZPos', u'Yaw', u'Pitch')
+
+
 class AgentPositionOrientation:
+    __slots__ = ('_x', '_y', '_z', '_yaw', '_pitch')
+
     def __init__(self, x:float=0, y:float=0, z:float=0, yaw:float=0, pitch:float=0):
         self._x = x
         self._y = y
@@ -93,4 +104,110 @@ class AgentPositionOrientation:
         return self
 
 
+class TrajectoryRecorder:
+    """
+    Records the positions of an agent into a structured array per episode (see POSITION_DTYPE), instead of keeping
+    an AgentPositionOrientation per step.
+
+    """
+
+    def __init__(self, initial_capacity: int = 1024):
+        self.initial_capacity = initial_capacity
+
+        self.episodes = []
+
+        self._buffer = np.zeros(initial_capacity, dtype=POSITION_DTYPE)
+        self._length = 0
+
+    def __repr__(self):
+        return "<TrajectoryRecorder - {} episodes, {} steps in the current one>".format(len(self.episodes),
+                                                                                       self._length)
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def trajectory(self) -> np.ndarray:
+        """
+        The positions of the current episode, a view that is only valid until the next record.
+
+        :return:
+        """
+        return self._buffer[:self._length]
+
+    def start_episode(self, observation: dict = None):
+        """
+        Ends the current episode, if it has any positions, and starts a new one.
+
+        :param observation: the first full stats observation of the new episode.
+        :return:
+        """
+        if self._length:
+            self.episodes.append(self.trajectory.copy())
+            self._length = 0
+
+        if observation:
+            self.record(observation)
+
+    def record(self, observation: dict):
+        """
+        Appends the position of a full stats observation, incomplete observations are ignored.
+
+        :param observation:
+        :return:
+        """
+        if not observation or any(key not in observation for key in _FULL_STATS_KEYS):
+            return
+
+        self.record_position(*(observation[key] for key in _FULL_STATS_KEYS))
+
+    def record_position(self, x: float, y: float, z: float, yaw: float = 0, pitch: float = 0):
+        if self._length == len(self._buffer):
+            # amortised O(1) appends, like a list.
+            self._buffer = np.concatenate([self._buffer, np.zeros(len(self._buffer), dtype=POSITION_DTYPE)])
+
+        self._buffer[self._length] = (x, y, z, yaw, pitch)
+        self._length += 1
+
+
+def _coordinates(trajectory: np.ndarray) -> np.ndarray:
+    return np.stack([trajectory['x'], trajectory['y'], trajectory['z']], axis=-1).astype(np.float64)
+
+
+def path_length(trajectory: np.ndarray) -> float:
+    """
+    Distance travelled along a trajectory.
+
+    :param trajectory:
+    :return:
+    """
+    if len(trajectory) < 2:
+        return 0.0
+
+    return float(np.linalg.norm(np.diff(_coordinates(trajectory), axis=0), axis=1).sum())
+
+
+def visit_counts(trajectory: np.ndarray) -> (np.ndarray, np.ndarray):
+    """
+    Counts the steps spent in every block of a trajectory.
+
+    :param trajectory:
+    :return: (blocks, counts), the (x, y, z) of every visited block and its number of steps.
+    """
+    blocks = np.floor(_coordinates(trajectory)).astype(np.int64)
+
+    if not len(blocks):
+        return blocks, np.zeros(0, dtype=np.int64)
+
+    return np.unique(blocks, axis=0, return_counts=True)
+
+
+def distance_to_goal(trajectory: np.ndarray, goal: (float, float, float)) -> np.ndarray:
+    """
+    Distance from every position of a trajectory to a goal position.
 
+    :param trajectory:
+    :param goal: (x, y, z)
+    :return:
+    """
+    return np.linalg.norm(_coordinates(trajectory) - np.asarray(goal, dtype=np.float64), axis=-1)
@@ -0,0 +1,98 @@
+"""
+Stops a Minecraft client together with everything it started. The launch scripts start the JVM, and xvfb-run an X
+server, as children of a shell, so signalling the shell alone leaves them running as orphans. The whole tree and
+process group are signalled with escalating signals, and whatever is still running at the end is reported:
+
+    survivors = terminate_process_tree(proc.pid)
+
+"""
+import os
+import signal
+import logging
+import platform
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# signals sent in turn, and the seconds to wait for the processes to exit after each of them.
+ESCALATION = ((signal.SIGTERM, 10), (signal.SIGKILL, 5)) if platform.system() != 'Windows' else \
+    ((signal.SIGTERM, 10),)
+
+
+def _is_running(process: psutil.Process) -> bool:
+    # orphans which exited stay zombies until init reaps them.
+    try:
+        return process.status() != psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return False
+
+
+def process_tree(pid: int) -> list:
+    """
+    A process, its descendants and the other members of its process group, which may have been orphaned already.
+    The group is still swept once the process itself has exited and been reaped.
+
+    :param pid:
+    :return:
+    """
+    try:
+        root = psutil.Process(pid)
+        processes = [root] + root.children(recursive=True)
+    except psutil.NoSuchProcess:
+        root, processes = None, []
+
+    if platform.system() != 'Windows':
+        if root is None:
+            # a group outlives its leader, and no other group can take the leader's pid as its id meanwhile.
+            sweep = True
+        else:
+            try:
+                # the clients get their own group at launch, other groups must not be swept up with them.
+                sweep = os.getpgid(pid) == pid
+            except ProcessLookupError:
+                sweep = True
+
+        if sweep:
+            known = {process.pid for process in processes}
+            for process in psutil.process_iter():
+                try:
+                    if process.pid not in known and os.getpgid(process.pid) == pid:
+                        processes.append(process)
+                except (ProcessLookupError, psutil.NoSuchProcess):
+                    pass
+
+    return processes
+
+
+def terminate_process_tree(pid: int, escalation: tuple = ESCALATION) -> list:
+    """
+    Signals a process tree with each signal of escalation in turn until all of it has exited.
+
+    :param pid:
+    :param escalation: (signal, seconds to wait) pairs.
+    :return: the processes still running at the end, empty if the tree is gone.
+    """
+    alive = process_tree(pid)
+
+    for sig, timeout in escalation:
+        if not alive:
+            break
+
+        for process in alive:
+            try:
+                process.send_signal(sig)
+            except psutil.NoSuchProcess:
+                pass
+
+        _, alive = psutil.wait_procs(alive, timeout=timeout)
+        alive = [process for process in alive if _is_running(process)]
+
+        if alive:
+            logger.warning("{} processes of {} still running after {}".format(len(alive), pid,
+                                                                               signal.Signals(sig).name))
+
+    if alive:
+        logger.error("Unable to stop processes {} of {}".format([process.pid for process in alive], pid))
+
+    return alive
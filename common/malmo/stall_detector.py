@@ -0,0 +1,86 @@
+import math
+import logging
+
+from common.malmo.position import AgentPositionOrientation
+
+logger = logging.getLogger(__name__)
+
+
+class StallDetector:
+    """
+    Decides when an episode should be cut short, because the agent has not entered a block it had not visited
+    before for patience steps, eg. when it keeps bumping into a wall, or because the episode used up its step budget.
+    Positions are read from ObservationFromFullStats.
+
+    """
+
+    def __init__(self, patience: int = None, max_steps: int = None):
+        """
+
+        :param patience: steps without visiting a new block before the episode is stalled.
+        :param max_steps: steps per episode.
+        """
+        self.patience = patience
+        self.max_steps = max_steps
+
+        self.position = AgentPositionOrientation()
+        self.visited = set()
+        self.steps = 0
+        self.steps_without_progress = 0
+        self.reason = None
+
+    def __repr__(self):
+        return "<StallDetector - {} steps, {} without progress>".format(self.steps, self.steps_without_progress)
+
+    def _visit(self) -> bool:
+        if self.position.x is None:
+            return False
+
+        cell = (math.floor(self.position.x), math.floor(self.position.y), math.floor(self.position.z))
+        if cell in self.visited:
+            return False
+
+        self.visited.add(cell)
+        return True
+
+    def reset(self, observation: dict = None):
+        """
+        Starts a new episode.
+
+        :param observation: the first full stats observation of the episode.
+        :return:
+        """
+        self.position = AgentPositionOrientation.from_observation(observation) if observation \
+            else AgentPositionOrientation(None, None, None, None, None)
+        self.visited = set()
+        self.steps = 0
+        self.steps_without_progress = 0
+        self.reason = None
+
+        self._visit()
+
+    def update(self, observation: dict) -> bool:
+        """
+        Records a step.
+
+        :param observation: the full stats observation following the step.
+        :return: True if the episode should be ended.
+        """
+        self.steps += 1
+
+        if observation and u'XPos' in observation:
+            self.position.update(observation)
+
+        if self._visit():
+            self.steps_without_progress = 0
+        else:
+            self.steps_without_progress += 1
+
+        if self.patience is not None and self.steps_without_progress >= self.patience:
+            self.reason = "no new block visited in {} steps".format(self.steps_without_progress)
+        elif self.max_steps is not None and self.steps >= self.max_steps:
+            self.reason = "step budget of {} used".format(self.max_steps)
+        else:
+            return False
+
+        return True
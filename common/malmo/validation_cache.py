@@ -0,0 +1,121 @@
+import os
+import hashlib
+import logging
+from collections import OrderedDict
+
+import MalmoPython
+
+logger = logging.getLogger(__name__)
+
+
+class MissionValidationCache:
+    """
+    Remembers which mission XML documents have passed schema validation, so that MalmoPython.MissionSpec only
+    validates a mission the first time it is seen. Results are kept in an in-memory LRU and optionally in a directory
+    shared between processes.
+
+    In strict mode the on-disk store is not trusted, every mission is validated the first time this process sees it.
+
+    """
+
+    def __init__(self, max_size: int = 1024, cache_dir: str = None, strict: bool = False):
+        """
+
+        :param max_size: number of mission hashes kept in memory.
+        :param cache_dir: optional directory to persist validated mission hashes in.
+        :param strict:
+        """
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        self.strict = strict
+
+        self.hits = 0
+        self.misses = 0
+
+        self._valid = OrderedDict()
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(mission_xml: str) -> str:
+        # the schemas are part of the key, a mission valid against one version of Malmo may not be valid in another.
+        schema = os.environ.get("MALMO_XSD_PATH", "")
+        return hashlib.sha1((schema + "\n" + mission_xml).encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str):
+        self._valid[key] = True
+        self._valid.move_to_end(key)
+
+        if len(self._valid) > self.max_size:
+            self._valid.popitem(last=False)
+
+    def is_valid(self, key: str) -> bool:
+        """
+        Returns true if the mission with this key is known to be valid.
+
+        :param key:
+        :return:
+        """
+        if key in self._valid:
+            self._valid.move_to_end(key)
+            return True
+
+        if self.cache_dir and not self.strict and os.path.isfile(os.path.join(self.cache_dir, key)):
+            self._remember(key)
+            return True
+
+        return False
+
+    def mission_spec(self, mission_xml: str) -> MalmoPython.MissionSpec:
+        """
+        Builds a MalmoPython.MissionSpec, skipping schema validation if the mission has been validated before.
+
+        :param mission_xml:
+        :return:
+        """
+        key = self.key(mission_xml)
+
+        if self.is_valid(key):
+            self.hits += 1
+            return MalmoPython.MissionSpec(mission_xml, False)
+
+        self.misses += 1
+
+        # raises a RuntimeError if the xml is invalid, failures are never cached.
+        mission_spec = MalmoPython.MissionSpec(mission_xml, True)
+
+        self._remember(key)
+
+        if self.cache_dir:
+            open(os.path.join(self.cache_dir, key), 'a').close()
+
+        return mission_spec
+
+
+_default_cache = MissionValidationCache(cache_dir=os.environ.get("GYM_MALMO_VALIDATION_CACHE"))
+
+
+def set_default_validation_cache(cache: MissionValidationCache):
+    """
+    Replaces the cache used by load_mission_spec.
+
+    :param cache:
+    :return:
+    """
+    global _default_cache
+    _default_cache = cache
+
+
+def get_default_validation_cache() -> MissionValidationCache:
+    return _default_cache
+
+
+def load_mission_spec(mission_xml: str) -> MalmoPython.MissionSpec:
+    """
+    Drop in replacement for MalmoPython.MissionSpec(mission_xml, True) which only validates unseen missions.
+
+    :param mission_xml:
+    :return:
+    """
+    return _default_cache.mission_spec(mission_xml)
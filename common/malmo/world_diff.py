@@ -0,0 +1,217 @@
+import math
+import logging
+import xml.etree.ElementTree as ET
+
+logger = logging.getLogger(__name__)
+
+MALMO_NAMESPACE = '{http://ProjectMalmo.microsoft.com}'
+
+# write the mission back out without namespace prefixes
+ET.register_namespace('', 'http://ProjectMalmo.microsoft.com')
+ET.register_namespace('xsi', 'http://www.w3.org/2001/XMLSchema-instance')
+
+# block ids that can appear in a flat world generator string.
+FLAT_WORLD_BLOCK_IDS = {
+    0: "air",
+    1: "stone",
+    2: "grass",
+    3: "dirt",
+    4: "cobblestone",
+    7: "bedrock",
+    8: "flowing_water",
+    9: "water",
+    12: "sand",
+    13: "gravel",
+    24: "sandstone",
+    78: "snow_layer",
+    80: "snow",
+    82: "clay",
+}
+
+# blocks the agent can change during a mission (flipping a lever opens a door etc.), these are always re-drawn
+# since we cannot know what state they were left in.
+VOLATILE_BLOCK_TYPES = {"lever", "wooden_door", "iron_door", "spruce_door", "birch_door", "jungle_door",
+                        "acacia_door", "dark_oak_door", "trapdoor", "iron_trapdoor", "stone_button",
+                        "wooden_button", "redstone_wire", "unpowered_repeater", "powered_repeater",
+                        "unpowered_comparator", "powered_comparator", "redstone_torch", "unlit_redstone_torch"}
+
+
+def parse_flat_world(generator_string: str) -> [str]:
+    """
+    Parses a flat world generator string (eg. "3;7,1,2*3;3;") into the block type of each layer, starting at y=0.
+
+    :param generator_string:
+    :return:
+    """
+    layers = []
+    for layer in generator_string.split(";")[1].split(","):
+        if "*" in layer:
+            count, block_id = layer.split("*")
+        else:
+            count, block_id = 1, layer
+
+        block_id = int(block_id.split(":")[0])
+
+        if block_id not in FLAT_WORLD_BLOCK_IDS:
+            raise KeyError("Unknown block id {} in flat world generator {}".format(block_id, generator_string))
+
+        layers += [FLAT_WORLD_BLOCK_IDS[block_id]] * int(count)
+
+    return layers
+
+
+def _line_points(x1: int, y1: int, z1: int, x2: int, y2: int, z2: int) -> [(int, int, int)]:
+    """
+    Enumerates the blocks on a line between two points, the same way Malmo steps along a DrawLine.
+
+    :return:
+    """
+    steps = max(abs(x2 - x1), abs(y2 - y1), abs(z2 - z1))
+
+    if steps == 0:
+        return [(x1, y1, z1)]
+
+    # rounds half up like java's Math.round
+    return [(int(math.floor(x1 + i * (x2 - x1) / steps + 0.5)),
+             int(math.floor(y1 + i * (y2 - y1) / steps + 0.5)),
+             int(math.floor(z1 + i * (z2 - z1) / steps + 0.5))) for i in range(steps + 1)]
+
+
+def rasterize_drawing_decorator(decorator: ET.Element, skip_unsupported: bool = False) -> dict:
+    """
+    Converts the contents of a DrawingDecorator into a map of (x, y, z) -> (type, variant, face), applied
+    in the order they are drawn. Returns None if the decorator contains objects that are not simple blocks,
+    unless skip_unsupported is set in which case they are ignored.
+
+    :param decorator:
+    :param skip_unsupported:
+    :return:
+    """
+    voxels = {}
+
+    for element in decorator:
+        tag = element.tag.replace(MALMO_NAMESPACE, "")
+        state = (element.get("type"), element.get("variant"), element.get("face"))
+
+        if tag == "DrawBlock":
+            voxels[(int(element.get("x")), int(element.get("y")), int(element.get("z")))] = state
+        elif tag == "DrawCuboid":
+            x1, y1, z1, x2, y2, z2 = [int(element.get(key)) for key in ("x1", "y1", "z1", "x2", "y2", "z2")]
+            for x in range(min(x1, x2), max(x1, x2) + 1):
+                for y in range(min(y1, y2), max(y1, y2) + 1):
+                    for z in range(min(z1, z2), max(z1, z2) + 1):
+                        voxels[(x, y, z)] = state
+        elif tag == "DrawLine":
+            for point in _line_points(*[int(element.get(key)) for key in ("x1", "y1", "z1", "x2", "y2", "z2")]):
+                voxels[point] = state
+        elif skip_unsupported:
+            logger.debug("Skipping {}".format(tag))
+        else:
+            logger.debug("Unable to rasterize {}".format(tag))
+            return None
+
+    return voxels
+
+
+def find_world_elements(mission: ET.Element) -> (ET.Element, ET.Element):
+    """
+    Returns the FlatWorldGenerator and DrawingDecorator elements of a mission.
+
+    :param mission:
+    :return:
+    """
+    server_handlers = mission.find("{0}ServerSection/{0}ServerHandlers".format(MALMO_NAMESPACE))
+
+    if server_handlers is None:
+        return None, None
+
+    return server_handlers.find(MALMO_NAMESPACE + "FlatWorldGenerator"), \
+        server_handlers.find(MALMO_NAMESPACE + "DrawingDecorator")
+
+
+class WorldDiffer:
+    """
+    Remembers what the previous mission drew on each client, so that the next mission only needs to send the
+    blocks which have changed instead of redrawing the entire level. This relies on Malmo re-using the existing
+    world when a mission does not force a world reset.
+
+    """
+
+    def __init__(self):
+        self._drawn = {}
+
+    def forget(self, client: str = None):
+        """
+        Forget what was drawn on a client, eg. after the world was reset. If no client is given all clients are
+        forgotten.
+
+        :param client:
+        :return:
+        """
+        if client is None:
+            self._drawn = {}
+        else:
+            self._drawn.pop(client, None)
+
+    def diff(self, client: str, mission_xml: str) -> str:
+        """
+        Records the world drawn by mission_xml on the client, and returns the mission XML with the DrawingDecorator
+        replaced by the minimal set of block changes from the previous mission. Returns None when the full mission
+        needs to be sent (nothing known about the client, a different flat world or un-diffable draw objects).
+
+        :param client:
+        :param mission_xml:
+        :return:
+        """
+        mission = ET.fromstring(mission_xml)
+        generator, decorator = find_world_elements(mission)
+
+        if generator is None or decorator is None:
+            self.forget(client)
+            return None
+
+        generator_string = generator.get("generatorString", "")
+        voxels = rasterize_drawing_decorator(decorator)
+
+        previous = self._drawn.get(client)
+
+        if voxels is None:
+            self.forget(client)
+            return None
+
+        self._drawn[client] = (generator_string, voxels)
+
+        if previous is None or previous[0] != generator_string:
+            return None
+
+        try:
+            layers = parse_flat_world(generator_string)
+        except (KeyError, IndexError, ValueError):
+            logger.warning("Unable to parse flat world {}, sending full mission.".format(generator_string))
+            return None
+
+        changes = {}
+
+        for position, state in voxels.items():
+            if previous[1].get(position) != state or state[0] in VOLATILE_BLOCK_TYPES:
+                changes[position] = state
+
+        # blocks that are no longer drawn are returned to the flat world
+        for position in previous[1].keys() - voxels.keys():
+            y = position[1]
+            changes[position] = (layers[y] if 0 <= y < len(layers) else "air", None, None)
+
+        for element in list(decorator):
+            decorator.remove(element)
+
+        for (x, y, z), (block_type, variant, face) in sorted(changes.items()):
+            block = ET.SubElement(decorator, MALMO_NAMESPACE + "DrawBlock",
+                                  x=str(x), y=str(y), z=str(z), type=block_type)
+            if variant:
+                block.set("variant", variant)
+            if face:
+                block.set("face", face)
+
+        logger.debug("Drawing {} changed blocks instead of {}".format(len(changes), len(voxels)))
+
+        return ET.tostring(mission, encoding="unicode")
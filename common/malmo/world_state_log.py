@@ -0,0 +1,368 @@
+"""
+Records the world states an AgentHost returns into a compact binary log, and replays them without Minecraft.
+
+Recording wraps the agent host of an environment, every world state returned by getWorldState is logged with the
+observation text, rewards, video and colour map frames, control messages and errors:
+
+    env.init(..., recordWorldStates="episodes.wsl")
+
+Replaying returns the logged world states in order, startMission skips to the next logged episode and commands are
+ignored. MalmoPython only has to be importable, eg. through common.malmo.fake_malmo.install():
+
+    env.agent_host = ReplayAgentHost("episodes.wsl")
+
+The log is a header followed by records of (type, length, payload), payloads are zlib compressed when that saves
+space.
+"""
+import time
+import zlib
+import struct
+import logging
+
+import common.malmo.fake_malmo as fake_malmo
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"MALMOWSL"
+# version 2 appends the colour map frames to the world states.
+VERSION = 2
+
+EPISODE, WORLD_STATE, COMMAND = 1, 2, 3
+
+# set in the record type when the payload is compressed.
+_COMPRESSED = 0x80
+
+_HEADER = struct.Struct("<8sH")
+_RECORD = struct.Struct("<BI")
+_WORLD_STATE = struct.Struct("<d??III")
+_FRAME = struct.Struct("<HHBI5f")
+_COUNT = struct.Struct("<I")
+_REWARD = struct.Struct("<d")
+
+
+def _pack_strings(strings: [str]) -> bytes:
+    parts = [_COUNT.pack(len(strings))]
+    for string in strings:
+        data = string.encode("utf-8")
+        parts.append(_COUNT.pack(len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def _unpack_strings(payload: memoryview, offset: int) -> ([str], int):
+    count, = _COUNT.unpack_from(payload, offset)
+    offset += _COUNT.size
+
+    strings = []
+    for _ in range(count):
+        length, = _COUNT.unpack_from(payload, offset)
+        offset += _COUNT.size
+        strings.append(bytes(payload[offset:offset + length]).decode("utf-8"))
+        offset += length
+
+    return strings, offset
+
+
+def _pack_frames(frames) -> [bytes]:
+    parts = [_COUNT.pack(len(frames))]
+    for frame in frames:
+        pixels = bytes(frame.pixels)
+        parts.append(_FRAME.pack(frame.width, frame.height, frame.channels, len(pixels),
+                                 frame.xPos, frame.yPos, frame.zPos, frame.yaw, frame.pitch))
+        parts.append(pixels)
+    return parts
+
+
+def _unpack_frames(payload: memoryview, offset: int) -> (list, int):
+    count, = _COUNT.unpack_from(payload, offset)
+    offset += _COUNT.size
+
+    frames = []
+    for _ in range(count):
+        width, height, channels, length, x, y, z, yaw, pitch = _FRAME.unpack_from(payload, offset)
+        offset += _FRAME.size
+
+        frame = fake_malmo.TimestampedVideoFrame(width, height, channels, bytes(payload[offset:offset + length]))
+        frame.xPos, frame.yPos, frame.zPos, frame.yaw, frame.pitch = x, y, z, yaw, pitch
+        frames.append(frame)
+        offset += length
+
+    return frames, offset
+
+
+def pack_world_state(world_state, elapsed: float = 0.0) -> bytes:
+    """
+    Serialises a MalmoPython.WorldState.
+
+    :param world_state:
+    :param elapsed: seconds since the episode started.
+    :return:
+    """
+    parts = [_WORLD_STATE.pack(elapsed,
+                               world_state.has_mission_begun,
+                               world_state.is_mission_running,
+                               world_state.number_of_observations_since_last_state,
+                               world_state.number_of_rewards_since_last_state,
+                               world_state.number_of_video_frames_since_last_state)]
+
+    parts.append(_pack_strings([observation.text for observation in world_state.observations]))
+
+    parts.append(_COUNT.pack(len(world_state.rewards)))
+    parts.extend(_REWARD.pack(reward.getValue()) for reward in world_state.rewards)
+
+    parts.extend(_pack_frames(world_state.video_frames))
+
+    parts.append(_pack_strings([message.text for message in world_state.mission_control_messages]))
+    parts.append(_pack_strings([error.text for error in world_state.errors]))
+
+    parts.extend(_pack_frames(getattr(world_state, 'video_frames_colourmap', [])))
+
+    return b"".join(parts)
+
+
+def unpack_world_state(payload: bytes) -> (fake_malmo.WorldState, float):
+    """
+    Rebuilds a world state logged by pack_world_state, returns it with its elapsed time.
+
+    :param payload:
+    :return:
+    """
+    payload = memoryview(payload)
+    world_state = fake_malmo.WorldState()
+
+    elapsed, world_state.has_mission_begun, world_state.is_mission_running, \
+        world_state.number_of_observations_since_last_state, world_state.number_of_rewards_since_last_state, \
+        world_state.number_of_video_frames_since_last_state = _WORLD_STATE.unpack_from(payload, 0)
+    offset = _WORLD_STATE.size
+
+    observations, offset = _unpack_strings(payload, offset)
+    world_state.observations = [fake_malmo.TimestampedString(text) for text in observations]
+
+    count, = _COUNT.unpack_from(payload, offset)
+    offset += _COUNT.size
+    for _ in range(count):
+        world_state.rewards.append(fake_malmo.TimestampedReward(_REWARD.unpack_from(payload, offset)[0]))
+        offset += _REWARD.size
+
+    world_state.video_frames, offset = _unpack_frames(payload, offset)
+
+    messages, offset = _unpack_strings(payload, offset)
+    world_state.mission_control_messages = [fake_malmo.TimestampedString(text) for text in messages]
+
+    errors, offset = _unpack_strings(payload, offset)
+    world_state.errors = [fake_malmo.TimestampedString(text) for text in errors]
+
+    # version 1 logs end here.
+    if offset < len(payload):
+        world_state.video_frames_colourmap, offset = _unpack_frames(payload, offset)
+
+    return world_state, elapsed
+
+
+class WorldStateRecorder:
+    """
+    Appends episodes, world states and commands to a world state log.
+
+    """
+
+    def __init__(self, path: str, compress: bool = True):
+        self.path = path
+        self.compress = compress
+
+        self._file = open(path, 'wb')
+        self._file.write(_HEADER.pack(MAGIC, VERSION))
+        self._episode_start = time.time()
+
+        self.num_episodes = 0
+        self.num_world_states = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _write(self, record_type: int, payload: bytes):
+        if self.compress:
+            compressed = zlib.compress(payload, 1)
+            if len(compressed) < len(payload):
+                record_type, payload = record_type | _COMPRESSED, compressed
+
+        self._file.write(_RECORD.pack(record_type, len(payload)))
+        self._file.write(payload)
+
+    def start_episode(self, mission_xml: str):
+        self._episode_start = time.time()
+        self.num_episodes += 1
+        self._write(EPISODE, mission_xml.encode("utf-8"))
+
+    def record_world_state(self, world_state):
+        self.num_world_states += 1
+        self._write(WORLD_STATE, pack_world_state(world_state, time.time() - self._episode_start))
+
+    def record_command(self, command: str):
+        self._write(COMMAND, command.encode("utf-8"))
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+class RecordedEpisode:
+    def __init__(self, mission_xml: str):
+        self.mission_xml = mission_xml
+        self.world_states = []
+        self.elapsed = []
+        self.commands = []
+
+    def __repr__(self):
+        return "<RecordedEpisode - {} world states, {} commands>".format(len(self.world_states), len(self.commands))
+
+
+def read_world_state_log(path: str) -> [RecordedEpisode]:
+    """
+    Reads every episode in a world state log, a truncated last record is ignored.
+
+    :param path:
+    :return:
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    magic, version = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("{} is not a world state log.".format(path))
+    if version > VERSION:
+        raise ValueError("{} was written by a newer version ({}) of the world state log.".format(path, version))
+
+    episodes = []
+    offset = _HEADER.size
+
+    while offset + _RECORD.size <= len(data):
+        record_type, length = _RECORD.unpack_from(data, offset)
+        offset += _RECORD.size
+
+        if offset + length > len(data):
+            logger.warning("Ignoring a truncated record at the end of {}".format(path))
+            break
+
+        payload = data[offset:offset + length]
+        offset += length
+
+        if record_type & _COMPRESSED:
+            record_type, payload = record_type & ~_COMPRESSED, zlib.decompress(payload)
+
+        if record_type == EPISODE:
+            episodes.append(RecordedEpisode(payload.decode("utf-8")))
+        elif not episodes:
+            raise ValueError("{} has records before its first episode.".format(path))
+        elif record_type == WORLD_STATE:
+            world_state, elapsed = unpack_world_state(payload)
+            episodes[-1].world_states.append(world_state)
+            episodes[-1].elapsed.append(elapsed)
+        elif record_type == COMMAND:
+            episodes[-1].commands.append(payload.decode("utf-8"))
+        else:
+            raise ValueError("Unknown record type {} in {}".format(record_type, path))
+
+    return episodes
+
+
+class RecordingAgentHost:
+    """
+    Wraps an AgentHost and logs the missions it starts, the commands it sends and the world states it returns.
+
+    """
+
+    def __init__(self, agent_host, recorder: WorldStateRecorder):
+        self.agent_host = agent_host
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self.agent_host, name)
+
+    def startMission(self, mission_spec, *args):
+        self.agent_host.startMission(mission_spec, *args)
+        self.recorder.start_episode(mission_spec.getAsXML(False))
+
+    def sendCommand(self, command: str, *args):
+        self.agent_host.sendCommand(command, *args)
+        self.recorder.record_command(command)
+
+    def getWorldState(self):
+        world_state = self.agent_host.getWorldState()
+        self.recorder.record_world_state(world_state)
+        return world_state
+
+
+class ReplayAgentHost:
+    """
+    Plays back a world state log as fast as it is read. peekWorldState returns the next logged world state and
+    getWorldState consumes it, once an episode runs out the mission is reported as ended.
+
+    """
+
+    def __init__(self, path: str, loop: bool = True):
+        """
+
+        :param path:
+        :param loop: start over at the first episode after the last one.
+        """
+        self.episodes = read_world_state_log(path)
+        self.loop = loop
+
+        if not self.episodes:
+            raise ValueError("{} does not contain any episodes.".format(path))
+
+        self._episode = -1
+        self._index = 0
+
+        self.commands = []
+
+    def _next_world_state(self) -> fake_malmo.WorldState:
+        if self._episode < 0:
+            return fake_malmo.WorldState()
+
+        world_states = self.episodes[self._episode].world_states
+
+        if self._index < len(world_states):
+            return world_states[self._index]
+
+        # past the end of the episode the mission has ended.
+        world_state = fake_malmo.WorldState()
+        world_state.has_mission_begun = True
+        return world_state
+
+    def setObservationsPolicy(self, policy):
+        pass
+
+    def setRewardsPolicy(self, policy):
+        pass
+
+    def setVideoPolicy(self, policy):
+        pass
+
+    def startMission(self, mission_spec, *args):
+        self._episode += 1
+
+        if self._episode >= len(self.episodes):
+            if not self.loop:
+                raise RuntimeError("The world state log has no more episodes.")
+            self._episode = 0
+
+        self._index = 0
+        self.commands = []
+
+    def sendCommand(self, command: str, *args):
+        self.commands.append(command)
+
+    def peekWorldState(self) -> fake_malmo.WorldState:
+        return self._next_world_state()
+
+    def getWorldState(self) -> fake_malmo.WorldState:
+        world_state = self._next_world_state()
+        self._index += 1
+        return world_state
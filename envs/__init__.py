@@ -1,3 +1,6 @@
+import re
+
+import gym
 from gym.envs.registration import register
 
 register(
@@ -13,4 +16,154 @@ register(
 register(
     id='MalmoDiscreteSimpleHallwaysVisual-v0',
     entry_point='envs.discrete.simple_hallways_visual:SimpleHallwaysVisualEnv',
-)
\ No newline at end of file
+)
+
+# Parametrized environment families. Ids look like MalmoSimpleHallways-grid-len12-r3-fs4-v0, the observation mode
+# picks the entry point and every other token maps a short name onto a constructor argument. Ids are only
+# registered when they are first used, and the entry points are strings so nothing is imported until gym.make.
+ENV_FAMILIES = {
+    'MalmoSimpleHallways': {
+        'grid': ('envs.discrete.simple_hallways:SimpleHallwaysEnv',
+                 {'len': 'hallway_length', 'r': 'grid_radius', 'fs': 'frame_stack'}),
+        'visual': ('envs.discrete.simple_hallways_visual:SimpleHallwaysVisualEnv',
+                   {'len': 'hallway_length', 'fs': 'frame_stack'}),
+    },
+    'MalmoTMaze': {
+        'grid': ('envs.discrete.procedural_levels:TMazeEnv',
+                 {'len': 'length', 'c': 'num_corridors', 'r': 'grid_radius', 'fs': 'frame_stack',
+                  'n': 'num_levels', 's': 'level_seed'}),
+    },
+    'MalmoMaze': {
+        'grid': ('envs.discrete.procedural_levels:MazeEnv',
+                 {'w': 'width', 'h': 'height', 'r': 'grid_radius', 'fs': 'frame_stack',
+                  'n': 'num_levels', 's': 'level_seed'}),
+    },
+}
+
+_FAMILY_ENV_ID = re.compile(r'^(?P<family>\w+)-(?P<mode>[a-z]+)(?P<params>(-[a-z]+\d+)*)-v(?P<version>\d+)$')
+_FAMILY_PARAM = re.compile(r'([a-z]+)(\d+)')
+
+
+def family_env_id(family: str, mode: str = 'grid', version: int = 0, **params) -> str:
+    """
+    Builds the env id of a variant of an environment family and registers it.
+
+    eg. family_env_id('MalmoSimpleHallways', hallway_length=12, frame_stack=4)
+        -> 'MalmoSimpleHallways-grid-fs4-len12-v0', the parameters are ordered by argument name.
+
+    :param family: one of ENV_FAMILIES
+    :param mode: observation mode.
+    :param version:
+    :param params: constructor arguments of the environment.
+    :return:
+    """
+    if family not in ENV_FAMILIES or mode not in ENV_FAMILIES[family]:
+        raise KeyError("Unknown environment family {} with observation mode {}".format(family, mode))
+
+    _, arguments = ENV_FAMILIES[family][mode]
+    short_names = {argument: short_name for short_name, argument in arguments.items()}
+
+    tokens = [family, mode]
+    for argument, value in sorted(params.items()):
+        if argument not in short_names:
+            raise KeyError("{} ({}) does not accept the parameter {}".format(family, mode, argument))
+        tokens.append("{}{}".format(short_names[argument], int(value)))
+
+    env_id = "-".join(tokens) + "-v{}".format(version)
+
+    register_family_env(env_id)
+
+    return env_id
+
+
+def register_family_env(env_id: str) -> bool:
+    """
+    Registers a family env id with gym if it is not registered yet. Returns False if the id is not a family id.
+
+    :param env_id:
+    :return:
+    """
+    try:
+        gym.spec(env_id)
+        return True
+    except gym.error.Error:
+        pass
+
+    match = _FAMILY_ENV_ID.match(env_id)
+
+    if not match or match.group('family') not in ENV_FAMILIES \
+            or match.group('mode') not in ENV_FAMILIES[match.group('family')]:
+        return False
+
+    entry_point, arguments = ENV_FAMILIES[match.group('family')][match.group('mode')]
+
+    kwargs = {}
+    for short_name, value in _FAMILY_PARAM.findall(match.group('params')):
+        if short_name not in arguments:
+            raise KeyError("Unknown parameter {} in env id {}".format(short_name, env_id))
+        kwargs[arguments[short_name]] = int(value)
+
+    register(id=env_id, entry_point=entry_point, kwargs=kwargs)
+
+    return True
+
+
+# 'malmo' runs the environments in Minecraft, 'numpy' simulates them with envs.discrete.vectorized.
+BACKENDS = ('malmo', 'numpy')
+
+
+def make(env_id: str, backend: str = 'malmo', **kwargs) -> gym.Env:
+    """
+    gym.make which also accepts ids of environment family variants that have not been registered yet.
+
+    :param env_id:
+    :param backend: one of BACKENDS.
+    :param kwargs:
+    :return:
+    """
+    if backend not in BACKENDS:
+        raise KeyError("Unknown backend {}, expected one of {}".format(backend, BACKENDS))
+
+    register_family_env(env_id)
+
+    if backend == 'numpy':
+        from envs.discrete.vectorized import GridWorldEnv, ensure_mission_api
+
+        ensure_mission_api()
+        return GridWorldEnv(gym.make(env_id, **kwargs).unwrapped)
+
+    return gym.make(env_id, **kwargs)
+
+
+def make_vec(env_id: str, num_envs: int, seed: int = None, init_kwargs: dict = None, backend: str = 'numpy',
+             **kwargs):
+    """
+    Creates num_envs copies of an environment stepped together by the NumPy backend. Malmo cannot share a Minecraft
+    client between agents, so Minecraft environments are vectorized with one environment per client in a
+    ShmemVecEnv instead.
+
+    :param env_id:
+    :param num_envs:
+    :param seed: seeds the NumPy backend.
+    :param init_kwargs: arguments passed to the environment's init.
+    :param backend: one of BACKENDS.
+    :param kwargs: arguments passed to the environment's constructor.
+    :return: a GridWorldVecEnv
+    """
+    if backend not in BACKENDS:
+        raise KeyError("Unknown backend {}, expected one of {}".format(backend, BACKENDS))
+
+    register_family_env(env_id)
+
+    if backend == 'malmo':
+        raise NotImplementedError("Malmo cannot share a Minecraft client between agents, run one environment per "
+                                  "client in a ShmemVecEnv.")
+
+    from envs.discrete.vectorized import GridWorldVecEnv, ensure_mission_api
+
+    ensure_mission_api()
+
+    env = gym.make(env_id, **kwargs).unwrapped
+    env.init(start_minecraft=False, **(init_kwargs or {}))
+
+    return GridWorldVecEnv(env, num_envs=num_envs, seed=seed)
@@ -1,13 +1,13 @@
-import MalmoPython
 import os
 import logging
 import random
 import json
 import numpy as np
-from gym import spaces
 
 from common.malmo.malmo_env import MalmoEnvironment
 from common.malmo.mission_xml import MissionSpec
+from common.malmo.validation_cache import load_mission_spec
+from common.malmo.observation_space import load_observation_shapes
 from common.malmo.drawing_utils import *
 
 
@@ -21,10 +21,26 @@ class KeysAndDoorsEnv(MalmoEnvironment):
 
     metadata = {'render.modes': []}
 
+    observation_grid = "floor3x3"
+
+    block_encoding = {
+        "stone": [1, 0, 0, 0, 0],
+        "dirt": [1, 0, 0, 0, 0],
+        "air": [0, 1, 0, 0, 0],
+        "iron_door": [0, 0, 1, 0, 0],
+        "lever": [0, 0, 0, 1, 0],
+        "diamond_block": [0, 0, 0, 0, 1],
+    }
+
+    lever_positions = [{'x': -6, 'y': 3, 'z': -1, 'face': malmo_types.Facing.SOUTH},
+                       {'x': 1, 'y': 3, 'z': -6, 'face': malmo_types.Facing.WEST},
+                       {'x': -1, 'y': 3, 'z': 6, 'face': malmo_types.Facing.EAST}]
+
     def __init__(self):
         self._spec_path = os.path.join(os.path.dirname(__file__), "schemas/keys_and_doors_mission.xml")
 
-        self.observation_space = spaces.Box(low=0, high=1, shape=(5, 18), dtype=np.int32)
+        self.observation_space = load_observation_shapes(self._spec_path).grid_space(self.observation_grid,
+                                                                                     num_block_types=5)
         super().__init__(parse_world_state=True)
 
     def __draw_hallways(self):
@@ -60,21 +76,17 @@ class KeysAndDoorsEnv(MalmoEnvironment):
 
         self.mission_spec.append_objects_to_drawing_decorator(rooms)
 
-    def __draw_levers_and_doors(self):
+    def __draw_levers_and_doors(self, lever_position: dict = None):
         doors_and_levers = []
 
         doors_and_levers += draw_door(x=5, y=2, z=-2, type=malmo_types.BlockType.iron_door)
 
-        lever_positions = [{'x': -6, 'y': 3, 'z': -1, 'face': malmo_types.Facing.SOUTH},
-                           {'x': 1, 'y': 3, 'z': -6, 'face': malmo_types.Facing.WEST},
-                           {'x': -1, 'y': 3, 'z': 6, 'face': malmo_types.Facing.EAST}]
-
         # first we clear the old lever positions
         doors_and_levers += [build_element(malmo_types.DrawBlock, type=malmo_types.BlockType.air, **pos)
-                             for pos in lever_positions]
+                             for pos in self.lever_positions]
 
         # select a new lever position
-        current_lever_position = random.choice(lever_positions)
+        current_lever_position = lever_position or random.choice(self.lever_positions)
         doors_and_levers.append(
             build_element(malmo_types.DrawBlock, type=malmo_types.BlockType.lever, **current_lever_position))
 
@@ -123,10 +135,19 @@ class KeysAndDoorsEnv(MalmoEnvironment):
 
         self.mission_spec.append_objects_to_drawing_decorator([goal])
 
-    def _load_mission(self, **kwargs):
+    def _build_observation_space(self):
+        """
+        The floor3x3 grid one-hot encoded over 5 block types, observations are not stacked.
+
+        :return:
+        """
+        self.observation_space = self.observation_shapes.grid_space(self.observation_grid, num_block_types=5)
+
+    def _load_mission(self, lever_position: dict = None, **kwargs):
         """
         Mutates and returns the mission spec.
 
+        :param lever_position: one of lever_positions, picked at random if not set.
         :param kwargs:
         :return:
         """
@@ -135,30 +156,25 @@ class KeysAndDoorsEnv(MalmoEnvironment):
 
         self.__draw_hallways()
         self.__draw_rooms()
-        self.__draw_levers_and_doors()
+        self.__draw_levers_and_doors(lever_position)
         self.__draw_wires()
         self.__draw_goal()
 
-        return MalmoPython.MissionSpec(str(self.mission_spec), True)
+        return load_mission_spec(str(self.mission_spec))
 
-    def _world_state_parser(self, world_state):
-        obs_map = {
-            "stone": [1, 0, 0, 0, 0],
-            "dirt": [1, 0, 0, 0, 0],
-            "air": [0, 1, 0, 0, 0],
-            "iron_door": [0, 0, 1, 0, 0],
-            "lever": [0, 0, 0, 1, 0],
-            "diamond_block": [0, 0, 0, 0, 1],
-        }
+    def mission_variants(self):
+        return [self._load_mission(lever_position=lever_position).getAsXML(False)
+                for lever_position in self.lever_positions]
 
+    def _world_state_parser(self, world_state):
         observations = self._get_observation(world_state)
 
-        floor = observations["floor3x3"]
+        floor = observations[self.observation_grid]
 
         obs = []
 
         for block in floor:
-            obs.append(obs_map[block])
+            obs.append(self.block_encoding[block])
 
         return np.array(obs, dtype=np.int32), sum([r.getValue() for r in world_state.rewards])
 
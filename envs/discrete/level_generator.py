@@ -0,0 +1,220 @@
+import os
+import random
+import hashlib
+import logging
+
+from common.malmo.mission_xml import MissionSpec
+from common.malmo.mission_cache import MissionCache
+from common.malmo.drawing_utils import *
+
+logger = logging.getLogger(__name__)
+
+# bump this whenever a generator changes the levels it produces for a given seed, it invalidates cached missions.
+LEVEL_GENERATOR_VERSION = 1
+
+DEFAULT_TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), "schemas/procedural_mission.xml")
+
+# floor blocks shown at the start of a t-maze to indicate which corridor holds the goal.
+INDICATOR_BLOCKS = [malmo_types.BlockType.gold_block,
+                    malmo_types.BlockType.redstone_block,
+                    malmo_types.BlockType.emerald_block,
+                    malmo_types.BlockType.lapis_block,
+                    malmo_types.BlockType.iron_block,
+                    malmo_types.BlockType.coal_block]
+
+_NEIGHBOURS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+
+def _carve(x1: int, z1: int, x2: int, z2: int) -> malmo_types.DrawCuboid:
+    """
+    Carves a two block high passage out of the ground between two points.
+
+    :return:
+    """
+    return build_element(malmo_types.DrawCuboid, x1=x1, y1=2, z1=z1, x2=x2, y2=3, z2=z2,
+                         type=malmo_types.BlockType.air)
+
+
+def _floor_block(x: int, z: int, type: malmo_types.BlockType) -> malmo_types.DrawBlock:
+    return build_element(malmo_types.DrawBlock, x=x, y=1, z=z, type=type)
+
+
+def generate_maze(seed: int, width: int = 5, height: int = 5, template_path: str = DEFAULT_TEMPLATE_PATH) -> MissionSpec:
+    """
+    Generates a perfect maze of width x height cells with a recursive backtracker. The agent starts in the
+    cell at the origin and the goal is placed in the cell furthest from it.
+
+    :param seed:
+    :param width:
+    :param height:
+    :param template_path:
+    :return:
+    """
+    rng = random.Random(seed)
+
+    visited = {(0, 0)}
+    stack = [(0, 0)]
+    distance = {(0, 0): 0}
+    passages = []
+
+    while stack:
+        i, j = stack[-1]
+        options = [(i + di, j + dj) for di, dj in _NEIGHBOURS
+                   if 0 <= i + di < width and 0 <= j + dj < height and (i + di, j + dj) not in visited]
+
+        if not options:
+            stack.pop()
+            continue
+
+        cell = rng.choice(options)
+        visited.add(cell)
+        distance[cell] = distance[(i, j)] + 1
+        passages.append(_carve(2 * i, 2 * j, 2 * cell[0], 2 * cell[1]))
+        stack.append(cell)
+
+    # ties are broken by position so the goal only depends on the seed.
+    goal = max(distance, key=lambda cell: (distance[cell], cell))
+
+    mission_spec = MissionSpec(template_path)
+    mission_spec.append_objects_to_drawing_decorator(passages)
+    mission_spec.append_objects_to_drawing_decorator(
+        [_floor_block(2 * goal[0], 2 * goal[1], malmo_types.BlockType.diamond_block)])
+
+    return mission_spec
+
+
+def generate_t_maze(seed: int, length: int = 5, num_corridors: int = 2, corridor_length: int = 3,
+                    corridor_spacing: int = 4, template_path: str = DEFAULT_TEMPLATE_PATH) -> MissionSpec:
+    """
+    Generates a T-maze, a hallway of the given length running east which ends in a cross hallway with
+    num_corridors corridors branching off it. The goal is at the end of one corridor, which is indicated by the
+    block in the floor next to the agent's start.
+
+    :param seed:
+    :param length: length of the starting hallway.
+    :param num_corridors: number of corridors the goal can be in.
+    :param corridor_length:
+    :param corridor_spacing: distance between neighbouring corridors.
+    :param template_path:
+    :return:
+    """
+    if length < 2:
+        raise ValueError("A T-maze needs a hallway length of at least 2, got {}".format(length))
+    if not 2 <= num_corridors <= len(INDICATOR_BLOCKS):
+        raise ValueError("A T-maze supports 2 to {} corridors, got {}".format(len(INDICATOR_BLOCKS),
+                                                                              num_corridors))
+
+    rng = random.Random(seed)
+
+    offset = (num_corridors - 1) * corridor_spacing // 2
+    corridors = [i * corridor_spacing - offset for i in range(num_corridors)]
+    goal_index = rng.randrange(num_corridors)
+
+    drawing = [_carve(0, 0, length, 0),
+               _carve(length, corridors[0], length, corridors[-1])]
+
+    for i, z in enumerate(corridors):
+        end = length + corridor_length
+        drawing.append(_carve(length, z, end, z))
+        drawing.append(_floor_block(end, z, malmo_types.BlockType.diamond_block if i == goal_index
+                                    else malmo_types.BlockType.stone))
+
+    drawing.append(_floor_block(1, 0, INDICATOR_BLOCKS[goal_index]))
+
+    mission_spec = MissionSpec(template_path)
+    mission_spec.append_objects_to_drawing_decorator(drawing)
+
+    return mission_spec
+
+
+def generate_key_door_chain(seed: int, num_doors: int = 2, min_room_length: int = 3, max_room_length: int = 6,
+                            template_path: str = DEFAULT_TEMPLATE_PATH) -> MissionSpec:
+    """
+    Generates a hallway running east that is split into rooms by iron doors. Each door is opened by a lever in an
+    alcove beside it, the goal is at the end of the last room.
+
+    :param seed:
+    :param num_doors:
+    :param min_room_length:
+    :param max_room_length:
+    :param template_path:
+    :return:
+    """
+    rng = random.Random(seed)
+
+    room_lengths = [rng.randint(min_room_length, max_room_length) for _ in range(num_doors + 1)]
+    end = sum(room_lengths) + num_doors
+
+    drawing = [_carve(0, 0, end, 0)]
+    doors_and_levers = []
+
+    x = 0
+    for room_length in room_lengths[:-1]:
+        x += room_length + 1
+        side = rng.choice([-1, 1])
+
+        drawing.append(_carve(x - 1, side, x - 1, side))
+        doors_and_levers += draw_door(x=x, y=2, z=0, type=malmo_types.BlockType.iron_door)
+        # the lever sits in the wall right beside the door, facing into the alcove.
+        doors_and_levers.append(build_element(malmo_types.DrawBlock, x=x, y=3, z=side,
+                                              type=malmo_types.BlockType.lever, face=malmo_types.Facing.WEST))
+
+    drawing.append(_floor_block(end, 0, malmo_types.BlockType.diamond_block))
+
+    mission_spec = MissionSpec(template_path)
+    mission_spec.append_objects_to_drawing_decorator(drawing + doors_and_levers)
+
+    return mission_spec
+
+
+GENERATORS = {
+    'maze': generate_maze,
+    't_maze': generate_t_maze,
+    'key_door_chain': generate_key_door_chain,
+}
+
+
+def _template_hash(template_path: str) -> str:
+    with open(template_path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def load_level(kind: str, seed: int, cache: MissionCache = None, **params) -> str:
+    """
+    Returns the mission XML for a generated level, generating and validating it only if it is not in the cache.
+
+    :param kind: one of GENERATORS
+    :param seed:
+    :param cache: defaults to a MissionCache in the default cache directory.
+    :param params: passed through to the generator.
+    :return:
+    """
+    generator = GENERATORS.get(kind)
+
+    if not generator:
+        raise KeyError("The level generator {} has not been implemented.".format(kind))
+
+    if cache is None:
+        cache = MissionCache()
+
+    template_path = params.pop("template_path", DEFAULT_TEMPLATE_PATH)
+
+    key = cache.key(kind=kind,
+                    seed=seed,
+                    version=LEVEL_GENERATOR_VERSION,
+                    template=_template_hash(template_path),
+                    **params)
+
+    return cache.get_or_generate(key, lambda: generator(seed=seed, template_path=template_path, **params))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    mission_cache = MissionCache(validate=False)
+
+    for kind in GENERATORS:
+        for level_seed in range(3):
+            load_level(kind, level_seed, cache=mission_cache)
+
+    logger.info("Generated {} levels, {} were cached.".format(mission_cache.misses, mission_cache.hits))
@@ -0,0 +1,141 @@
+import random
+import logging
+import numpy as np
+
+from common.malmo.malmo_env import MalmoEnvironment
+from common.malmo.validation_cache import load_mission_spec
+from common.malmo.observation_space import parse_observation_shapes, set_grid_radius
+
+from envs.discrete.level_generator import load_level, DEFAULT_TEMPLATE_PATH
+
+
+class ProceduralLevelEnv(MalmoEnvironment):
+    """
+    Plays a new procedurally generated level every episode. Levels are drawn from a seeded sequence, so the
+    same env seed always produces the same levels, and are loaded from the mission cache after the first time
+    they are generated.
+
+    """
+
+    metadata = {'render.modes': []}
+
+    block_types = ["stone", "dirt", "air", "diamond_block", "gold_block", "redstone_block", "emerald_block",
+                   "lapis_block", "iron_block", "coal_block", "lever", "iron_door"]
+
+    def __init__(self, kind: str, level_params: dict = None, grid_radius: int = 1, frame_stack: int = 5,
+                 num_levels: int = None, level_seed: int = None):
+        """
+
+        :param kind: the level generator to use, see envs.discrete.level_generator.GENERATORS
+        :param level_params: parameters passed to the level generator.
+        :param grid_radius: number of blocks observed around the agent.
+        :param frame_stack: number of observations stacked together.
+        :param num_levels: if set, levels are drawn from this many seeds, otherwise every level is new.
+        :param level_seed: seed of the sequence of levels.
+        """
+        self._kind = kind
+        self._level_params = level_params or {}
+        self._grid_radius = grid_radius
+        self._num_levels = num_levels
+        self._level_rng = random.Random(level_seed)
+
+        self.__observe_grid = "floor3x3"
+        self.__obs_map = {block: one_hot for block, one_hot in zip(self.block_types,
+                                                                   np.eye(len(self.block_types), dtype=np.int32))}
+
+        with open(DEFAULT_TEMPLATE_PATH, 'r') as f:
+            template = f.read()
+
+        self.observation_space = parse_observation_shapes(
+            set_grid_radius(template, self.__observe_grid, grid_radius)).grid_space(
+            self.__observe_grid, num_block_types=len(self.block_types), frame_stack=frame_stack)
+
+        super().__init__(parse_world_state=True, replay_buffer_size=frame_stack)
+
+    def _build_observation_space(self):
+        self.observation_space = self.observation_shapes.grid_space(self.__observe_grid,
+                                                                    num_block_types=len(self.block_types),
+                                                                    frame_stack=self.replay_buffer_size)
+
+    def _load_mission(self, **kwargs):
+        """
+        Loads the next level in the sequence.
+
+        :param kwargs:
+        :return:
+        """
+        if self._num_levels:
+            level = self._level_rng.randrange(self._num_levels)
+        else:
+            level = self._level_rng.getrandbits(32)
+
+        self.logger.info("Loading {} level {}".format(self._kind, level))
+
+        mission_xml = load_level(self._kind, level, **self._level_params)
+
+        if self._grid_radius != 1:
+            mission_xml = set_grid_radius(mission_xml, self.__observe_grid, self._grid_radius)
+
+        return load_mission_spec(mission_xml)
+
+    def _world_state_parser(self, world_state):
+
+        observations = self._get_observation(world_state)
+
+        surrounds = observations[self.__observe_grid]
+
+        obs = [self.__obs_map[block] for block in surrounds]
+
+        observation = self._update_replay_buffer_and_get_observation(np.array(obs, dtype=np.int32))
+
+        return observation, sum([r.getValue() for r in world_state.rewards])
+
+    def seed(self, seed=None):
+        self._level_rng.seed(seed)
+        return [seed]
+
+
+class TMazeEnv(ProceduralLevelEnv):
+    """
+    A T-maze with a variable hallway length and number of corridors, the block at the start of the hallway shows
+    which corridor holds the goal.
+
+    """
+
+    def __init__(self, length: int = 5, num_corridors: int = 2, grid_radius: int = 1, frame_stack: int = 5,
+                 num_levels: int = None, level_seed: int = None):
+        super().__init__(kind='t_maze',
+                         level_params={'length': length, 'num_corridors': num_corridors},
+                         grid_radius=grid_radius,
+                         frame_stack=frame_stack,
+                         num_levels=num_levels,
+                         level_seed=level_seed)
+
+
+class MazeEnv(ProceduralLevelEnv):
+    """
+    A randomly generated maze of width x height cells with the goal in the cell furthest from the start.
+
+    """
+
+    def __init__(self, width: int = 5, height: int = 5, grid_radius: int = 1, frame_stack: int = 5,
+                 num_levels: int = None, level_seed: int = None):
+        super().__init__(kind='maze',
+                         level_params={'width': width, 'height': height},
+                         grid_radius=grid_radius,
+                         frame_stack=frame_stack,
+                         num_levels=num_levels,
+                         level_seed=level_seed)
+
+
+if __name__ == '__main__':
+    env = TMazeEnv(length=8, num_corridors=3)
+    env.init(start_minecraft=False)
+    env.reset(force_reset=True)
+    done = False
+
+    while not done:
+        action = env.action_space.sample()
+        obs, reward, done, info = env.step(action)
+
+    env.close()
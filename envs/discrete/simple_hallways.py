@@ -1,12 +1,12 @@
-import MalmoPython
 import os
 import logging
 import random
 import json
 import numpy as np
-from gym import spaces
 
 from common.malmo.malmo_env import MalmoEnvironment
+from common.malmo.validation_cache import load_mission_spec
+from common.malmo.observation_space import parse_observation_shapes, set_grid_radius
 
 
 
@@ -22,50 +22,71 @@ class SimpleHallwaysEnv(MalmoEnvironment):
 
     metadata = {'render.modes': []}
 
-    def __init__(self):
+    observation_grid = "floor4x4"
+
+    block_encoding = {
+        "stone": [1, 0, 0, 0, 0, 0],
+        "dirt": [0, 1, 0, 0, 0, 0],
+        "air": [0, 0, 1, 0, 0, 0],
+        "redstone_block": [0, 0, 0, 1, 0, 0],
+        "gold_block": [0, 0, 0, 0, 1, 0],
+        "diamond_block": [0, 0, 0, 0, 0, 1]
+    }
+
+    goal_positions = ['left', 'right']
+
+    def __init__(self, hallway_length: int = 10, grid_radius: int = 2, frame_stack: int = 5):
+        """
+
+        :param hallway_length: length of the hallway connecting the start to the goals.
+        :param grid_radius: number of blocks observed around the agent.
+        :param frame_stack: number of observations stacked together.
+        """
         self._spec_path = os.path.join(os.path.dirname(__file__), "schemas/simple_hallways_mission.xml")
-        self.observation_space = spaces.Box(low=0, high=1, shape=(18, 5), dtype=np.int32)
+        self._hallway_length = hallway_length
 
-        self.__observe_grid = "floor4x4"
+        with open(self._spec_path, 'r') as f:
+            self._mission_template = f.read()
 
-        self.___obs_map = {
-            "stone": [1, 0, 0, 0, 0, 0],
-            "dirt": [0, 1, 0, 0, 0, 0],
-            "air": [0, 0, 1, 0, 0, 0],
-            "redstone_block": [0, 0, 0, 1, 0, 0],
-            "gold_block": [0, 0, 0, 0, 1, 0],
-            "diamond_block": [0, 0, 0, 0, 0, 1]
-        }
+        if grid_radius != 2:
+            self._mission_template = set_grid_radius(self._mission_template, self.observation_grid, grid_radius)
 
-        super().__init__(parse_world_state=True)
+        self.observation_space = parse_observation_shapes(self._mission_template).grid_space(
+            self.observation_grid, num_block_types=len(self.block_encoding["stone"]), frame_stack=frame_stack)
+
+        super().__init__(parse_world_state=True, replay_buffer_size=frame_stack)
 
 
     def __draw_hallways(self):
 
+        length = self._hallway_length
+
         # south hallway
         self.mission_spec.drawCuboid(5, 2, 0, 0, 3, 0, 'air')
-        self.mission_spec.drawCuboid(5, 2, 0, 5, 3, 10, 'air')
-        self.mission_spec.drawCuboid(10, 2, 10, 0, 3, 10, 'air')
+        self.mission_spec.drawCuboid(5, 2, 0, 5, 3, length, 'air')
+        self.mission_spec.drawCuboid(10, 2, length, 0, 3, length, 'air')
 
 
-    def __draw_goals(self):
+    def __draw_goals(self, goal_position: str = None):
+        length = self._hallway_length
 
         # clear old goals
-        self.mission_spec.drawBlock(10, 1, 10, 'stone')
+        self.mission_spec.drawBlock(10, 1, length, 'stone')
         self.mission_spec.drawBlock(10, 1, 0, 'stone')
-        self.mission_spec.drawBlock(0, 1, 10, 'stone')
+        self.mission_spec.drawBlock(0, 1, length, 'stone')
 
 
-        goal_position = random.choice(['left', 'right'])
+        if goal_position is None:
+            goal_position = random.choice(self.goal_positions)
 
         self.logger.info("Goal is on the {}".format(goal_position))
 
 
         if goal_position == 'left':
-            self.mission_spec.drawBlock(10, 1, 10, 'diamond_block')
+            self.mission_spec.drawBlock(10, 1, length, 'diamond_block')
             self.mission_spec.drawBlock(2, 1, 0, 'gold_block')
         elif goal_position == 'right':
-            self.mission_spec.drawBlock(0, 1, 10, 'diamond_block')
+            self.mission_spec.drawBlock(0, 1, length, 'diamond_block')
             self.mission_spec.drawBlock(2, 1, 0, 'redstone_block')
 
     def _build_observation_space(self):
@@ -74,50 +95,47 @@ class SimpleHallwaysEnv(MalmoEnvironment):
 
         :return:
         """
-        num_block_types = len(list(self.___obs_map.values())[0])
-
-        if self.__observe_grid == "floor4x4":
-            num_blocks_observed = 50
-        elif self.__observe_grid == "floor3x3":
-            num_blocks_observed = 18
-        else:
-            raise KeyError("Unable to determine grid size {}".format(self.__observe_grid))
+        num_block_types = len(list(self.block_encoding.values())[0])
 
-        num_blocks_observed = num_blocks_observed*self.replay_buffer_size
+        self.observation_space = self.observation_shapes.grid_space(self.observation_grid,
+                                                                    num_block_types=num_block_types,
+                                                                    frame_stack=self.replay_buffer_size)
 
-        self.observation_space = spaces.Box(low=0, high=1, shape=(num_blocks_observed, num_block_types), dtype=np.int32)
-
-    def _load_mission(self, **kwargs):
+    def _load_mission(self, goal_position: str = None, **kwargs):
         """
         Mutates and returns the mission spec.
 
+        :param goal_position: one of goal_positions, picked at random if not set.
         :param kwargs:
         :return:
         """
 
-        with open(self._spec_path, 'r') as f:
-            mission_spec = f.read()
+        mission_spec = self._mission_template
 
         mission_spec.replace("<MsPerTick>5</MsPerTick>", "<MsPerTick>{}</MsPerTick>".format(self.tick_speed))
 
-        self.mission_spec = MalmoPython.MissionSpec(mission_spec, True)
+        self.mission_spec = load_mission_spec(mission_spec)
 
         self.__draw_hallways()
-        self.__draw_goals()
+        self.__draw_goals(goal_position)
 
         return self.mission_spec
 
 
+    def mission_variants(self):
+        return [self._load_mission(goal_position=goal_position).getAsXML(False)
+                for goal_position in self.goal_positions]
+
     def _world_state_parser(self, world_state):
 
         observations = self._get_observation(world_state)
 
-        surrounds = observations[self.__observe_grid]
+        surrounds = observations[self.observation_grid]
 
         obs = []
 
         for block in surrounds:
-            obs.append(self.___obs_map[block])
+            obs.append(self.block_encoding[block])
 
         observation = self._update_replay_buffer_and_get_observation(np.array(obs, dtype=np.int32))
 
@@ -1,4 +1,3 @@
-import MalmoPython
 import os
 import logging
 import random
@@ -7,6 +6,11 @@ import numpy as np
 from gym import spaces
 
 from common.malmo.malmo_env import MalmoEnvironment
+from common.malmo.validation_cache import load_mission_spec
+from common.malmo.colour_map import ColourMapLookup, set_colour_map
+
+# 'rgb' observes the video, 'colour_map' observes the class of every pixel of Malmo's colour map.
+OBSERVATION_MODES = ('rgb', 'colour_map')
 
 
 class SimpleHallwaysVisualEnv(MalmoEnvironment):
@@ -20,25 +24,50 @@ class SimpleHallwaysVisualEnv(MalmoEnvironment):
 
     metadata = {'render.modes': []}
 
-    def __init__(self, hall_params:dict = None):
+    def __init__(self, hall_params:dict = None, hallway_length: int = 10, frame_stack: int = 5,
+                 observation_mode: str = 'rgb', colour_map_size: (int, int) = (32, 32), colour_palette: str = None,
+                 learn_colours: bool = True):
+        """
+
+        :param hall_params:
+        :param hallway_length: length of the hallway connecting the start to the goals.
+        :param frame_stack: number of video frames stacked together.
+        :param observation_mode: one of OBSERVATION_MODES.
+        :param colour_map_size: (width, height) of the colour map.
+        :param colour_palette: json file keeping the classes of the colour map's colours between runs.
+        :param learn_colours: add unseen colours to the palette, see common.malmo.colour_map.
+        """
+        if observation_mode not in OBSERVATION_MODES:
+            raise KeyError("Unknown observation mode {}, expected one of {}".format(observation_mode,
+                                                                                   OBSERVATION_MODES))
+
         self._spec_path = os.path.join(os.path.dirname(__file__), "schemas/simple_hallways_visual_mission.xml")
+        self._hallway_length = hallway_length
+        self._observation_mode = observation_mode
+        self._colour_map_size = colour_map_size
+
+        super().__init__(parse_world_state=False, replay_buffer_size=frame_stack)
 
-        super().__init__(parse_world_state=False)
+        if observation_mode == 'colour_map' and colour_palette:
+            self.colour_map_lookup = ColourMapLookup.load(colour_palette, learn=learn_colours)
 
     def __draw_hallways(self):
 
+        length = self._hallway_length
+
         # south hallway
         self.mission_spec.drawCuboid(5, 2, 0, 0, 3, 0, 'air')
-        self.mission_spec.drawCuboid(5, 2, 0, 5, 3, 10, 'air')
-        self.mission_spec.drawCuboid(10, 2, 10, 0, 3, 10, 'air')
+        self.mission_spec.drawCuboid(5, 2, 0, 5, 3, length, 'air')
+        self.mission_spec.drawCuboid(10, 2, length, 0, 3, length, 'air')
 
 
     def __draw_goals(self):
+        length = self._hallway_length
 
         # clear old goals
-        self.mission_spec.drawBlock(10, 1, 10, 'stone')
+        self.mission_spec.drawBlock(10, 1, length, 'stone')
         self.mission_spec.drawBlock(10, 1, 0, 'stone')
-        self.mission_spec.drawBlock(0, 1, 10, 'stone')
+        self.mission_spec.drawBlock(0, 1, length, 'stone')
 
 
         goal_position = random.choice(['left', 'right'])
@@ -47,10 +76,10 @@ class SimpleHallwaysVisualEnv(MalmoEnvironment):
 
 
         if goal_position == 'left':
-            self.mission_spec.drawBlock(10, 1, 10, 'diamond_block')
+            self.mission_spec.drawBlock(10, 1, length, 'diamond_block')
             self.mission_spec.drawBlock(2, 1, 0, 'gold_block')
         elif goal_position == 'right':
-            self.mission_spec.drawBlock(0, 1, 10, 'diamond_block')
+            self.mission_spec.drawBlock(0, 1, length, 'diamond_block')
             self.mission_spec.drawBlock(2, 1, 0, 'redstone_block')
 
     def _load_mission(self, **kwargs):
@@ -66,7 +95,10 @@ class SimpleHallwaysVisualEnv(MalmoEnvironment):
 
         mission_spec.replace("<MsPerTick>5</MsPerTick>", "<MsPerTick>{}</MsPerTick>".format(self.tick_speed))
 
-        self.mission_spec = MalmoPython.MissionSpec(mission_spec, True)
+        if self._observation_mode == 'colour_map':
+            mission_spec = set_colour_map(mission_spec, *self._colour_map_size)
+
+        self.mission_spec = load_mission_spec(mission_spec)
 
         self.__draw_hallways()
         self.__draw_goals()
@@ -0,0 +1,477 @@
+"""
+A batched NumPy backend for the discrete grid environments. The missions of an environment are compiled into
+block arrays once, after which thousands of environment instances are stepped together with array operations.
+
+The simulation follows common.malmo.fake_malmo, so observations, rewards and termination match the environments
+running against the fake Malmo, and through it the Minecraft versions.
+
+    vec_env = GridWorldVecEnv(SimpleHallwaysEnv(), num_envs=1024)
+    obs = vec_env.reset()
+    obs, rewards, dones, infos = vec_env.step(actions)
+
+"""
+import logging
+import importlib.util
+import math
+
+import gym
+import numpy as np
+from gym import spaces
+
+logger = logging.getLogger(__name__)
+
+# the compass direction of each facing, indexed by yaw / 90.
+_FACING_DIRECTIONS = np.array([[0, 1], [-1, 0], [0, -1], [1, 0]], dtype=np.int64)
+
+# command kinds
+_NOOP, _MOVE_COMPASS, _MOVE, _STRAFE, _TURN, _USE, _QUIT = range(7)
+
+_CONSTANT, _ONCE_ONLY, _ONCE_PER_BLOCK = range(3)
+
+_BEHAVIOURS = {"constant": _CONSTANT, "onceOnly": _ONCE_ONLY, "oncePerBlock": _ONCE_PER_BLOCK}
+
+_COMPASS = {"north": (0, -1), "south": (0, 1), "east": (1, 0), "west": (-1, 0)}
+
+
+def ensure_mission_api():
+    """
+    The missions are built with the MalmoPython MissionSpec API, fall back to the fake if Malmo is not installed.
+
+    :return:
+    """
+    if importlib.util.find_spec("MalmoPython") is None:
+        import common.malmo.fake_malmo as fake_malmo
+
+        logger.info("MalmoPython is not installed, building missions with the fake Malmo.")
+        fake_malmo.install()
+
+
+def _parse_command(action: str) -> (int, int, int):
+    """
+    Converts an action into (kind, dx or sign, dz), a simplified version of MissionSimulator.command.
+
+    :param action:
+    :return:
+    """
+    # actions made up of several commands are only supported if all but one of them do nothing.
+    commands = [command.split() for command in action.split("\n")]
+    commands = [command for command in commands
+                if not (len(command) > 1 and float(command[1]) == 0)] or [["noop"]]
+
+    if len(commands) > 1:
+        raise NotImplementedError("Unable to simulate the action {}".format(action))
+
+    verb = commands[0][0]
+    value = float(commands[0][1]) if len(commands[0]) > 1 else 1.0
+    sign = 1 if value > 0 else -1
+
+    if verb == "quit":
+        return _QUIT, 0, 0
+    if verb[:4] in ("move", "jump") and verb[4:] in _COMPASS:
+        return (_MOVE_COMPASS,) + _COMPASS[verb[4:]]
+    if verb in ("move", "jumpmove"):
+        return _MOVE, sign, 0
+    if verb in ("strafe", "jumpstrafe"):
+        return _STRAFE, sign, 0
+    if verb == "turn":
+        return _TURN, sign, 0
+    if verb in ("use", "jumpuse"):
+        return _USE, 0, 0
+
+    return _NOOP, 0, 0
+
+
+class GridWorldVecEnv:
+    """
+    Steps num_envs copies of a discrete grid environment at once. It follows the baselines VecEnv interface,
+    finished environments are reset automatically and their last observation is kept in
+    info['terminal_observation'].
+
+    """
+
+    def __init__(self, env, num_envs: int = 1, seed: int = None, auto_reset: bool = True):
+        """
+
+        :param env: an initialised environment implementing mission_variants, observation_grid and block_encoding.
+        :param num_envs:
+        :param seed:
+        :param auto_reset: reset environments as soon as they are done.
+        """
+        from common.malmo.fake_malmo import MissionSimulator, PASSABLE_BLOCK_TYPES, DOOR_BLOCK_TYPES
+
+        env = getattr(env, 'unwrapped', env)
+
+        self.num_envs = num_envs
+        self.auto_reset = auto_reset
+        self.observation_space = env.observation_space
+        self.action_space = env.action_space
+        self.np_random = np.random.RandomState(seed)
+
+        if not isinstance(self.action_space, spaces.Discrete):
+            raise NotImplementedError("Only discrete action spaces can be simulated.")
+
+        simulators = [MissionSimulator(mission_xml) for mission_xml in env.mission_variants()]
+        first = simulators[0]
+
+        self.num_layouts = len(simulators)
+
+        # -- handlers, these are the same for every variant --
+
+        grid = next((g for g in first.grids if g[0] == env.observation_grid), None)
+        if grid is None:
+            raise KeyError("The mission does not observe the grid {}".format(env.observation_grid))
+
+        _, low, high = grid
+        self._grid_offsets = np.array([(gx, gy, gz)
+                                       for gy in range(low[1], high[1] + 1)
+                                       for gz in range(low[2], high[2] + 1)
+                                       for gx in range(low[0], high[0] + 1)], dtype=np.int64)
+        grid_size = len(self._grid_offsets)
+
+        self.frame_stack = self.observation_space.shape[0] // grid_size
+        self.max_steps = math.ceil(first.time_limit_ms / 50) if first.time_limit_ms is not None else None
+        self.command_reward = first.command_reward
+
+        self._actions = np.array([_parse_command(action) for action in env.action_names[0]], dtype=np.int64)
+
+        # -- blocks --
+
+        radius = int(np.abs(self._grid_offsets).max()) + 1
+        positions = [position for simulator in simulators for position in simulator.blocks]
+        positions += [(int(math.floor(s.x)), int(math.floor(s.y)), int(math.floor(s.z))) for s in simulators]
+        positions = np.array(positions, dtype=np.int64)
+
+        self._low = np.array([positions[:, 0].min() - radius, 0, positions[:, 2].min() - radius])
+        high = np.array([positions[:, 0].max() + radius, max(positions[:, 1].max() + radius, len(first.layers)),
+                         positions[:, 2].max() + radius])
+        self._shape = tuple(int(size) for size in high - self._low + 1)
+
+        self.block_types = sorted(set(env.block_encoding) | set(first.layers) | {"air"} |
+                                  {block for simulator in simulators for block in simulator.blocks.values()})
+        block_ids = {block: i for i, block in enumerate(self.block_types)}
+        self._air = block_ids["air"]
+
+        # blocks are indexed by [layout, x, y, z].
+        self._blocks = np.zeros((self.num_layouts,) + self._shape, dtype=np.int32)
+        self._door_ids = np.full((self.num_layouts,) + self._shape, -1, dtype=np.int32)
+        self._lever_ids = np.full((self.num_layouts,) + self._shape, -1, dtype=np.int32)
+
+        lever_doors = []
+        num_doors = 1
+
+        for layout, simulator in enumerate(simulators):
+            for index in np.ndindex(*self._shape):
+                x, y, z = [int(i) for i in np.array(index) + self._low]
+                self._blocks[(layout,) + index] = block_ids[simulator.block(x, y, z)]
+
+            doors = [position for position, block in simulator.blocks.items() if block in DOOR_BLOCK_TYPES]
+            levers = [position for position, block in simulator.blocks.items() if block == "lever"]
+
+            for i, door in enumerate(doors):
+                self._door_ids[(layout,) + tuple(np.array(door) - self._low)] = i
+            for i, lever in enumerate(levers):
+                self._lever_ids[(layout,) + tuple(np.array(lever) - self._low)] = i
+
+            num_doors = max(num_doors, len(doors))
+            lever_doors.append([[door in simulator.doors_powered_by(lever) for door in doors] for lever in levers])
+
+        num_levers = max([len(levers) for levers in lever_doors] + [1])
+
+        # [layout, lever, door] -> whether the lever powers the door.
+        self._lever_doors = np.zeros((self.num_layouts, num_levers, num_doors), dtype=bool)
+        for layout, levers in enumerate(lever_doors):
+            for lever, doors in enumerate(levers):
+                self._lever_doors[layout, lever, :len(doors)] = doors
+
+        self._passable = np.array([block in PASSABLE_BLOCK_TYPES for block in self.block_types])
+
+        self._touch_reward = np.zeros(len(self.block_types))
+        self._touch_behaviour = np.full(len(self.block_types), -1, dtype=np.int64)
+        for block, (value, behaviour) in first.touch_rewards.items():
+            if block in block_ids:
+                self._touch_reward[block_ids[block]] = value
+                self._touch_behaviour[block_ids[block]] = _BEHAVIOURS[behaviour]
+
+        self._quit = np.array([block in first.quit_blocks for block in self.block_types])
+
+        encoding_size = len(next(iter(env.block_encoding.values())))
+        self._encoding = np.zeros((len(self.block_types), encoding_size), dtype=self.observation_space.dtype)
+        self._encoded = np.zeros(len(self.block_types), dtype=bool)
+        for block, one_hot in env.block_encoding.items():
+            self._encoding[block_ids[block]] = one_hot
+            self._encoded[block_ids[block]] = True
+
+        self._start = np.array([(int(math.floor(s.x)), int(math.floor(s.y)), int(math.floor(s.z)))
+                                for s in simulators], dtype=np.int64)
+        self._start_facing = np.array([int(round(s.yaw / 90)) % 4 for s in simulators], dtype=np.int64)
+
+        # -- state of every environment --
+
+        self._layout = np.zeros(num_envs, dtype=np.int64)
+        self._position = np.zeros((num_envs, 3), dtype=np.int64)
+        self._facing = np.zeros(num_envs, dtype=np.int64)
+        self._steps = np.zeros(num_envs, dtype=np.int64)
+        self._powered = np.zeros((num_envs, num_levers), dtype=bool)
+        self._open_doors = np.zeros((num_envs, num_doors), dtype=bool)
+        self._rewarded_types = np.zeros((num_envs, len(self.block_types)), dtype=bool)
+        self._rewarded_blocks = None
+        if (self._touch_behaviour == _ONCE_PER_BLOCK).any():
+            self._rewarded_blocks = np.zeros((num_envs,) + self._shape, dtype=bool)
+        self._frames = np.zeros((num_envs, self.frame_stack, grid_size, encoding_size),
+                                dtype=self.observation_space.dtype)
+
+        self._pending_actions = None
+
+    def __repr__(self):
+        return "<GridWorldVecEnv - {} envs, {} layouts>".format(self.num_envs, self.num_layouts)
+
+    def seed(self, seed=None):
+        self.np_random.seed(seed)
+        return [seed]
+
+    # -- world lookups --
+
+    def _index(self, envs: np.ndarray, positions: np.ndarray) -> tuple:
+        index = np.clip(positions - self._low, 0, np.array(self._shape) - 1)
+        layouts = self._layout[envs].reshape(envs.shape + (1,) * (positions.ndim - 2))
+        return layouts, index[..., 0], index[..., 1], index[..., 2]
+
+    def _block(self, envs: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        return self._blocks[self._index(envs, positions)]
+
+    def _is_passable(self, envs: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        index = self._index(envs, positions)
+        doors = self._door_ids[index]
+        opened = self._open_doors[envs, np.maximum(doors, 0)] & (doors >= 0)
+        return self._passable[self._blocks[index]] | opened
+
+    # -- episodes --
+
+    def _reset_envs(self, envs: np.ndarray):
+        layouts = self.np_random.randint(self.num_layouts, size=len(envs))
+
+        self._layout[envs] = layouts
+        self._position[envs] = self._start[layouts]
+        self._facing[envs] = self._start_facing[layouts]
+        self._steps[envs] = 0
+        self._powered[envs] = False
+        self._open_doors[envs] = False
+        self._rewarded_types[envs] = False
+        if self._rewarded_blocks is not None:
+            self._rewarded_blocks[envs] = False
+        self._frames[envs] = 0
+
+        self._push_frames(envs, self._observe(envs))
+
+    def _observe(self, envs: np.ndarray) -> np.ndarray:
+        blocks = self._block(envs, self._position[envs, None, :] + self._grid_offsets[None])
+
+        if not self._encoded[blocks].all():
+            unknown = {self.block_types[block] for block in np.unique(blocks[~self._encoded[blocks]])}
+            raise KeyError("No encoding for the observed blocks {}".format(unknown))
+
+        return self._encoding[blocks]
+
+    def _push_frames(self, envs: np.ndarray, frames: np.ndarray):
+        self._frames[envs, 1:] = self._frames[envs, :-1]
+        self._frames[envs, 0] = frames
+
+    def _observation(self, envs: np.ndarray = None) -> np.ndarray:
+        frames = self._frames if envs is None else self._frames[envs]
+        return frames.reshape((len(frames),) + self.observation_space.shape)
+
+    def reset(self) -> np.ndarray:
+        self._reset_envs(np.arange(self.num_envs))
+        return self._observation()
+
+    def reset_env(self, env: int) -> np.ndarray:
+        self._reset_envs(np.array([env]))
+        return self._observation(np.array([env]))[0]
+
+    # -- stepping --
+
+    def _touch(self, envs: np.ndarray, positions: np.ndarray, rewards: np.ndarray, dones: np.ndarray):
+        """
+        Adds the rewards for touching the blocks at positions, one position per env, and ends the missions of the
+        envs touching a quit block.
+
+        :return:
+        """
+        blocks = self._block(envs, positions)
+        behaviour = self._touch_behaviour[blocks]
+
+        rewarded = behaviour == _CONSTANT
+
+        once_only = envs[behaviour == _ONCE_ONLY]
+        first_time = ~self._rewarded_types[once_only, blocks[behaviour == _ONCE_ONLY]]
+        rewarded[behaviour == _ONCE_ONLY] = first_time
+        self._rewarded_types[once_only, blocks[behaviour == _ONCE_ONLY]] = True
+
+        if self._rewarded_blocks is not None:
+            once_per_block = behaviour == _ONCE_PER_BLOCK
+            _, x, y, z = self._index(envs[once_per_block], positions[once_per_block])
+            rewarded[once_per_block] = ~self._rewarded_blocks[envs[once_per_block], x, y, z]
+            self._rewarded_blocks[envs[once_per_block], x, y, z] = True
+
+        rewards[envs] += np.where(rewarded, self._touch_reward[blocks], 0.0)
+        dones[envs] |= self._quit[blocks]
+
+    def step_async(self, actions):
+        self._pending_actions = actions
+
+    def step_wait(self):
+        actions = np.asarray(self._pending_actions, dtype=np.int64).reshape(self.num_envs)
+        self._pending_actions = None
+
+        kind, a, b = self._actions[actions].T
+        every = np.arange(self.num_envs)
+
+        rewards = np.full(self.num_envs, self.command_reward)
+        dones = kind == _QUIT
+
+        # -- movement --
+
+        facing = _FACING_DIRECTIONS[self._facing]
+        delta = np.zeros((self.num_envs, 2), dtype=np.int64)
+
+        delta[kind == _MOVE_COMPASS] = np.stack([a, b], axis=1)[kind == _MOVE_COMPASS]
+        delta[kind == _MOVE] = facing[kind == _MOVE] * a[kind == _MOVE, None]
+        delta[kind == _STRAFE] = np.stack([-facing[:, 1], facing[:, 0]], axis=1)[kind == _STRAFE] \
+                                 * a[kind == _STRAFE, None]
+
+        moving = every[(delta != 0).any(axis=1)]
+        target = self._position[moving].copy()
+        target[:, 0] += delta[moving, 0]
+        target[:, 2] += delta[moving, 1]
+        head = target + np.array([0, 1, 0])
+
+        feet_free = self._is_passable(moving, target)
+        head_free = self._is_passable(moving, head)
+        moved = feet_free & head_free
+
+        bumped = moving[~moved]
+        bumped_positions = np.where(feet_free[~moved, None], head[~moved], target[~moved])
+
+        self._position[moving[moved]] = target[moved]
+
+        # fall until there is something to stand on.
+        falling = moving[moved]
+        while len(falling):
+            below = self._position[falling] - np.array([0, 1, 0])
+            falling = falling[(below[:, 1] >= 0) & self._is_passable(falling, below)]
+            self._position[falling, 1] -= 1
+
+        # -- turning --
+
+        turning = kind == _TURN
+        self._facing[turning] = (self._facing[turning] + a[turning]) % 4
+
+        # -- using levers --
+
+        users = every[kind == _USE]
+        searching = np.ones(len(users), dtype=bool)
+
+        for reach in range(1, 5):
+            eyes = self._position[users] + np.array([0, 1, 0])
+            eyes[:, 0] += facing[users, 0] * reach
+            eyes[:, 2] += facing[users, 1] * reach
+
+            index = self._index(users, eyes)
+            levers = self._lever_ids[index]
+
+            flipping = searching & (levers >= 0)
+            self._powered[users[flipping], levers[flipping]] ^= True
+
+            searching &= self._blocks[index] == self._air
+
+        if len(users):
+            self._open_doors[users] = np.einsum('nl,nld->nd', self._powered[users].astype(np.int64),
+                                                self._lever_doors[self._layout[users]].astype(np.int64)) > 0
+
+        # -- rewards and termination --
+
+        quitting = kind == _QUIT
+        rewards[quitting] = 0.0
+
+        alive = every[~quitting]
+        self._touch(alive, self._position[alive] - np.array([0, 1, 0]), rewards, dones)
+        self._touch(bumped, bumped_positions, rewards, dones)
+
+        self._steps[~quitting] += 1
+        if self.max_steps is not None:
+            dones |= self._steps >= self.max_steps
+
+        # -- observations --
+
+        running = every[~dones]
+        self._push_frames(running, self._observe(running))
+
+        # malmo returns the previous observation once the mission has ended.
+        finished = every[dones]
+        self._push_frames(finished, self._frames[finished, 0])
+
+        infos = [{} for _ in range(self.num_envs)]
+
+        if len(finished) and self.auto_reset:
+            terminal_observations = self._observation(finished)
+            for env, observation in zip(finished, terminal_observations):
+                infos[env]['terminal_observation'] = observation
+            self._reset_envs(finished)
+
+        return self._observation(), rewards, dones, infos
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        pass
+
+    def render(self, mode='human'):
+        pass
+
+
+class GridWorldEnv(gym.Env):
+    """
+    A single environment running on the NumPy backend, with the same interface as the Malmo environment it wraps.
+
+    """
+
+    metadata = {'render.modes': []}
+
+    def __init__(self, env):
+        """
+
+        :param env: the Malmo environment to simulate, it is never connected to Minecraft.
+        """
+        self.env = env
+        self.vec_env = None
+        self.observation_space = env.observation_space
+        self.action_space = None
+
+    def init(self, **kwargs):
+        """
+        Accepts the arguments of MalmoEnvironment.init, client and recording options are ignored.
+
+        :param kwargs:
+        :return:
+        """
+        kwargs['start_minecraft'] = False
+        self.env.init(**kwargs)
+
+        self.vec_env = GridWorldVecEnv(self.env, num_envs=1, auto_reset=False)
+        self.observation_space = self.vec_env.observation_space
+        self.action_space = self.vec_env.action_space
+
+    def reset(self, force_reset=False):
+        return self.vec_env.reset()[0]
+
+    def step(self, action):
+        obs, rewards, dones, infos = self.vec_env.step([action])
+        return obs[0], float(rewards[0]), bool(dones[0]), infos[0]
+
+    def seed(self, seed=None):
+        return self.vec_env.seed(seed) if self.vec_env else [seed]
+
+    def render(self, mode='human', close=False):
+        pass
@@ -2,6 +2,24 @@ import os
 import gym
 import envs
 import logging
+import functools
+
+
+def _make_monitored_env(env_id: str, env_kwargs: dict, init_kwargs: dict, monitor_path: str) -> gym.Env:
+    from baselines.bench.monitor import Monitor
+
+    env = envs.make(env_id, **env_kwargs)
+    env.init(**init_kwargs)
+
+    # workers learning colours would each number them differently, they only use the palette they were given.
+    colour_map_lookup = env.unwrapped.colour_map_lookup
+    if colour_map_lookup is not None:
+        colour_map_lookup.learn = False
+        if not colour_map_lookup.palette:
+            raise ValueError("The colour palette of {} is empty, every colour of the colour map would be unknown."
+                             .format(env_id))
+
+    return Monitor(env, monitor_path)
 
 
 def train_a2c(log_dir: str,
@@ -24,6 +42,9 @@ def train_a2c(log_dir: str,
               gamma=0.99,
               log_interval=100,
               load_path=None,
+              backend='malmo',
+              num_envs=None,
+              env_kwargs=None,
               **network_kwargs):
     """
     This function trains and runs the A2C model. It accepts a list of hyper parameters.
@@ -45,6 +66,9 @@ def train_a2c(log_dir: str,
     :param gamma:
     :param log_interval:
     :param load_path:
+    :param backend: 'malmo' to train in Minecraft, 'numpy' to train on the vectorized simulator.
+    :param num_envs: number of simulated environments with the numpy backend, defaults to one per client.
+    :param env_kwargs: arguments of the environment's constructor, eg. its colour_palette.
     :param network_kwargs:
     :return:
     """
@@ -53,32 +77,45 @@ def train_a2c(log_dir: str,
     os.environ['OPENAI_LOG_FORMAT'] = 'json'
     os.environ['OPENAI_LOGDIR'] = log_dir
 
+    # without learning, which the workers cannot share, every colour would be unknown and the frames blank.
+    if (env_kwargs or {}).get('observation_mode') == 'colour_map' and not (env_kwargs or {}).get('colour_palette'):
+        raise ValueError("Training on colour maps needs a colour_palette in env_kwargs, learn one with "
+                         "python -m common.malmo.colour_map.")
+
     # import inside the function to make sure all logging is configured correctly.
     from baselines.a2c import a2c
     from baselines.common.vec_env.shmem_vec_env import ShmemVecEnv
-    from baselines.bench.monitor import Monitor
-
-    env_fns = []
 
-    spaces = None
-
-    for client in client_pool:
-        env = gym.make(env_id)
+    if backend == 'numpy':
+        from baselines.common.vec_env.vec_monitor import VecMonitor
 
+        vec_env = envs.make_vec(env_id, num_envs=num_envs or len(client_pool), seed=seed,
+                                init_kwargs={'tick_speed': tick_speed, 'logger': logger}, **(env_kwargs or {}))
+        vec_env = VecMonitor(vec_env, os.path.join(os.environ['OPENAI_LOGDIR'], 'monitor.csv'))
+    else:
         if record:
-            env.init(start_minecraft=False ,recordDestination=os.path.join(os.environ['OPENAI_LOGDIR'],'recording.tgz'),
-                     recordMP4=(10, 400000), client_pool=client_pool, recordRewards=True,
-                     recordCommands=True, tick_speed=tick_speed, logger=logger)
+            init_kwargs = dict(start_minecraft=False,
+                               recordDestination=os.path.join(os.environ['OPENAI_LOGDIR'], 'recording.tgz'),
+                               recordMP4=(10, 400000), client_pool=client_pool, recordRewards=True,
+                               recordCommands=True, tick_speed=tick_speed, logger=logger)
         else:
-            env.init(start_minecraft=False, client_pool=client_pool, tick_speed=tick_speed, logger=logger)
+            init_kwargs = dict(start_minecraft=False, client_pool=client_pool, tick_speed=tick_speed, logger=logger)
+
+        monitor_path = os.path.join(os.environ['OPENAI_LOGDIR'], 'monitor.csv')
 
-        menv = Monitor(env, os.path.join(os.environ['OPENAI_LOGDIR'],'monitor.csv'))
-        env_fn = lambda: menv
-        env_fns.append(env_fn)
+        # the environments are created in their worker processes, observations come back through shared memory.
+        env_fns = [functools.partial(_make_monitored_env, env_id, env_kwargs or {}, init_kwargs, monitor_path)
+                   for _ in client_pool]
 
+        # init does not connect to a client, so the spaces are read from an environment of this process.
+        env = envs.make(env_id, **(env_kwargs or {}))
+        env.init(**init_kwargs)
+        if env.unwrapped.colour_map_lookup is not None:
+            env.unwrapped.colour_map_lookup.learn = False
         spaces = (env.observation_space, env.action_space)
+        env.close()
 
-    vec_env = ShmemVecEnv(env_fns, spaces=spaces)
+        vec_env = ShmemVecEnv(env_fns, spaces=spaces)
 
     act = a2c.learn(
         network=network,
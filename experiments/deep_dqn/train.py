@@ -33,6 +33,7 @@ def train_dqn(log_dir: str,
               param_noise=False,
               callback=None,
               load_path=None,
+              backend='malmo',
               **network_kwargs):
     """
     This function trains and runs the A2C model. It accepts a list of hyper parameters.
@@ -54,6 +55,7 @@ def train_dqn(log_dir: str,
     :param gamma:
     :param log_interval:
     :param load_path:
+    :param backend: 'malmo' to train in Minecraft, 'numpy' to train on the vectorized simulator.
     :param network_kwargs:
     :return:
     """
@@ -70,9 +72,7 @@ def train_dqn(log_dir: str,
     if len(client_pool) > 1:
         logging.warning("Too many clients specified for this model. Only 1 will be used!")
 
-    client_address = client_pool[0]
-
-    env = gym.make(env_id)
+    env = envs.make(env_id, backend=backend)
 
     if record:
         env.init(start_minecraft=False ,recordDestination=os.path.join(os.environ['OPENAI_LOGDIR'],'recording.tgz'),
@@ -40,4 +40,7 @@ class RosalindBot(Bot):
         # experiment montioring
         updater.dispatcher.add_handler(CommandHandler('running', handlers.running_experiments))
         updater.dispatcher.add_handler(CommandHandler('completed', handlers.completed_experiments))
-        updater.dispatcher.add_handler(CommandHandler('pending', handlers.pending_experiments))
\ No newline at end of file
+        updater.dispatcher.add_handler(CommandHandler('pending', handlers.pending_experiments))
+
+        # client pool
+        updater.dispatcher.add_handler(CommandHandler('probeclients', handlers.probe_client_pool))
\ No newline at end of file
@@ -0,0 +1,281 @@
+"""
+Grows and shrinks the Minecraft clients of a host with the demand for them. Every interval the autoscaler compares
+the experiments waiting for a client with the idle clients of the pool:
+
+    - when experiments wait, or fewer than warm_spares clients are idle, clients are booted up to max_clients.
+    - clients idle for longer than idle_timeout are shut down, as long as warm_spares idle clients remain.
+
+Each pending experiment waits for the clients train_model has yet to reserve for it, one per environment, and
+experiments on the numpy backend need none. Experiments are not bound to a host, so the clients they wait for are
+split between the hosts running clients, and each host boots clients for its share. A host without clients counts
+itself in, so the demand is still met when every host scaled down. The autoscaler launches, supervises and shuts
+down clients through a ClientSupervisor, so its clients are also restarted when they crash:
+
+    autoscaler = ClientAutoscaler(supervisor, port_allocator, max_clients=16, warm_spares=2)
+    autoscaler.start()
+
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import threading
+import traceback
+from collections import Counter
+
+import psutil
+
+from common.malmo.port_allocator import PortAllocator
+from rosalind.client_launcher import ClientLauncher, ClientProcess
+from rosalind.client_lifecycle import stop_client
+from rosalind.client_supervisor import ClientSupervisor
+from rosalind.db.connection import RosalindDatabase
+from rosalind.db.queries import create_client, get_clients, get_experiments_by_status
+from rosalind.db.schema import Experiments
+from rosalind.db.types import ClientStatus, ExperimentStatus
+
+logger = logging.getLogger(__name__)
+
+
+def clients_needed(experiment: Experiments) -> int:
+    """
+    The clients train_model reserves for an experiment.
+
+    :param experiment:
+    :return:
+    """
+    model_params = experiment.model_params or {}
+    if model_params.get('backend', 'malmo') == 'numpy':
+        return 0
+    return int(model_params.get('num_envs', 1))
+
+
+class ClientAutoscaler(threading.Thread):
+    """
+    A thread booting clients while experiments wait and shutting down the ones nobody uses.
+
+    """
+
+    def __init__(self,
+                 supervisor: ClientSupervisor,
+                 port_allocator: PortAllocator,
+                 max_clients: int,
+                 min_clients: int = 0,
+                 warm_spares: int = 1,
+                 idle_timeout: float = 1800,
+                 interval: float = 30,
+                 memory_per_client: int = None):
+        """
+
+        :param supervisor: supervises the clients of the host, its launcher boots new ones.
+        :param port_allocator: leases the ports of new clients.
+        :param max_clients: the most clients the host runs.
+        :param min_clients: the fewest clients the host runs.
+        :param warm_spares: idle clients kept ready for the next experiments.
+        :param idle_timeout: seconds a client is idle before it is shut down.
+        :param interval: seconds between checks.
+        :param memory_per_client: bytes of available memory needed to boot a client, not checked if None.
+        """
+        super().__init__(name="ClientAutoscaler", daemon=True)
+        self.supervisor = supervisor
+        self.rosalind_connection = supervisor.rosalind_connection
+        self.host = supervisor.host
+        self.port_allocator = port_allocator
+        self.max_clients = max_clients
+        self.min_clients = min_clients
+        self.warm_spares = warm_spares
+        self.idle_timeout = idle_timeout
+        self.interval = interval
+        self.memory_per_client = memory_per_client
+
+        # when each client was first seen idle, kept here as the database does not record it.
+        self._idle_since = {}
+        self._stop_event = threading.Event()
+
+    def __repr__(self):
+        return "<ClientAutoscaler - {}, {}-{} clients, {} warm spares>".format(self.host, self.min_clients,
+                                                                               self.max_clients, self.warm_spares)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def stopped(self):
+        return self._stop_event.is_set()
+
+    def _bootable(self, count: int) -> int:
+        if self.memory_per_client is None:
+            return count
+
+        affordable = psutil.virtual_memory().available // self.memory_per_client
+        if affordable < count:
+            logger.warning("Only enough memory to boot {} of {} clients".format(affordable, count))
+        return min(count, int(affordable))
+
+    def scale_up(self, count: int) -> list:
+        """
+        Boots clients and adds them to the client pool.
+
+        :param count:
+        :return: the ready clients.
+        """
+        count = self._bootable(count)
+        if count <= 0:
+            return []
+
+        ports = self.port_allocator.acquire(count)
+        logger.info("Booting {} Minecraft clients at ports {}".format(count, ports))
+
+        def on_ready(client: ClientProcess):
+            self.supervisor.adopt(client)
+            create_client(rosalind_connection=self.rosalind_connection, client_address=client.address)
+
+        ready, failed = self.supervisor.launcher.launch(ports, on_ready=on_ready)
+
+        for client in failed:
+            self.port_allocator.release(client.port)
+
+        return ready
+
+    def scale_down(self, addresses: list) -> list:
+        """
+        Shuts down idle clients and removes them from the client pool.
+
+        :param addresses:
+        :return: the addresses of the clients shut down, clients reserved in the meantime are kept.
+        """
+        stopped = []
+        for address in addresses:
+            logger.info("Shutting down Minecraft client {}, idle for {:.0f}s".format(
+                address, time.time() - self._idle_since.get(address, time.time())))
+
+            if stop_client(self.rosalind_connection, address,
+                           port_allocator=self.port_allocator,
+                           supervisor=self.supervisor,
+                           statuses=[ClientStatus.AVALIABLE.name],
+                           remove=True):
+                self._idle_since.pop(address, None)
+                stopped.append(address)
+
+        return stopped
+
+    def waiting(self) -> int:
+        """
+        The share of the clients pending experiments wait for that this host boots. Hosts are ordered by name, and
+        the first ones take the remainder.
+
+        :return:
+        """
+        clients = get_clients(self.rosalind_connection)
+
+        # experiments stay pending until all their clients are reserved.
+        reserved = Counter(str(client.current_experiment) for client in clients
+                           if client.current_experiment is not None)
+        pending = sum(max(clients_needed(experiment) - reserved[str(experiment.id)], 0) for experiment in
+                      get_experiments_by_status(self.rosalind_connection, status=ExperimentStatus.PENDING.name))
+
+        hosts = sorted({client.address.rsplit(":", 1)[0] for client in clients
+                        if client.status not in (ClientStatus.STOPPED.name, ClientStatus.FAILED.name)} | {self.host})
+        index = hosts.index(self.host)
+
+        return pending // len(hosts) + (1 if index < pending % len(hosts) else 0)
+
+    def check(self):
+        """
+        Boots or shuts down clients to match the experiments waiting.
+
+        :return:
+        """
+        clients = [client for client in get_clients(self.rosalind_connection, host=self.host)
+                   if client.status != ClientStatus.STOPPED.name]
+        waiting = self.waiting()
+
+        now = time.time()
+        idle = [client.address for client in clients if client.status == ClientStatus.AVALIABLE.name]
+        self._idle_since = {address: self._idle_since.get(address, now) for address in idle}
+
+        # clients which are restarting or probed come back, so they are not replaced.
+        usable = [client for client in clients if client.status != ClientStatus.FAILED.name]
+
+        missing = max(waiting + self.warm_spares - len(idle), self.min_clients - len(usable), 0)
+        missing = min(missing, self.max_clients - len(clients))
+        if missing > 0:
+            logger.info("{} clients waited for and {} clients idle".format(waiting, len(idle)))
+            self.scale_up(missing)
+            return
+
+        surplus = min(len(idle) - waiting - self.warm_spares, len(usable) - self.min_clients)
+        expired = sorted((address for address in idle if now - self._idle_since[address] >= self.idle_timeout),
+                         key=lambda address: self._idle_since[address])
+        if surplus > 0 and expired:
+            self.scale_down(expired[:surplus])
+
+    def run(self):
+        while not self.stopped():
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Scaling the Minecraft clients failed")
+            self._stop_event.wait(self.interval)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Boots Malmo Minecraft clients while experiments wait for them, '
+                                                 'and shuts down idle ones.')
+
+    parser.add_argument('--host', type=str,
+                        default='localhost',
+                        help='The hostname stamped in the experiments database.')
+    parser.add_argument('--max_clients', type=int,
+                        required=True,
+                        help='The most clients to run on this host.')
+    parser.add_argument('--min_clients', type=int,
+                        default=0,
+                        help='The fewest clients to run on this host.')
+    parser.add_argument('--warm_spares', type=int,
+                        default=1,
+                        help='The number of idle clients kept ready.')
+    parser.add_argument('--idle_timeout', type=float,
+                        default=1800,
+                        help='Seconds a client is idle before it is shut down.')
+    parser.add_argument('--interval', type=float,
+                        default=30,
+                        help='Seconds between checks.')
+    parser.add_argument('--memory_per_client', type=int,
+                        default=None,
+                        help='MB of available memory needed to boot a client.')
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        rosiland_connection = RosalindDatabase()
+    except:
+        logger.info("Unable to connect to Rosiland Database")
+        logger.info(traceback.format_exc())
+        sys.exit(1)
+
+    if "MALMO_MINECRAFT_ROOT" not in os.environ:
+        logger.info("Unable to find MALMO ROOT DIR! Set $MALMO_MINECRAFT_ROOT!")
+        sys.exit(1)
+
+    port_allocator = PortAllocator()
+
+    launcher = ClientLauncher(os.environ["MALMO_MINECRAFT_ROOT"], host=args.host, port_allocator=port_allocator)
+
+    supervisor = ClientSupervisor(rosiland_connection, os.environ["MALMO_MINECRAFT_ROOT"], host=args.host,
+                                  interval=args.interval, launcher=launcher)
+    supervisor.discover()
+    supervisor.start()
+
+    autoscaler = ClientAutoscaler(supervisor,
+                                  port_allocator,
+                                  max_clients=args.max_clients,
+                                  min_clients=args.min_clients,
+                                  warm_spares=args.warm_spares,
+                                  idle_timeout=args.idle_timeout,
+                                  interval=args.interval,
+                                  memory_per_client=args.memory_per_client * 2 ** 20 if args.memory_per_client
+                                  else None)
+    autoscaler.run()
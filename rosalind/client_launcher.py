@@ -0,0 +1,279 @@
+"""
+Boots Malmo Minecraft clients concurrently. Every client gets a reader thread which watches its output for the line
+Malmo prints once the client can accept missions, so the startup times of the JVMs overlap instead of adding up:
+
+    launcher = ClientLauncher(minecraft_dir, host="localhost", on_ready=register)
+    ready, failed = launcher.launch(range(10000, 10016))
+
+Clients that exit or do not become ready within the timeout are killed and started again on the same port, up to
+retries times. on_ready is called from the launching thread as soon as each client is ready, eg. to add it to the
+client pool. With a PortAllocator, the lease of each port is handed to the client started on it, and with a
+DisplayPool the clients render on shared Xvfb servers. A PlacementPlan pins the clients to their cores. With a
+ClientTemplate, every attempt starts from a fresh instance of the prepared Minecraft directory instead of the Malmo
+installation.
+"""
+import os
+import time
+import queue
+import logging
+import threading
+import subprocess
+
+from common.malmo.client_template import ClientTemplate
+from common.malmo.output_drainer import OutputDrainer, DEFAULT_CAPACITY
+from common.malmo.port_allocator import PortAllocator
+from common.malmo.process_tree import terminate_process_tree
+from rosalind.display_pool import DisplayPool
+from rosalind.placement import PlacementPlan
+
+logger = logging.getLogger(__name__)
+
+READY_LINE = b"CLIENT enter state: DORMANT"
+
+VIRTUAL_MONITOR = "xvfb-run -a -e /dev/stdout -s '-screen 0 1400x900x24' "
+
+_READY, _EXITED = "ready", "exited"
+
+
+def client_command(minecraft_dir: str, port: int, virtual_monitor: str = VIRTUAL_MONITOR) -> str:
+    return virtual_monitor + os.path.join(minecraft_dir, "launchClient.sh") + " -port " + str(port)
+
+
+class ClientProcess:
+    """
+    A Minecraft client and the thread reading its output. The output is drained until the client exits, so the pipe
+    never fills up and blocks the JVM, and the latest of it is kept in output.
+
+    """
+
+    def __init__(self, host: str, port: int, command: str, env: dict = None,
+                 output_capacity: int = DEFAULT_CAPACITY, log_path: str = None, cwd: str = None):
+        """
+
+        :param host:
+        :param port:
+        :param command:
+        :param env: environment variables of the client, those of this process if None.
+        :param output_capacity: bytes of the client's latest output kept in memory.
+        :param log_path: file the output is also written to.
+        :param cwd: the working directory of the client.
+        """
+        self.host = host
+        self.port = port
+        self.command = command
+        self.env = env
+        self.output_capacity = output_capacity
+        self.log_path = log_path
+        self.cwd = cwd
+
+        self.proc = None
+        self.attempts = 0
+        self.ready = False
+        self.start_time = None
+        self.ready_time = None
+
+        self.output = None
+
+    def __repr__(self):
+        return "<ClientProcess - {}, attempt {}, {}>".format(self.address, self.attempts,
+                                                            "ready" if self.ready else "starting")
+
+    @property
+    def address(self) -> str:
+        return "{}:{}".format(self.host, self.port)
+
+    @property
+    def startup_time(self) -> float:
+        if self.ready_time is None:
+            return None
+        return self.ready_time - self.start_time
+
+    def start(self, events: queue.Queue):
+        """
+        Starts a new attempt, the reader puts (client, attempt, event) tuples on events.
+
+        :param events:
+        :return:
+        """
+        self.attempts += 1
+        self.ready = False
+        self.start_time = time.time()
+        self.ready_time = None
+
+        self.proc = subprocess.Popen(self.command,
+                                     # pipe entire output
+                                     stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                     # use process group, see http://stackoverflow.com/a/4791612/18576
+                                     preexec_fn=os.setsid, shell=True, env=self.env, cwd=self.cwd)
+
+        attempt, ready = self.attempts, threading.Event()
+
+        def on_line(line: bytes):
+            logger.debug("{}: {}".format(self.port, line.rstrip()))
+            if not ready.is_set() and READY_LINE in line:
+                ready.set()
+                events.put((self, attempt, _READY))
+
+        self.output = OutputDrainer(self.proc.stdout,
+                                    capacity=self.output_capacity,
+                                    log_path=self.log_path,
+                                    on_line=on_line,
+                                    on_close=lambda: events.put((self, attempt, _EXITED)),
+                                    name="client-{}-output".format(self.port))
+        self.output.start()
+
+    def kill(self) -> bool:
+        """
+        Stops the client and everything it started, see terminate_process_tree.
+
+        :return: True if nothing of the client is left running.
+        """
+        if self.proc is None:
+            return True
+
+        # the shell may have exited already and left the JVM running in its group.
+        survivors = terminate_process_tree(self.proc.pid)
+        self.proc.poll()
+
+        return not survivors
+
+
+class ClientLauncher:
+    """
+    Starts Minecraft clients in parallel, retrying the ones that fail.
+
+    """
+
+    def __init__(self,
+                 minecraft_dir: str,
+                 host: str = "localhost",
+                 timeout: float = 600,
+                 retries: int = 2,
+                 on_ready=None,
+                 virtual_monitor: str = VIRTUAL_MONITOR,
+                 port_allocator: PortAllocator = None,
+                 display_pool: DisplayPool = None,
+                 placement: PlacementPlan = None,
+                 output_capacity: int = DEFAULT_CAPACITY,
+                 log_dir: str = None,
+                 template: ClientTemplate = None,
+                 instance_mode: str = "overlay"):
+        """
+
+        :param minecraft_dir: the Minecraft directory of the Malmo installation.
+        :param host: the hostname in the client addresses.
+        :param timeout: seconds a client has to become ready.
+        :param retries: restarts of a client after it failed.
+        :param on_ready: called with each ClientProcess once it is ready.
+        :param virtual_monitor: prefix of the launch command.
+        :param port_allocator: the leases of the ports are handed to the clients they are launched on.
+        :param display_pool: shared displays the clients render on instead of the virtual monitor.
+        :param placement: pins the clients to their cores.
+        :param output_capacity: bytes of each client's latest output kept in memory.
+        :param log_dir: directory the output of each client is also written to, as client-<port>.log.
+        :param template: the clients start from instances of the template, in its instances_dir.
+        :param instance_mode: see ClientTemplate.instantiate.
+        """
+        self.minecraft_dir = minecraft_dir
+        self.host = host
+        self.timeout = timeout
+        self.retries = retries
+        self.on_ready = on_ready
+        self.virtual_monitor = virtual_monitor
+        self.port_allocator = port_allocator
+        self.display_pool = display_pool
+        self.placement = placement
+        self.output_capacity = output_capacity
+        self.log_dir = log_dir
+        self.template = template
+        self.instance_mode = instance_mode
+
+    def _start(self, client: ClientProcess, events: queue.Queue):
+        if self.template is not None:
+            # a failed attempt may have left the run directory in any state.
+            self.template.instantiate(client.cwd, mode=self.instance_mode)
+        if self.display_pool is not None:
+            client.env = dict(client.env or os.environ, DISPLAY=self.display_pool.assign(client.port))
+        client.start(events)
+        if self.placement is not None:
+            self.placement.apply(client.proc.pid, self.placement.client_cores(client.port))
+        if self.port_allocator is not None:
+            self.port_allocator.transfer(client.port, client.proc.pid)
+
+    def _directory(self, port: int) -> str:
+        if self.template is None:
+            return self.minecraft_dir
+        return os.path.join(self.template.instances_dir, str(port))
+
+    def _restart(self, client: ClientProcess, events: queue.Queue, reason: str) -> bool:
+        client.kill()
+
+        if client.attempts > self.retries:
+            logger.error("Minecraft client at port {} failed ({}), giving up after {} attempts, its last output:\n{}"
+                         .format(client.port, reason, client.attempts, client.output.tail(4096)))
+            if self.display_pool is not None:
+                self.display_pool.release(client.port)
+            return False
+
+        logger.warning("Minecraft client at port {} failed ({}), restarting".format(client.port, reason))
+        self._start(client, events)
+        return True
+
+    def launch(self, ports, on_ready=None) -> tuple:
+        """
+        Starts a client on every port and waits until each of them is ready or out of retries.
+
+        :param ports:
+        :param on_ready: replaces the launcher's on_ready for these clients.
+        :return: (ready clients, failed clients)
+        """
+        on_ready = on_ready or self.on_ready
+
+        events = queue.Queue()
+
+        # clients on shared displays are not wrapped in a virtual monitor of their own.
+        virtual_monitor = "" if self.display_pool is not None else self.virtual_monitor
+
+        clients = [ClientProcess(self.host, port, client_command(self._directory(port), port, virtual_monitor),
+                                 output_capacity=self.output_capacity,
+                                 log_path=os.path.join(self.log_dir, "client-{}.log".format(port)) if self.log_dir
+                                 else None,
+                                 cwd=self._directory(port))
+                   for port in ports]
+        for client in clients:
+            self._start(client, events)
+
+        pending = set(clients)
+        ready, failed = [], []
+
+        while pending:
+            deadline = min(client.start_time for client in pending) + self.timeout
+
+            try:
+                client, attempt, event = events.get(timeout=max(deadline - time.time(), 0))
+            except queue.Empty:
+                for client in [client for client in pending if time.time() - client.start_time >= self.timeout]:
+                    if not self._restart(client, events, "not ready after {}s".format(self.timeout)):
+                        pending.remove(client)
+                        failed.append(client)
+                continue
+
+            # events of killed attempts are stale.
+            if client not in pending or attempt != client.attempts:
+                continue
+
+            if event == _READY:
+                client.ready = True
+                client.ready_time = time.time()
+                pending.remove(client)
+                ready.append(client)
+
+                logger.info("Minecraft client at port {} ready after {:.1f}s".format(client.port,
+                                                                                   client.startup_time))
+                if on_ready is not None:
+                    on_ready(client)
+            elif not self._restart(client, events, "exited with {}".format(client.proc.wait())):
+                pending.remove(client)
+                failed.append(client)
+
+        return ready, failed
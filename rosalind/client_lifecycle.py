@@ -0,0 +1,125 @@
+"""
+Shuts down Minecraft clients of the client pool cleanly. A client is claimed in the client pool first, so no
+experiment reserves it while it stops. Its process tree is then stopped with escalating signals, its port lease is
+released and its row is marked as stopped, or removed:
+
+    stop_clients(rosalind_connection, host="localhost")
+
+Clients which do not go away, or whose process cannot be found, are marked as failed and keep their lease, and the
+processes left are reported.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+import psutil
+
+from common.malmo.port_allocator import PortAllocator
+from common.malmo.process_tree import terminate_process_tree, ESCALATION
+from rosalind.client_supervisor import ClientSupervisor, find_client_processes
+from rosalind.db.connection import RosalindDatabase
+from rosalind.db.queries import claim_client, delete_client, get_client, get_clients, update_client
+from rosalind.db.schema import ClientPool
+from rosalind.db.types import ClientStatus
+
+logger = logging.getLogger(__name__)
+
+# clients in any other status are stopped only when forced, an experiment is using them.
+STOPPABLE_STATUSES = [status.name for status in ClientStatus if status != ClientStatus.OCCUPIED]
+
+
+def stop_client(rosalind_connection: RosalindDatabase,
+                client_address: str,
+                process: psutil.Process = None,
+                port_allocator: PortAllocator = None,
+                supervisor: ClientSupervisor = None,
+                statuses: list = None,
+                force: bool = False,
+                remove: bool = False,
+                escalation: tuple = ESCALATION) -> bool:
+    """
+    Stops a client and everything it started.
+
+    :param rosalind_connection:
+    :param client_address: host:port
+    :param process: the outermost process of the client, found from the launch commands on this machine if None.
+    :param port_allocator: releases the port lease.
+    :param supervisor: stops supervising the client, so it is not restarted.
+    :param statuses: statuses the client is stopped in, STOPPABLE_STATUSES by default.
+    :param force: stop the client whatever its status.
+    :param remove: delete the client's row rather than marking it as stopped.
+    :param escalation: see terminate_process_tree.
+    :return: False if the client was not stopped.
+    """
+    port = int(client_address.rsplit(":", 1)[1])
+
+    if get_client(rosalind_connection, client_address) is not None:
+        statuses = [status.name for status in ClientStatus] if force else (statuses or STOPPABLE_STATUSES)
+        if not claim_client(rosalind_connection, client_address, statuses=statuses,
+                            status=ClientStatus.STOPPING.name):
+            logger.info("Minecraft client {} is in use, not stopping it".format(client_address))
+            return False
+
+    if supervisor is not None:
+        supervised = supervisor.remove(port)
+        if process is None and supervised is not None:
+            process = supervised.process
+
+    if process is None:
+        process = find_client_processes().get(port)
+
+    if process is None:
+        logger.error("Unable to find the process of Minecraft client {}".format(client_address))
+        update_client(rosalind_connection=rosalind_connection, client_address=client_address,
+                      fields={ClientPool.status: ClientStatus.FAILED.name})
+        return False
+
+    survivors = terminate_process_tree(process.pid, escalation)
+
+    if survivors:
+        update_client(rosalind_connection=rosalind_connection, client_address=client_address,
+                      fields={ClientPool.status: ClientStatus.FAILED.name})
+        return False
+
+    (port_allocator or PortAllocator()).release(port)
+
+    if remove:
+        delete_client(rosalind_connection=rosalind_connection, client_address=client_address)
+    else:
+        update_client(rosalind_connection=rosalind_connection, client_address=client_address,
+                      fields={ClientPool.status: ClientStatus.STOPPED.name,
+                              ClientPool.current_experiment: None})
+
+    logger.info("Minecraft client {} stopped".format(client_address))
+    return True
+
+
+def stop_clients(rosalind_connection: RosalindDatabase,
+                 host: str = "localhost",
+                 ports: list = None,
+                 max_workers: int = 16,
+                 **kwargs) -> dict:
+    """
+    Stops clients of a host at the same time.
+
+    :param rosalind_connection:
+    :param host:
+    :param ports: the clients to stop, all those in the client pool or running on this machine if None.
+    :param max_workers: clients stopped at the same time.
+    :param kwargs: see stop_client.
+    :return: address -> whether the client was stopped.
+    """
+    processes = find_client_processes()
+
+    if ports is None:
+        ports = sorted({int(client.address.rsplit(":", 1)[1]) for client in get_clients(rosalind_connection, host)
+                        if client.status != ClientStatus.STOPPED.name} | set(processes))
+    if not ports:
+        return {}
+
+    def stop(port):
+        return stop_client(rosalind_connection, "{}:{}".format(host, port), process=processes.get(port), **kwargs)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(ports))) as executor:
+        stopped = list(executor.map(stop, ports))
+
+    return {"{}:{}".format(host, port): result for port, result in zip(ports, stopped)}
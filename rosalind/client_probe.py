@@ -0,0 +1,200 @@
+"""
+Checks that the clients in the client pool actually start missions, before an experiment finds out the hard way.
+Every idle or failed client is claimed for the probe, asked to start a tiny flat world mission, and put back as
+available or failed. How long the mission took to begin is folded into the client's latency score, which
+find_and_reserve_client prefers low values of. All the clients are probed at once, each by its own agent host:
+
+    results = probe_clients(rosalind_connection, timeout=30)
+
+Run this module to probe the pool once, or every --interval seconds.
+"""
+import sys
+import time
+import uuid
+import logging
+import argparse
+import datetime
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import MalmoPython
+
+from rosalind.db.connection import RosalindDatabase
+from rosalind.db.queries import claim_client, get_clients, update_client
+from rosalind.db.schema import ClientPool
+from rosalind.db.types import ClientStatus
+
+logger = logging.getLogger(__name__)
+
+PROBE_MISSION_XML = '''<?xml version="1.0" encoding="UTF-8" standalone="no" ?>
+<Mission xmlns="http://ProjectMalmo.microsoft.com" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
+    <About>
+        <Summary>Client probe</Summary>
+    </About>
+    <ServerSection>
+        <ServerHandlers>
+            <FlatWorldGenerator generatorString="3;7,1,2*3;3;"/>
+            <ServerQuitFromTimeUp timeLimitMs="{time_limit_ms}"/>
+        </ServerHandlers>
+    </ServerSection>
+    <AgentSection mode="Survival">
+        <Name>Probe</Name>
+        <AgentStart>
+            <Placement x="0.5" y="2" z="0.5"/>
+        </AgentStart>
+        <AgentHandlers>
+            <DiscreteMovementCommands/>
+            <MissionQuitCommands/>
+        </AgentHandlers>
+    </AgentSection>
+</Mission>'''
+
+# weight of the latest probe in the latency score.
+LATENCY_SMOOTHING = 0.5
+
+
+class ProbeResult:
+
+    def __init__(self, address: str, ok: bool, latency: float = None, error: str = None):
+        self.address = address
+        self.ok = ok
+        self.latency = latency
+        self.error = error
+
+    def __repr__(self):
+        if self.ok:
+            return "<ProbeResult - {} started in {:.2f}s>".format(self.address, self.latency)
+        return "<ProbeResult - {} failed: {}>".format(self.address, self.error)
+
+
+def probe_client(client_address: str, timeout: float = 30) -> ProbeResult:
+    """
+    Starts the probe mission on a client, and quits it as soon as it begins.
+
+    :param client_address: host:port
+    :param timeout: seconds the mission has to begin in.
+    :return:
+    """
+    host, port = client_address.rsplit(":", 1)
+
+    client_pool = MalmoPython.ClientPool()
+    client_pool.add(MalmoPython.ClientInfo(host, int(port)))
+
+    mission_spec = MalmoPython.MissionSpec(PROBE_MISSION_XML.format(time_limit_ms=int(timeout * 1000)), True)
+    agent_host = MalmoPython.AgentHost()
+
+    start = time.time()
+    try:
+        agent_host.startMission(mission_spec, client_pool, MalmoPython.MissionRecordSpec(), 0, uuid.uuid4().hex)
+    except RuntimeError as e:
+        return ProbeResult(client_address, False, error=str(e))
+
+    world_state = agent_host.getWorldState()
+    while not world_state.has_mission_begun:
+        if world_state.errors:
+            return ProbeResult(client_address, False, error=world_state.errors[-1].text)
+        if time.time() - start > timeout:
+            return ProbeResult(client_address, False, error="the mission did not begin within {}s".format(timeout))
+        time.sleep(0.05)
+        world_state = agent_host.getWorldState()
+
+    latency = time.time() - start
+
+    # the client is only free again once the mission has ended.
+    agent_host.sendCommand("quit")
+    while world_state.is_mission_running:
+        if time.time() - start > 2 * timeout:
+            return ProbeResult(client_address, False, error="the mission did not end after quitting")
+        time.sleep(0.05)
+        world_state = agent_host.getWorldState()
+
+    return ProbeResult(client_address, True, latency=latency)
+
+
+def _probe_and_record(rosalind_connection: RosalindDatabase, client: ClientPool, timeout: float) -> ProbeResult:
+    # clients are claimed first, so experiments do not reserve them while they are probed.
+    if not claim_client(rosalind_connection, client.address,
+                        statuses=[ClientStatus.AVALIABLE.name, ClientStatus.FAILED.name],
+                        status=ClientStatus.PROBING.name):
+        return None
+
+    result = None
+    try:
+        result = probe_client(client.address, timeout)
+    except Exception as e:
+        logger.exception("Probing {} failed".format(client.address))
+        result = ProbeResult(client.address, False, error=str(e))
+    finally:
+        # an interrupted probe leaves the client as it was found rather than probing forever.
+        if result is None:
+            update_client(rosalind_connection=rosalind_connection, client_address=client.address,
+                          fields={ClientPool.status: client.status})
+
+    fields = {ClientPool.probed_date: datetime.datetime.utcnow()}
+    if result.ok:
+        fields[ClientPool.status] = ClientStatus.AVALIABLE.name
+        fields[ClientPool.latency] = result.latency if client.latency is None else \
+            LATENCY_SMOOTHING * result.latency + (1 - LATENCY_SMOOTHING) * client.latency
+    else:
+        fields[ClientPool.status] = ClientStatus.FAILED.name
+        logger.warning("Minecraft client {} failed its probe: {}".format(client.address, result.error))
+
+    update_client(rosalind_connection=rosalind_connection, client_address=client.address, fields=fields)
+
+    return result
+
+
+def probe_clients(rosalind_connection: RosalindDatabase, host: str = None, timeout: float = 30,
+                  max_workers: int = 32) -> list:
+    """
+    Probes every idle or failed client in the client pool at once, and updates their status and latency.
+
+    :param rosalind_connection:
+    :param host: only the clients of this host, all of them if None.
+    :param timeout: see probe_client.
+    :param max_workers: clients probed at the same time.
+    :return: the ProbeResults.
+    """
+    clients = [client for client in get_clients(rosalind_connection, host=host)
+               if client.status in (ClientStatus.AVALIABLE.name, ClientStatus.FAILED.name)]
+    if not clients:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(clients))) as executor:
+        results = list(executor.map(lambda client: _probe_and_record(rosalind_connection, client, timeout),
+                                    clients))
+
+    return [result for result in results if result is not None]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Checks that the Malmo Minecraft clients of the pool start missions.')
+
+    parser.add_argument('--host', type=str,
+                        default=None,
+                        help='Only probe the clients of this host.')
+    parser.add_argument('--timeout', type=float,
+                        default=30,
+                        help='Seconds a client has to begin the probe mission.')
+    parser.add_argument('--interval', type=float,
+                        default=None,
+                        help='Probe every interval seconds instead of once.')
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        rosiland_connection = RosalindDatabase()
+    except:
+        logger.info("Unable to connect to Rosiland Database")
+        logger.info(traceback.format_exc())
+        sys.exit(1)
+
+    while True:
+        for result in probe_clients(rosiland_connection, host=args.host, timeout=args.timeout):
+            logger.info(result)
+
+        if args.interval is None:
+            break
+        time.sleep(args.interval)
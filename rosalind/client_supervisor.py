@@ -0,0 +1,392 @@
+"""
+Watches the Minecraft clients of a host and keeps the client pool in sync with them. Every interval the supervisor
+checks that each client's process tree is alive and measures its memory and CPU use:
+
+    - crashed clients are marked as restarting in the client pool and started again on the same port. Clients which
+      crashed while an experiment holds them are marked as failed, and only restarted once the experiment let go.
+    - clients using more than the memory watermark are recycled, but only while no experiment occupies them.
+    - running clients missing from the client pool are added to it.
+
+Clients are claimed in the client pool before they are killed, so no experiment reserves them meanwhile.
+
+Clients started by ClientLauncher can be handed over with adopt, clients started elsewhere are found by discover
+from the launch script command lines of the running processes. Clients are started again by the supervisor's
+launcher: create_clients --supervise passes on the launcher the clients were first started with, with its display
+pool and template. Run this module to supervise the clients of a host, it restarts them with the default launch
+settings, each under its own xvfb-run and from the Malmo installation.
+"""
+import os
+import re
+import sys
+import logging
+import argparse
+import datetime
+import threading
+import traceback
+
+import psutil
+
+from common.malmo.port_allocator import PortAllocator
+from common.malmo.process_tree import terminate_process_tree, ESCALATION
+from rosalind.client_launcher import ClientLauncher, ClientProcess
+from rosalind.db.connection import RosalindDatabase
+from rosalind.db.queries import claim_client, create_client, get_clients, update_client
+from rosalind.db.schema import ClientPool
+from rosalind.db.types import ClientStatus
+
+logger = logging.getLogger(__name__)
+
+# launchClient.sh, launchClientNoDisp.sh and launchClient.bat.
+_CLIENT_COMMAND = re.compile(r"launchClient(?:NoDisp)?\.(?:sh|bat)\s+-port\s+(\d+)")
+
+
+def find_client_processes() -> dict:
+    """
+    Finds the Minecraft clients running on this machine.
+
+    :return: port -> the outermost process of the client's launch command.
+    """
+    processes = {}
+    for process in psutil.process_iter(['pid', 'ppid', 'cmdline']):
+        match = _CLIENT_COMMAND.search(" ".join(process.info['cmdline'] or []))
+        if match is not None:
+            processes[process.info['pid']] = (int(match.group(1)), process)
+
+    # the shell, xvfb-run and the launch script all carry the port, the client is the tree of the outermost one.
+    clients = {}
+    for port, process in processes.values():
+        parent = processes.get(process.info['ppid'])
+        if parent is None or parent[0] != port:
+            clients[port] = process
+
+    return clients
+
+
+class SupervisedClient:
+    """
+    The process tree of a client and its latest resource usage.
+
+    """
+
+    def __init__(self, host: str, port: int, process: psutil.Process, client: ClientProcess = None):
+        """
+
+        :param host:
+        :param port:
+        :param process: the outermost process of the client, None if it is not running.
+        :param client: the launcher's handle, if the client was started by this process.
+        """
+        self.host = host
+        self.port = port
+        self.process = process
+        self.client = client
+
+        self.restarts = 0
+        self.rss = 0
+        self.cpu_percent = 0.0
+
+        # cpu_percent measures from the previous call on the same Process object, so they are kept between checks.
+        self._processes = {}
+
+    def __repr__(self):
+        return "<SupervisedClient - {}, {:.0f} MB, {:.0f}% CPU>".format(self.address, self.rss / 2 ** 20,
+                                                                       self.cpu_percent)
+
+    @property
+    def address(self) -> str:
+        return "{}:{}".format(self.host, self.port)
+
+    def is_alive(self) -> bool:
+        # reaps the client if this process started it, otherwise it stays a zombie.
+        if self.client is not None and self.client.proc.poll() is not None:
+            return False
+
+        if self.process is None:
+            return False
+
+        try:
+            return self.process.is_running() and self.process.status() != psutil.STATUS_ZOMBIE
+        except psutil.NoSuchProcess:
+            return False
+
+    def processes(self) -> list:
+        if self.process is None:
+            return []
+
+        try:
+            processes = [self.process] + self.process.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return []
+
+        self._processes = {process.pid: self._processes.get(process.pid, process) for process in processes}
+        return list(self._processes.values())
+
+    def measure(self):
+        """
+        Sums the memory and CPU use over the process tree.
+
+        :return:
+        """
+        self.rss, self.cpu_percent = 0, 0.0
+        for process in self.processes():
+            try:
+                self.rss += process.memory_info().rss
+                self.cpu_percent += process.cpu_percent()
+            except psutil.NoSuchProcess:
+                pass
+
+    def kill(self, escalation: tuple = ESCALATION) -> bool:
+        """
+        Stops the process tree, see terminate_process_tree.
+
+        :param escalation:
+        :return: True if the tree is gone.
+        """
+        if self.process is not None:
+            pid = self.process.pid
+        elif self.client is not None:
+            pid = self.client.proc.pid
+        else:
+            return True
+
+        # the outermost process may have exited already and left the rest of its group running.
+        survivors = terminate_process_tree(pid, escalation)
+
+        if self.client is not None:
+            self.client.proc.poll()
+
+        return not survivors
+
+
+class ClientSupervisor(threading.Thread):
+    """
+    A thread restarting crashed clients and recycling bloated idle ones.
+
+    """
+
+    def __init__(self,
+                 rosalind_connection: RosalindDatabase,
+                 minecraft_dir: str,
+                 host: str = "localhost",
+                 interval: float = 30,
+                 memory_watermark: int = None,
+                 max_restarts: int = None,
+                 launcher: ClientLauncher = None):
+        """
+
+        :param rosalind_connection:
+        :param minecraft_dir: the Minecraft directory of the Malmo installation.
+        :param host: the hostname in the client addresses.
+        :param interval: seconds between checks.
+        :param memory_watermark: bytes of memory above which idle clients are recycled, never if None.
+        :param max_restarts: restarts of a client before it is left failed, unlimited if None.
+        :param launcher: starts the clients again, by default one which hands the port leases to the restarted
+        clients.
+        """
+        super().__init__(name="ClientSupervisor", daemon=True)
+        self.rosalind_connection = rosalind_connection
+        self.host = host
+        self.interval = interval
+        self.memory_watermark = memory_watermark
+        self.max_restarts = max_restarts
+        self.launcher = launcher or ClientLauncher(minecraft_dir, host=host, port_allocator=PortAllocator())
+
+        self.clients = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def stopped(self):
+        return self._stop_event.is_set()
+
+    def adopt(self, client: ClientProcess):
+        """
+        Supervises a client started by a ClientLauncher in this process.
+
+        :param client:
+        :return:
+        """
+        with self._lock:
+            self.clients[client.port] = SupervisedClient(self.host, client.port, psutil.Process(client.proc.pid),
+                                                         client)
+
+    def remove(self, port: int) -> SupervisedClient:
+        """
+        Stops supervising a client, eg. before it is shut down on purpose.
+
+        :param port:
+        :return: the client, None if it was not supervised.
+        """
+        with self._lock:
+            return self.clients.pop(port, None)
+
+    def discover(self):
+        """
+        Supervises the clients running on this machine which are not supervised yet, and the clients of this host in
+        the client pool which are not running, so they are restarted.
+
+        :return:
+        """
+        processes = find_client_processes()
+        rows = get_clients(self.rosalind_connection, host=self.host)
+
+        with self._lock:
+            for port, process in processes.items():
+                if port not in self.clients:
+                    logger.info("Found Minecraft client at port {}, process {}".format(port, process.pid))
+                    self.clients[port] = SupervisedClient(self.host, port, process)
+
+            for row in rows:
+                port = int(row.address.rsplit(":", 1)[1])
+                if port not in self.clients and row.status != ClientStatus.STOPPED.name:
+                    logger.info("Minecraft client {} is in the client pool but not running".format(row.address))
+                    self.clients[port] = SupervisedClient(self.host, port, None)
+
+    def _set_status(self, client: SupervisedClient, status: ClientStatus):
+        fields = {ClientPool.status: status.name}
+        if status == ClientStatus.AVALIABLE:
+            fields.update({ClientPool.current_experiment: None,
+                           ClientPool.start_date: datetime.datetime.utcnow()})
+
+        update_client(rosalind_connection=self.rosalind_connection, client_address=client.address, fields=fields)
+
+    def _claim(self, client: SupervisedClient, row: ClientPool, statuses: list) -> bool:
+        # clients missing from the client pool cannot be reserved by anyone.
+        if row is None:
+            return True
+        return claim_client(self.rosalind_connection, client.address, statuses=[status.name for status in statuses],
+                            status=ClientStatus.RESTARTING.name)
+
+    def _restart(self, clients: list):
+        """
+        Kills and starts again clients claimed for restarting.
+
+        :param clients:
+        :return:
+        """
+        for client in clients:
+            client.kill()
+            client.restarts += 1
+
+        ports = {client.port: client for client in clients}
+
+        def on_ready(process: ClientProcess):
+            client = ports[process.port]
+            client.client = process
+            client.process = psutil.Process(process.proc.pid)
+            client._processes = {}
+            self._set_status(client, ClientStatus.AVALIABLE)
+
+        _, failed = self.launcher.launch(list(ports), on_ready=on_ready)
+
+        for process in failed:
+            self._set_status(ports[process.port], ClientStatus.FAILED)
+
+    def check(self):
+        """
+        Measures every client, restarts crashed and bloated ones and adds unknown ones to the client pool.
+
+        :return:
+        """
+        rows = {row.address: row for row in get_clients(self.rosalind_connection, host=self.host)}
+
+        with self._lock:
+            clients = list(self.clients.values())
+
+        restart = []
+        for client in clients:
+            row = rows.get(client.address)
+
+            # the client is being shut down on purpose.
+            if row is not None and row.status in (ClientStatus.STOPPING.name, ClientStatus.STOPPED.name):
+                continue
+
+            if not client.is_alive():
+                if row is not None and (row.status == ClientStatus.OCCUPIED.name or
+                                        row.current_experiment is not None):
+                    # the experiment still holds the client, it must not be handed to another one meanwhile.
+                    if row.status != ClientStatus.FAILED.name:
+                        logger.error("Minecraft client {} crashed while experiment {} holds it".format(
+                            client.address, row.current_experiment))
+                        self._set_status(client, ClientStatus.FAILED)
+                elif self.max_restarts is None or client.restarts < self.max_restarts:
+                    if not self._claim(client, row, [ClientStatus.AVALIABLE, ClientStatus.FAILED,
+                                                     ClientStatus.RESTARTING]):
+                        continue
+                    logger.warning("Minecraft client {} is down, restarting".format(client.address))
+                    if client.client is not None:
+                        logger.warning("Latest output of {}:\n{}".format(client.address,
+                                                                          client.client.output.tail(4096)))
+                    restart.append(client)
+                elif row is not None and row.status != ClientStatus.FAILED.name:
+                    logger.error("Minecraft client {} is down after {} restarts".format(client.address,
+                                                                                      client.restarts))
+                    self._set_status(client, ClientStatus.FAILED)
+                continue
+
+            client.measure()
+            logger.debug(client)
+
+            if row is None:
+                logger.info("Adding Minecraft client {} to the client pool".format(client.address))
+                create_client(rosalind_connection=self.rosalind_connection, client_address=client.address)
+            elif self.memory_watermark is not None and client.rss > self.memory_watermark and \
+                    row.status == ClientStatus.AVALIABLE.name and \
+                    self._claim(client, row, [ClientStatus.AVALIABLE]):
+                logger.info("Minecraft client {} uses {:.0f} MB, recycling".format(client.address,
+                                                                                  client.rss / 2 ** 20))
+                restart.append(client)
+
+        if restart:
+            self._restart(restart)
+
+    def run(self):
+        while not self.stopped():
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Checking the Minecraft clients failed")
+            self._stop_event.wait(self.interval)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Restarts crashed Malmo Minecraft clients and recycles bloated ones.')
+
+    parser.add_argument('--host', type=str,
+                        default='localhost',
+                        help='The hostname stamped in the experiments database.')
+    parser.add_argument('--interval', type=float,
+                        default=30,
+                        help='Seconds between checks of the clients.')
+    parser.add_argument('--memory_watermark', type=int,
+                        default=None,
+                        help='MB of memory above which idle clients are restarted.')
+    parser.add_argument('--max_restarts', type=int,
+                        default=None,
+                        help='The number of times a client is restarted before it is left failed.')
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        rosiland_connection = RosalindDatabase()
+    except:
+        logger.info("Unable to connect to Rosiland Database")
+        logger.info(traceback.format_exc())
+        sys.exit(1)
+
+    if "MALMO_MINECRAFT_ROOT" not in os.environ:
+        logger.info("Unable to find MALMO ROOT DIR! Set $MALMO_MINECRAFT_ROOT!")
+        sys.exit(1)
+
+    supervisor = ClientSupervisor(rosiland_connection,
+                                  os.environ["MALMO_MINECRAFT_ROOT"],
+                                  host=args.host,
+                                  interval=args.interval,
+                                  memory_watermark=args.memory_watermark * 2 ** 20 if args.memory_watermark else None,
+                                  max_restarts=args.max_restarts)
+    supervisor.discover()
+    supervisor.run()
@@ -1,13 +1,24 @@
 import os
 import sys
+import glob
 import argparse
-import subprocess
 import traceback
 import logging
 
 from rosalind.db.connection import RosalindDatabase
 from rosalind.db.queries import create_client
+from rosalind.client_launcher import ClientLauncher
+from rosalind.client_supervisor import ClientSupervisor, find_client_processes
+from rosalind.client_lifecycle import stop_clients
+from rosalind.display_pool import DisplayPool, stop_displays, mission_screen
+from rosalind.placement import PlacementPlan, CLIENT_FRACTION_VARIABLE
+from common.malmo import malmo_server
+from common.malmo.client_template import ClientTemplate, INSTANCE_MODES
+from common.malmo.port_allocator import PortAllocator, DEFAULT_PORT_RANGE
 
+# the missions of the environments, the shared displays are sized after their frames.
+MISSION_TEMPLATES = sorted(glob.glob(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                  "envs", "discrete", "schemas", "*.xml")))
 
 
 def build_log_dir():
@@ -36,7 +47,52 @@ if __name__ == '__main__':
                         help='The hostname to stamp in the experiments database.')
     parser.add_argument('--start_port', type=int,
                         default=10000,
-                        help='The starting port, client ports will increment from here.')
+                        help='The starting port, clients get the first free ports from here.')
+    parser.add_argument('--timeout', type=float,
+                        default=600,
+                        help='Seconds a client has to become ready before it is restarted.')
+    parser.add_argument('--retries', type=int,
+                        default=2,
+                        help='The number of times a failed client is restarted.')
+    parser.add_argument('--displays', type=int,
+                        default=0,
+                        help='The number of Xvfb servers shared by the clients, 0 runs each client under xvfb-run.')
+    parser.add_argument('--clients_per_display', type=int,
+                        default=8,
+                        help='The number of clients on a shared Xvfb server before the next one is started.')
+    parser.add_argument('--screen', type=str,
+                        default=None,
+                        help='WIDTHxHEIGHTxDEPTH of the shared Xvfb servers, by default the largest video resolution '
+                             'of the --missions.')
+    parser.add_argument('--missions', type=str, nargs='*',
+                        default=MISSION_TEMPLATES,
+                        help='Mission templates the shared Xvfb servers are sized for, those of the environments by '
+                             'default.')
+    parser.add_argument('--client_fraction', type=float,
+                        default=os.environ.get(CLIENT_FRACTION_VARIABLE),
+                        help='Pin the clients to this share of the cores, experiments get the rest. Experiments follow '
+                             'the same layout when ${} is set to the same value.'.format(CLIENT_FRACTION_VARIABLE))
+    parser.add_argument('--template', type=str,
+                        default=None,
+                        help='Start the clients from instances of this prepared Minecraft directory.')
+    parser.add_argument('--prepare_template', action='store_true',
+                        help='Create and warm up the --template directory from the Malmo installation first.')
+    parser.add_argument('--instance_mode', type=str,
+                        default=INSTANCE_MODES[0],
+                        choices=INSTANCE_MODES,
+                        help='How the template is instantiated for each client.')
+    parser.add_argument('--log_output', action='store_true',
+                        help='Write the output of each client to rotating files in the client pool log directory.')
+    parser.add_argument('--stop', action='store_true',
+                        help='Stop the clients of this host instead of booting new ones, and the shared Xvfb servers '
+                             'no client renders on any more.')
+    parser.add_argument('--force', action='store_true',
+                        help='With --stop, also stop clients experiments are using.')
+    parser.add_argument('--supervise', action='store_true',
+                        help='Keep running and restart clients that crash or use too much memory.')
+    parser.add_argument('--memory_watermark', type=int,
+                        default=None,
+                        help='MB of memory above which idle clients are restarted when supervising.')
 
     args = parser.parse_args()
 
@@ -50,31 +106,96 @@ if __name__ == '__main__':
         logger.info(traceback.format_exc())
         sys.exit(1)
 
+    if args.stop:
+        results = stop_clients(rosiland_connection, host=args.host, force=args.force)
+        for address, stopped in results.items():
+            print("Minecraft process at {} {}".format(address, "stopped" if stopped else "NOT stopped"))
+        for display in stop_displays(find_client_processes()):
+            print("Xvfb {} stopped".format(display))
+        sys.exit(0 if all(results.values()) else 1)
+
     if "MALMO_MINECRAFT_ROOT" in os.environ:
         minecraft_dir = os.environ["MALMO_MINECRAFT_ROOT"]
     else:
         logger.info("Unable to find MALMO ROOT DIR! Set $MALMO_MINECRAFT_ROOT!")
         sys.exit(1)
 
-    virtual_monitor = "xvfb-run -a -e /dev/stdout -s '-screen 0 1400x900x24' "
-
-    for i in range(args.number):
-        cmd = virtual_monitor + minecraft_dir + "launchClient.sh" + " -port " + str(args.start_port + i)
-
-        proc = subprocess.Popen(cmd,
-                                # pipe entire output
-                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
-                                # use process group, see http://stackoverflow.com/a/4791612/18576
-                                preexec_fn=os.setsid, shell=True)
+    def register(client):
+        create_client(rosalind_connection=rosiland_connection, client_address=client.address)
+        print("Minecraft process at port {} ready".format(client.port))
+
+    port_allocator = PortAllocator(port_range=(args.start_port,
+                                               max(DEFAULT_PORT_RANGE[1], args.start_port + args.number)))
+
+    display_pool = None
+    if args.displays > 0:
+        screen = mission_screen(args.missions)
+        if args.screen:
+            requested = tuple(int(value) for value in args.screen.split("x"))
+            if requested[0] < screen[0] or requested[1] < screen[1]:
+                parser.error("--screen {} is smaller than the {}x{} frames of the missions".format(args.screen,
+                                                                                                  *screen[:2]))
+            screen = requested
+
+        logger.info("Sharing displays of {}x{}x{}".format(*screen))
+        display_pool = DisplayPool(num_displays=args.displays,
+                                   clients_per_display=args.clients_per_display,
+                                   screen=screen)
+
+    template = None
+    if args.template:
+        if args.prepare_template:
+            template = malmo_server.prepare_template(args.template, source_dir=minecraft_dir,
+                                                     port_allocator=port_allocator)
+        else:
+            template = ClientTemplate(args.template)
+        logger.info(template)
+
+    placement = None
+    if args.client_fraction:
+        placement = PlacementPlan(client_fraction=float(args.client_fraction))
 
-        while True:
-            line = proc.stdout.readline()
-            logger.info(line)
-            if not line:
-                raise EOFError("Minecraft process finished unexpectedly")
-            if b"CLIENT enter state: DORMANT" in line:
-                break
-        print("Minecraft process at port {} ready".format(args.start_port + i))
-
-        create_client(rosalind_connection=rosiland_connection,
-                      client_address="{}:{}".format(args.host, args.start_port + i))
+    try:
+        launcher = ClientLauncher(minecraft_dir,
+                                  host=args.host,
+                                  timeout=args.timeout,
+                                  retries=args.retries,
+                                  on_ready=register,
+                                  port_allocator=port_allocator,
+                                  display_pool=display_pool,
+                                  placement=placement,
+                                  log_dir=build_log_dir() if args.log_output else None,
+                                  template=template,
+                                  instance_mode=args.instance_mode)
+
+        ports = port_allocator.acquire(args.number)
+        if placement is not None:
+            logger.info(placement.report(ports))
+
+        ready, failed = launcher.launch(ports)
+
+        if ready:
+            startup_times = sorted(client.startup_time for client in ready)
+            logger.info("{} clients ready, startup times min {:.1f}s, median {:.1f}s, max {:.1f}s".format(
+                len(ready), startup_times[0], startup_times[len(startup_times) // 2], startup_times[-1]))
+
+        if failed:
+            logger.info("Unable to start clients at ports {}".format(", ".join(str(client.port) for client in failed)))
+            if not args.supervise:
+                sys.exit(1)
+
+        if args.supervise:
+            supervisor = ClientSupervisor(rosiland_connection,
+                                          minecraft_dir,
+                                          host=args.host,
+                                          memory_watermark=args.memory_watermark * 2 ** 20 if args.memory_watermark
+                                          else None,
+                                          launcher=launcher)
+            for client in ready:
+                supervisor.adopt(client)
+            supervisor.discover()
+            supervisor.run()
+    finally:
+        # the displays of running clients are left to --stop.
+        if display_pool is not None:
+            display_pool.close()
@@ -1,6 +1,7 @@
 import os
 
-from sqlalchemy import MetaData, create_engine
+from sqlalchemy import MetaData, create_engine, inspect
+from sqlalchemy.exc import ProgrammingError
 from sqlalchemy.orm import sessionmaker
 
 from rosalind.db.schema import Base
@@ -19,5 +20,29 @@ class RosalindDatabase:
         metadata.reflect(self.db_engine)
 
         Base.metadata.create_all(self.db_engine)
+        self._add_missing_columns(metadata)
 
         self.session_creator = sessionmaker(bind=self.db_engine)
+
+    def _add_missing_columns(self, metadata: MetaData):
+        """
+        create_all only creates missing tables, columns added to the schema later are added to existing tables here.
+        Processes connecting at the same time may both try to add a column, the one which loses finds it added.
+
+        :param metadata: reflected before create_all.
+        :return:
+        """
+        for table in Base.metadata.sorted_tables:
+            existing = metadata.tables.get(table.name)
+            if existing is None:
+                continue
+
+            for column in table.columns:
+                if column.name not in existing.columns:
+                    try:
+                        self.db_engine.execute('ALTER TABLE {} ADD COLUMN {} {}'.format(
+                            table.name, column.name, column.type.compile(dialect=self.db_engine.dialect)))
+                    except ProgrammingError:
+                        if column.name not in {added['name'] for added in
+                                               inspect(self.db_engine).get_columns(table.name)}:
+                            raise
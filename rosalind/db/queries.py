@@ -153,7 +153,10 @@ def find_and_reserve_client(rosalind_connection: RosalindDatabase,
     try:
         # this prevents other proccesses from accessing this table while we claim a client.
         session.execute("LOCK client_pool in ACCESS EXCLUSIVE mode;")
-        client = session.query(ClientPool).filter(ClientPool.status == ClientStatus.AVALIABLE.name).first()
+        # the clients which started the latest probe missions fastest go first.
+        client = (session.query(ClientPool)
+                  .filter(ClientPool.status == ClientStatus.AVALIABLE.name)
+                  .order_by(ClientPool.latency.asc().nullslast()).first())
 
         if client:
             client.status = ClientStatus.OCCUPIED.name
@@ -172,6 +175,31 @@ def find_and_reserve_client(rosalind_connection: RosalindDatabase,
     return client_address
 
 
+def get_client(rosalind_connection: RosalindDatabase, client_address: str) -> ClientPool:
+    session = rosalind_connection.session_creator()
+
+    client = (session.query(ClientPool)
+              .filter(ClientPool.address == client_address).scalar())
+
+    session.close()
+
+    return client
+
+
+def get_clients(rosalind_connection: RosalindDatabase, host: str = None):
+    session = rosalind_connection.session_creator()
+
+    query = session.query(ClientPool)
+    if host is not None:
+        query = query.filter(ClientPool.address.like("{}:%".format(host)))
+
+    clients = query.order_by(ClientPool.address).all()
+
+    session.close()
+
+    return clients
+
+
 def update_client(rosalind_connection: RosalindDatabase,
                   client_address: str, fields: dict):
     session = rosalind_connection.session_creator()
@@ -189,14 +217,43 @@ def update_client(rosalind_connection: RosalindDatabase,
         session.close()
 
 
+def claim_client(rosalind_connection: RosalindDatabase,
+                 client_address: str,
+                 statuses: list,
+                 status: str) -> bool:
+    """
+    Changes the status of a client only if it has one of the given statuses, so no experiment reserves it meanwhile.
+
+    :return: True if the status was changed.
+    """
+    session = rosalind_connection.session_creator()
+
+    try:
+        claimed = (session.query(ClientPool)
+                   .filter(ClientPool.address == client_address)
+                   .filter(ClientPool.status.in_(statuses))
+                   .update({ClientPool.status: status}, synchronize_session=False))
+
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        raise e
+    finally:
+        session.close()
+
+    return claimed > 0
+
+
 def create_client(rosalind_connection: RosalindDatabase,
                   client_address: str):
     session = rosalind_connection.session_creator()
 
     try:
-        session.add(ClientPool(
+        # a client started again at the address of a stopped one takes over its row.
+        session.merge(ClientPool(
             address=client_address,
             status=ClientStatus.AVALIABLE.name,
+            current_experiment=None,
             start_date=datetime.datetime.utcnow()
         ))
 
@@ -205,3 +262,20 @@ def create_client(rosalind_connection: RosalindDatabase,
         session.rollback()
     finally:
         session.close()
+
+
+def delete_client(rosalind_connection: RosalindDatabase,
+                  client_address: str):
+    session = rosalind_connection.session_creator()
+
+    try:
+        (session.query(ClientPool)
+         .filter(ClientPool.address == client_address)
+         .delete())
+
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        raise e
+    finally:
+        session.close()
@@ -1,6 +1,6 @@
 import json
 from sqlalchemy import Column, func
-from sqlalchemy.dialects.postgresql import VARCHAR, INTEGER, JSONB, TEXT, UUID, TIMESTAMP
+from sqlalchemy.dialects.postgresql import VARCHAR, INTEGER, JSONB, TEXT, UUID, TIMESTAMP, FLOAT
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import TypeDecorator, types
 
@@ -51,5 +51,7 @@ class ClientPool(Base):
     address = Column(VARCHAR(100), index=True, primary_key=True)
     status = Column(VARCHAR(30), index=True)
     current_experiment = Column(UUID, index=True)
+    latency = Column(FLOAT, index=True)
+    probed_date = Column(TIMESTAMP, index=True)
     start_date = Column(TIMESTAMP, default=func.now(), index=True)
     updated_date = Column(TIMESTAMP, default=func.now(), onupdate=func.now(), index=True)
\ No newline at end of file
@@ -11,3 +11,7 @@ class ClientStatus(Enum):
     AVALIABLE = 1
     FAILED = 2
     OCCUPIED = 3
+    RESTARTING = 4
+    PROBING = 5
+    STOPPING = 6
+    STOPPED = 7
@@ -0,0 +1,343 @@
+"""
+Shares a few Xvfb servers between headless Minecraft clients. Launching every client under its own xvfb-run starts an
+X server per JVM with a 1400x900 framebuffer, while the clients only render at the resolution of their video
+producer. The pool starts at most num_displays servers with a screen of that size, and assigns up to
+clients_per_display clients to each of them. mission_screen sizes the screen after the frames of the missions:
+
+    pool = DisplayPool(num_displays=2, clients_per_display=8, screen=mission_screen(mission_paths))
+    env = dict(os.environ, DISPLAY=pool.assign(port))
+    ...
+    pool.close()
+
+The servers outlive the pool like the clients do, so the servers of a machine and the ports of their clients are
+recorded in a json file. close stops the servers no client renders on, the others are stopped by stop_displays once
+their clients are gone. Lock files and sockets left behind by servers which did not exit cleanly are removed before a
+display is started.
+"""
+import os
+import json
+import time
+import fcntl
+import signal
+import logging
+import tempfile
+import contextlib
+import subprocess
+
+import psutil
+
+from common.malmo.observation_space import load_observation_shapes
+
+logger = logging.getLogger(__name__)
+
+# the screen of Minecraft's default window.
+DEFAULT_SCREEN = (854, 480, 24)
+
+DEFAULT_DEPTH = 24
+
+# xvfb-run -a counts up from 99, the pool's displays start further up to stay out of its way.
+FIRST_DISPLAY = 200
+
+
+def mission_screen(mission_paths, depth: int = DEFAULT_DEPTH) -> tuple:
+    """
+    The smallest screen the video and colour map frames of every mission fit on.
+
+    :param mission_paths: mission templates.
+    :param depth:
+    :return: (width, height, depth), DEFAULT_SCREEN if no mission renders frames.
+    """
+    sizes = []
+    for path in mission_paths:
+        shapes = load_observation_shapes(path)
+        if shapes.video:
+            sizes.append((shapes.video[1], shapes.video[0]))
+        if shapes.colour_map:
+            sizes.append((shapes.colour_map[1], shapes.colour_map[0]))
+
+    if not sizes:
+        return DEFAULT_SCREEN
+
+    return max(width for width, _ in sizes), max(height for _, height in sizes), depth
+
+
+def default_display_path() -> str:
+    return os.environ.get("MALMO_DISPLAYS", os.path.join(tempfile.gettempdir(), "malmo_displays.json"))
+
+
+def _lock_path(number: int) -> str:
+    return "/tmp/.X{}-lock".format(number)
+
+
+def _socket_path(number: int) -> str:
+    return "/tmp/.X11-unix/X{}".format(number)
+
+
+def _lock_owner(number: int) -> int:
+    """
+    The pid of the running X server holding a display, None if the display is free or its lock is stale.
+
+    :param number:
+    :return:
+    """
+    try:
+        with open(_lock_path(number), 'r') as f:
+            pid = int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+    return pid if psutil.pid_exists(pid) else None
+
+
+def _remove_stale_files(number: int):
+    for path in (_lock_path(number), _socket_path(number)):
+        if os.path.exists(path):
+            logger.info("Removing {} left by a stopped X server".format(path))
+            os.remove(path)
+
+
+def _display_in_use(number: int) -> bool:
+    return _lock_owner(number) is not None
+
+
+def _terminate(pid: int, timeout: float = 5):
+    try:
+        process = psutil.Process(pid)
+        # the pid may have been reused since it was recorded.
+        if not process.name().startswith("Xvfb"):
+            return
+        process.terminate()
+        try:
+            process.wait(timeout)
+        except psutil.TimeoutExpired:
+            process.kill()
+            process.wait(timeout)
+    except psutil.NoSuchProcess:
+        pass
+
+
+@contextlib.contextmanager
+def _displays(path: str):
+    """
+    Locks the display file and yields its state, which is written back when the block exits without an error.
+
+    :param path:
+    :return:
+    """
+    with open(path + ".lock", 'a+') as lock:
+        fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+
+        try:
+            state = {"displays": {}}
+            if os.path.isfile(path):
+                with open(path, 'r') as f:
+                    try:
+                        state = json.load(f)
+                    except ValueError:
+                        logger.warning("The display file {} is corrupt, starting over".format(path))
+
+            for number, record in list(state["displays"].items()):
+                if not psutil.pid_exists(record["pid"]):
+                    del state["displays"][number]
+
+            yield state
+
+            tmp_path = path + ".tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, path)
+        finally:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+
+def stop_displays(running_ports, path: str = None, force: bool = False) -> list:
+    """
+    Stops the recorded servers none of whose clients still runs.
+
+    :param running_ports: ports of the clients running on this machine.
+    :param path: the display file, see default_display_path.
+    :param force: stop every recorded server.
+    :return: the names of the stopped displays.
+    """
+    running_ports = set(running_ports)
+
+    stopped = []
+    with _displays(path or default_display_path()) as state:
+        for number, record in list(state["displays"].items()):
+            if not force and running_ports & set(record["ports"]):
+                continue
+
+            logger.info("Stopping Xvfb :{}".format(number))
+            _terminate(record["pid"])
+            if _lock_owner(int(number)) is None:
+                _remove_stale_files(int(number))
+            del state["displays"][number]
+            stopped.append(":{}".format(number))
+
+    return stopped
+
+
+class XvfbDisplay:
+    """
+    An Xvfb server and the ports of the clients rendering on it.
+
+    """
+
+    def __init__(self, number: int, screen: tuple = DEFAULT_SCREEN):
+        """
+
+        :param number: the X display number.
+        :param screen: (width, height, depth) of the framebuffer.
+        """
+        self.number = number
+        self.screen = screen
+        self.ports = set()
+        self.proc = None
+
+    def __repr__(self):
+        return "<XvfbDisplay - {}, {}x{}x{}, {} clients>".format(self.name, *self.screen, len(self.ports))
+
+    @property
+    def name(self) -> str:
+        return ":{}".format(self.number)
+
+    def is_running(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self, timeout: float = 10):
+        """
+        Starts the server and waits until it accepts connections.
+
+        :param timeout:
+        :return:
+        """
+        owner = _lock_owner(self.number)
+        if owner is not None:
+            raise RuntimeError("Display {} is held by the X server {}".format(self.name, owner))
+        # the server would refuse the display, and its socket would pass for that of the new server.
+        _remove_stale_files(self.number)
+
+        cmd = ["Xvfb", self.name, "-screen", "0", "{}x{}x{}".format(*self.screen), "-nolisten", "tcp"]
+        logger.info("Starting Xvfb: " + " ".join(cmd))
+
+        # the server has its own process group, so it outlives the process which started it like the clients do.
+        self.proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                     preexec_fn=os.setsid)
+
+        socket_path = _socket_path(self.number)
+        start = time.time()
+        while not os.path.exists(socket_path):
+            if self.proc.poll() is not None:
+                raise RuntimeError("Xvfb {} exited with {}".format(self.name, self.proc.returncode))
+            if time.time() - start > timeout:
+                self.stop()
+                raise RuntimeError("Xvfb {} did not start within {}s".format(self.name, timeout))
+            time.sleep(0.05)
+
+    def stop(self):
+        if not self.is_running():
+            return
+
+        self.proc.send_signal(signal.SIGTERM)
+        try:
+            self.proc.wait(5)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+            _remove_stale_files(self.number)
+
+
+class DisplayPool:
+    """
+    Assigns clients to a bounded number of shared Xvfb servers, started when they are first needed.
+
+    """
+
+    def __init__(self, num_displays: int = 1, clients_per_display: int = 8, screen: tuple = DEFAULT_SCREEN,
+                 path: str = None):
+        """
+
+        :param num_displays: the most servers to run.
+        :param clients_per_display: clients rendering on one server before the next one is started, once all the
+        servers run the clients are spread evenly over them.
+        :param screen: (width, height, depth) of the framebuffers, the video resolution of the missions.
+        :param path: the file the servers are recorded in, see default_display_path.
+        """
+        self.num_displays = num_displays
+        self.clients_per_display = clients_per_display
+        self.screen = screen
+        self.path = path or default_display_path()
+
+        self.displays = []
+
+    def __repr__(self):
+        return "<DisplayPool - {} of {} displays>".format(len(self.displays), self.num_displays)
+
+    def _record(self, display: XvfbDisplay):
+        with _displays(self.path) as state:
+            if display.is_running():
+                state["displays"][str(display.number)] = {"pid": display.proc.pid,
+                                                          "screen": list(display.screen),
+                                                          "ports": sorted(display.ports)}
+            else:
+                state["displays"].pop(str(display.number), None)
+
+    def _start_display(self) -> XvfbDisplay:
+        number = max([display.number + 1 for display in self.displays] + [FIRST_DISPLAY])
+        while _display_in_use(number):
+            number += 1
+
+        display = XvfbDisplay(number, self.screen)
+        display.start()
+        self.displays.append(display)
+
+        return display
+
+    def assign(self, port: int) -> str:
+        """
+        Picks the display a client renders on, the client of a port keeps its display when it is restarted.
+
+        :param port:
+        :return: the value of DISPLAY for the client.
+        """
+        for display in self.displays:
+            if not display.is_running():
+                logger.warning("Xvfb {} exited, restarting it".format(display.name))
+                display.start()
+                self._record(display)
+
+        for display in self.displays:
+            if port in display.ports:
+                return display.name
+
+        display = min(self.displays, key=lambda display: len(display.ports), default=None)
+
+        if display is None or (len(display.ports) >= self.clients_per_display and
+                               len(self.displays) < self.num_displays):
+            display = self._start_display()
+
+        display.ports.add(port)
+        self._record(display)
+        logger.debug("Client at port {} renders on {}".format(port, display.name))
+
+        return display.name
+
+    def release(self, port: int):
+        for display in self.displays:
+            if port in display.ports:
+                display.ports.discard(port)
+                self._record(display)
+
+    def close(self, force: bool = False):
+        """
+        Stops the servers no client renders on, the others keep running for their clients.
+
+        :param force: stop every server.
+        :return:
+        """
+        for display in list(self.displays):
+            if display.ports and not force:
+                continue
+            display.stop()
+            self._record(display)
+            self.displays.remove(display)
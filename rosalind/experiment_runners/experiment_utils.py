@@ -16,6 +16,7 @@ from rosalind.db.schema import Experiments, ClientPool
 from rosalind.db.queries import create_experiment, update_experiment, \
     find_and_reserve_client, update_client, get_user, get_experiment,get_experiments_by_group_id
 from rosalind.db.types import ClientStatus, ExperimentStatus
+from rosalind.placement import PlacementPlan
 
 _MODELS = {
     'a2c': train_a2c,
@@ -98,6 +99,13 @@ def train_model(
 
     client_pool=[]
 
+    # the numpy backend simulates its environments, it does not need any clients.
+    if model_params.get('backend', 'malmo') == 'numpy':
+        model_params = dict(model_params)
+        if model_runner is train_a2c:
+            model_params.setdefault('num_envs', num_envs)
+        num_envs = 0
+
     for i in range(num_envs):
 
         client_address = None
@@ -110,9 +118,15 @@ def train_model(
         logger.debug("Reserving Client {}".format(client_address))
 
         client = client_address.split(":")
-        client = (client_pool[0], int(client_pool[1]))
+        client = (client[0], int(client[1]))
         client_pool.append(client)
 
+    # the training process and its environments run next to their clients.
+    placement = PlacementPlan.from_environment()
+    if placement is not None:
+        client_ports = [port for _, port in client_pool]
+        placement.apply(os.getpid(), placement.experiment_cores(client_ports))
+        logger.info(placement.report(client_ports))
 
     try:
 
@@ -159,10 +173,11 @@ def train_model(
     finally:
         experiment_monitor.stop()
         experiment_monitor.join(timeout=2)
-        update_client(rosalind_connection=bot.db,
-                      client_address=client_address,
-                      fields={ClientPool.status: ClientStatus.AVALIABLE.name,
-                              ClientPool.current_experiment: None})
+        for host, port in client_pool:
+            update_client(rosalind_connection=bot.db,
+                          client_address="{}:{}".format(host, port),
+                          fields={ClientPool.status: ClientStatus.AVALIABLE.name,
+                                  ClientPool.current_experiment: None})
 
 
 def run_new_single_experiment_with_monitoring(bot,
@@ -170,7 +185,8 @@ def run_new_single_experiment_with_monitoring(bot,
                                               model: str,
                                               env_id: str,
                                               model_params,
-                                              group_id=None):
+                                              group_id=None,
+                                              num_envs=1):
     model_runner = _MODELS.get(model)
 
     if not model_runner:
@@ -191,7 +207,8 @@ def run_new_single_experiment_with_monitoring(bot,
                       owner=user,
                       total_timesteps=model_params['total_timesteps'],
                       log_dir=log_dir,
-                      model_params=model_params)
+                      # the autoscalers read how many clients the experiment waits for from its parameters.
+                      model_params=dict({'num_envs': num_envs}, **model_params))
     experiment = get_experiment(rosalind_connection=bot.db, experiment_id=experiment_id)
 
     try:
@@ -200,7 +217,8 @@ def run_new_single_experiment_with_monitoring(bot,
                                                              log_dir,
                                                              model_runner,
                                                              env_id,
-                                                             model_params))
+                                                             model_params,
+                                                             num_envs))
         training_process.start()
     except Exception as e:
         tb = traceback.format_exc()
@@ -30,6 +30,13 @@ if __name__ == '__main__':
     parser.add_argument('--model', type=str,
                         default='a2c',
                         help='The starting port, client ports will increment from here.')
+    parser.add_argument('--backend', type=str,
+                        default='malmo',
+                        help="Simulator to run the environments in, 'malmo' for Minecraft or 'numpy' for the "
+                             "vectorized simulator of the discrete environments, which needs no clients.")
+    parser.add_argument('--num_envs', type=int,
+                        default=1,
+                        help='The number of environments of each experiment, each needs a client with malmo.')
 
     args = parser.parse_args()
 
@@ -52,12 +59,14 @@ if __name__ == '__main__':
         group_id = uuid.uuid4()
 
         for i in range(len(params)):
+            params[i]['backend'] = args.backend
             run_new_single_experiment_with_monitoring(bot=bot,
                                                       user=user,
                                                       model=args.model,
                                                       env_id=args.env_id,
                                                       group_id=group_id,
-                                                      model_params=params[i])
+                                                      model_params=params[i],
+                                                      num_envs=args.num_envs)
     except Exception as e:
         tb = traceback.format_exc()
         bot.send_message(text='Unable to Start Experiment Failed with ```{}```'.format(tb),
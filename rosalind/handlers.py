@@ -11,6 +11,7 @@ from rosalind.experiment_runners.user_flow_handlers import run_experiment_group_
     generate_keyboard_markup_for_options
 
 from rosalind.experiment_runners.experiment_utils import continue_experiment_group
+from rosalind.client_probe import probe_clients
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +32,7 @@ def start(bot, update: Update):
         '/running - get the running experiments and their progress\n'
         '/completed - gets the completed experiments\n'
         '/pending - get the currently pending experiments\n'
+        '/probeclients - checks that the idle clients start missions\n'
         ''.format(update.message.from_user.first_name))
 
 
@@ -124,3 +126,21 @@ def restart_experiment_group(bot, update: Update):
     except:
         tb = traceback.format_exc()
         update.message.reply_text("Unable to restart experiemnt: {}".format(tb))
+
+
+@authorized_user(role=UserRoles.ADMIN)
+def probe_client_pool(bot, update: Update):
+    """
+    This handler probes the idle and failed clients, and displays how fast they started a mission.
+
+    :param bot:
+    :param update:
+    :return:
+    """
+    results = probe_clients(rosalind_connection=bot.db)
+
+    if not results:
+        update.message.reply_text("There are no idle clients to probe.")
+        return
+
+    update.message.reply_html('<code>' + "\n".join(str(result) for result in results) + '</code>')
@@ -0,0 +1,173 @@
+"""
+Partitions the cores of a machine between Minecraft clients and the experiments training on them, so the JVMs and
+the training processes do not compete for the same cores.
+
+Every NUMA node gives a client_fraction of its cores to the clients and the rest to the experiments. Clients are
+spread over the nodes by port, and an experiment is pinned to the experiment cores of the nodes its clients run on,
+so its environments exchange frames with their clients through local memory. The layout only depends on the
+machine and the fraction, so the processes launching clients and the ones training agree on it without sharing state:
+
+    plan = PlacementPlan(client_fraction=0.5)
+    plan.apply(client_proc.pid, plan.client_cores(port))
+    plan.apply(os.getpid(), plan.experiment_cores(ports))
+    logger.info(plan.report(ports))
+
+"""
+import os
+import glob
+import logging
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# sets the client fraction of PlacementPlan.from_environment, placement is off when it is not set.
+CLIENT_FRACTION_VARIABLE = "ROSALIND_CLIENT_FRACTION"
+
+
+def parse_cpu_list(cpu_list: str) -> list:
+    """
+    Parses the kernel's cpu lists, eg. "0-3,8-11".
+
+    :param cpu_list:
+    :return:
+    """
+    cpus = []
+    for part in cpu_list.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.extend(range(int(first), int(last) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def numa_nodes() -> list:
+    """
+    The cores of each NUMA node this process may run on, a single node if the machine does not report any.
+
+    :return:
+    """
+    available = set(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else \
+        set(range(psutil.cpu_count()))
+
+    nodes = []
+    for path in sorted(glob.glob("/sys/devices/system/node/node*/cpulist"),
+                       key=lambda path: int(path.split("/")[-2][len("node"):])):
+        with open(path, 'r') as f:
+            cores = [core for core in parse_cpu_list(f.read()) if core in available]
+        if cores:
+            nodes.append(cores)
+
+    return nodes or [sorted(available)]
+
+
+class PlacementPlan:
+    """
+    Which cores clients and experiments run on.
+
+    """
+
+    def __init__(self, client_fraction: float = 0.5, cores_per_client: int = 2, nodes: list = None):
+        """
+
+        :param client_fraction: the share of each node's cores given to the clients.
+        :param cores_per_client: the cores a client is pinned to, clients share them once every core has clients.
+        :param nodes: the cores of each NUMA node, see numa_nodes.
+        """
+        self.client_fraction = client_fraction
+        self.cores_per_client = cores_per_client
+        self.nodes = nodes or numa_nodes()
+
+        self.client_partition, self.experiment_partition = [], []
+        for cores in self.nodes:
+            # both sides get at least a core of each node, unless the node has a single core.
+            num_client_cores = min(max(int(round(len(cores) * client_fraction)), 1), max(len(cores) - 1, 1))
+            self.client_partition.append(cores[:num_client_cores])
+            self.experiment_partition.append(cores[num_client_cores:] or cores)
+
+    def __repr__(self):
+        return "<PlacementPlan - {} nodes, {:.0%} of the cores for clients>".format(len(self.nodes),
+                                                                                   self.client_fraction)
+
+    @classmethod
+    def from_environment(cls) -> 'PlacementPlan':
+        """
+        :return: a plan with the client fraction from the environment, None if it is not set.
+        """
+        fraction = os.environ.get(CLIENT_FRACTION_VARIABLE)
+        if not fraction:
+            return None
+        return cls(client_fraction=float(fraction))
+
+    def node_of(self, port: int) -> int:
+        return port % len(self.nodes)
+
+    def client_cores(self, port: int) -> list:
+        """
+        The cores of the client at a port, consecutive ports are spread over the nodes and then over the cores.
+
+        :param port:
+        :return:
+        """
+        cores = self.client_partition[self.node_of(port)]
+        if len(cores) <= self.cores_per_client:
+            return list(cores)
+
+        num_slots = len(cores) // self.cores_per_client
+        slot = (port // len(self.nodes)) % num_slots
+        return cores[slot * self.cores_per_client:(slot + 1) * self.cores_per_client]
+
+    def experiment_cores(self, client_ports: list = None) -> list:
+        """
+        The cores of an experiment, those on the nodes of its clients if it has any.
+
+        :param client_ports:
+        :return:
+        """
+        nodes = sorted({self.node_of(port) for port in client_ports}) if client_ports \
+            else range(len(self.nodes))
+        return [core for node in nodes for core in self.experiment_partition[node]]
+
+    @staticmethod
+    def apply(pid: int, cores: list) -> bool:
+        """
+        Pins a process and its current children to cores, children started later inherit the affinity.
+
+        :param pid:
+        :param cores:
+        :return: False if the platform does not support pinning.
+        """
+        if not hasattr(psutil.Process, 'cpu_affinity'):
+            logger.warning("Pinning processes to cores is not supported on this platform")
+            return False
+
+        process = psutil.Process(pid)
+        for process in [process] + process.children(recursive=True):
+            try:
+                process.cpu_affinity(list(cores))
+            except psutil.NoSuchProcess:
+                pass
+
+        logger.debug("Pinned process {} to cores {}".format(pid, cores))
+        return True
+
+    def report(self, client_ports: list = ()) -> str:
+        """
+        Describes the layout, and where the clients of the given ports run.
+
+        :param client_ports:
+        :return:
+        """
+        lines = ["Placement over {} NUMA node(s), {:.0%} of the cores for clients:".format(len(self.nodes),
+                                                                                           self.client_fraction)]
+        for node, (client_cores, experiment_cores) in enumerate(zip(self.client_partition,
+                                                                     self.experiment_partition)):
+            lines.append("  node {}: clients on cores {}, experiments on cores {}".format(node, client_cores,
+                                                                                       experiment_cores))
+        for port in client_ports:
+            lines.append("  client at port {}: node {}, cores {}".format(port, self.node_of(port),
+                                                                         self.client_cores(port)))
+        return "\n".join(lines)